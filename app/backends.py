@@ -0,0 +1,321 @@
+# app/backends.py
+# Storage backends behind one small interface.
+# - CsvBackend: the original full-file CSV load/save in storage.py, unchanged
+# - SqliteBackend (sqlite_storage.py): indexed tables with row-level writes
+# - partition(user_id): the same kind of backend over one user's own files (see partitions.py)
+# - reserve_ids(): blocks of ids for the persistent id sequences (see sequences.py)
+# - snapshot=True (CSV and journal): the pieces are also kept in a memory-mapped binary
+#   snapshot (see snapshot.py), so a library is opened without parsing the CSV file
+#
+# Row-level methods also receive the in-memory state (the PieceLibrary, the setlists).
+# Backends that can only rewrite everything (CSV) read it; backends with real rows
+# (SQLite, journal) ignore it, so a single-row write never walks the whole library.
+
+import os
+from typing import Dict, List, Optional, Tuple
+try:
+    from . import piece_logic as tpl
+    from . import sequences
+    from . import setlist_logic as sl
+    from . import storage
+    from .locking import FileLock, lock_for
+except ImportError:
+    import piece_logic as tpl
+    import sequences
+    import setlist_logic as sl
+    import storage
+    from locking import FileLock, lock_for
+
+BACKENDS = ["journal", "csv", "sqlite"]
+DEFAULT_BACKEND = "journal"
+SQLITE_PATH = os.path.join("data", "repertoire.db")
+USERS_DIR = "users"
+
+
+def partition_path(path: str, user_id: int) -> str:
+    """data/piece_library.csv -> data/users/<user_id>/piece_library.csv"""
+    return os.path.join(os.path.dirname(path), USERS_DIR, str(int(user_id)), os.path.basename(path))
+
+
+class StorageBackend:
+    name = "base"
+    row_level = False   # True when single-row writes are cheap (no full rewrite)
+
+    @property
+    def key(self) -> tuple:
+        """Identifies the underlying data, so caches can be shared per dataset."""
+        raise NotImplementedError
+
+    def locked(self) -> FileLock:
+        """
+        Exclusive lock across threads and processes for this dataset.
+        Hold it around read -> check -> write sequences (e.g. allocating an id).
+        """
+        raise NotImplementedError
+
+    def partition(self, user_id: int) -> "StorageBackend":
+        """The same kind of backend over one user's data, stored apart from everyone else's."""
+        raise NotImplementedError
+
+    # ----------- Full load/save ----------- #
+
+    def load_pieces(self) -> List[tpl.Piece]:
+        raise NotImplementedError
+
+    def load_library(self, library: tpl.PieceLibrary) -> None:
+        """
+        Loads the pieces into `library`. Backends with a binary snapshot hand it the
+        snapshot instead (PieceLibrary.defer), and pieces are built as they're used.
+        """
+        library.pieces = self.load_pieces()
+
+    def save_pieces(self, pieces: List[tpl.Piece]) -> None:
+        raise NotImplementedError
+
+    def load_setlists(self) -> Tuple[Dict[int, sl.Performance], sl.SetlistStore]:
+        raise NotImplementedError
+
+    def save_setlists(self, performances: Dict[int, sl.Performance], items: List[sl.Setlist_Item]) -> None:
+        raise NotImplementedError
+
+    # ----------- Change detection ----------- #
+
+    def pieces_stamp(self):
+        """Any value that changes whenever the stored pieces change."""
+        raise NotImplementedError
+
+    def setlists_stamp(self):
+        raise NotImplementedError
+
+    # ----------- Row-level writes (default: full save) ----------- #
+
+    def insert_piece(self, piece: tpl.Piece, library: tpl.PieceLibrary) -> None:
+        self.save_pieces(library.pieces)
+
+    def insert_pieces(self, new: List[tpl.Piece], library: tpl.PieceLibrary) -> None:
+        """Persists a batch of new pieces at once (bulk import)."""
+        self.save_pieces(library.pieces)
+
+    def write_piece_batch(self, ops: List[tuple], library: tpl.PieceLibrary) -> None:
+        """
+        Persists a mixed batch as one write / one transaction (bulk API).
+        ops: ("add", piece), ("edit", piece) or ("delete", piece_id), in order.
+        """
+        self.save_pieces(library.pieces)
+
+    def update_piece(self, piece: tpl.Piece, library: tpl.PieceLibrary) -> None:
+        self.save_pieces(library.pieces)
+
+    def delete_piece(self, piece_id: int, library: tpl.PieceLibrary) -> None:
+        self.save_pieces(library.pieces)
+
+    def insert_performance(self, perf: sl.Performance, performances, items) -> None:
+        self.save_setlists(performances, items)
+
+    def update_performance(self, perf: sl.Performance, performances, items) -> None:
+        self.save_setlists(performances, items)
+
+    def delete_performance(self, performance_id: int, performances, items) -> None:
+        self.save_setlists(performances, items)
+
+    def insert_setlist_item(self, item: sl.Setlist_Item, performances, items) -> None:
+        self.save_setlists(performances, items)
+
+    def delete_setlist_item(self, item: sl.Setlist_Item, performances, items) -> None:
+        """Removes one item; the items after it move up one place."""
+        self.save_setlists(performances, items)
+
+    def move_setlist_item(self, item: sl.Setlist_Item, performances, items) -> None:
+        """Persists one item moved within its setlist (its new rank; no other item changed)."""
+        self.save_setlists(performances, items)
+
+    def reorder_setlist(self, performance_id: int, performances, items) -> None:
+        """Persists the current order (rank and order_index) of every item in one setlist."""
+        self.save_setlists(performances, items)
+
+    def clear_setlist(self, performance_id: int, performances, items) -> None:
+        self.save_setlists(performances, items)
+
+    # ----------- Id sequences ----------- #
+
+    def sequence(self, name: str) -> sequences.Sequence:
+        """This dataset's id sequence "piece", "performance" or "setlist_item"."""
+        return sequences.for_backend(self, name)
+
+    def reserve_ids(self, name: str, n: int, floor: int = 0) -> int:
+        """
+        Reserves n consecutive ids of sequence `name`, all above floor, and returns the first.
+        Persisted before it returns, under the storage lock.
+        """
+        raise NotImplementedError
+
+    def release_ids(self, name: str, reserved_to: int, used_to: int) -> None:
+        """Moves the sequence back to used_to if reserved_to is still the last id reserved."""
+        pass
+
+    def flush(self) -> None:
+        """Makes sure every write so far is durable."""
+        pass
+
+    def close(self) -> None:
+        sequences.release(self)
+
+
+def _file_stamp(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class CsvBackend(StorageBackend):
+    name = "csv"
+
+    def __init__(self, pieces_path: str = storage.PIECES_CSV, setlists_path: str = storage.SETLISTS_CSV,
+                 snapshot: bool = False):
+        self.pieces_path = pieces_path
+        self.setlists_path = setlists_path
+        self.snapshot = snapshot    # keep a binary snapshot of the pieces next to the CSV file
+
+    @property
+    def key(self) -> tuple:
+        return ("csv", os.path.abspath(self.pieces_path), os.path.abspath(self.setlists_path))
+
+    def locked(self) -> FileLock:
+        return lock_for(os.path.join(os.path.dirname(self.pieces_path), "repertoire"))
+
+    def partition(self, user_id):
+        return type(self)(partition_path(self.pieces_path, user_id), partition_path(self.setlists_path, user_id),
+                          snapshot=self.snapshot)
+
+    def load_pieces(self):
+        if self.snapshot:
+            snap = storage.open_snapshot(self.pieces_path)
+            if snap is not None:
+                with snap:
+                    return list(snap)
+        return storage.load_pieces(self.pieces_path)
+
+    def load_library(self, library):
+        snap = storage.open_snapshot(self.pieces_path) if self.snapshot else None
+        if snap is None:
+            super().load_library(library)
+        else:
+            library.defer(snap)
+
+    def save_pieces(self, pieces):
+        storage.save_pieces(pieces, self.pieces_path)
+        if self.snapshot:
+            storage.save_snapshot(pieces, self.pieces_path)
+
+    def insert_pieces(self, new, library):
+        with self.locked():
+            storage.append_pieces(new, self.pieces_path)
+
+    def load_setlists(self):
+        return storage.load_setlists(self.setlists_path)
+
+    def save_setlists(self, performances, items):
+        storage.save_setlists(performances, items, self.setlists_path)
+
+    def pieces_stamp(self):
+        return _file_stamp(self.pieces_path)
+
+    def setlists_stamp(self):
+        return _file_stamp(self.setlists_path)
+
+    @property
+    def sequences_path(self) -> str:
+        return os.path.join(os.path.dirname(self.pieces_path), sequences.SEQUENCES_NAME)
+
+    def reserve_ids(self, name, n, floor=0):
+        with self.locked():
+            return sequences.reserve_in_file(self.sequences_path, name, n, floor)
+
+    def release_ids(self, name, reserved_to, used_to):
+        with self.locked():
+            sequences.release_in_file(self.sequences_path, name, reserved_to, used_to)
+
+
+def open_backend(name: str = DEFAULT_BACKEND,
+                 pieces_csv: str = storage.PIECES_CSV,
+                 setlists_csv: str = storage.SETLISTS_CSV,
+                 sqlite_path: Optional[str] = None,
+                 snapshot: bool = False) -> StorageBackend:
+    """
+    Builds the backend picked in config ("journal", "csv" or "sqlite").
+    snapshot: keep a binary snapshot of the pieces (CSV and journal; SQLite ignores it).
+    """
+    name = (name or DEFAULT_BACKEND).strip().lower()
+    if name == "csv":
+        return CsvBackend(pieces_csv, setlists_csv, snapshot=snapshot)
+    if name == "journal":
+        try:
+            from .journal import JournalBackend
+        except ImportError:
+            from journal import JournalBackend
+        return JournalBackend(pieces_csv, setlists_csv, snapshot=snapshot)
+    if name == "sqlite":
+        try:
+            from .sqlite_storage import SqliteBackend
+        except ImportError:
+            from sqlite_storage import SqliteBackend
+        return SqliteBackend(sqlite_path or SQLITE_PATH)
+    raise ValueError(f"Unknown storage backend '{name}'. Options: {BACKENDS}")
+
+
+def write_through(backend: StorageBackend, library: Optional[tpl.PieceLibrary] = None,
+                  performances: Optional[sl.Performances] = None, items: Optional[sl.SetlistStore] = None) -> None:
+    """
+    Persists every change to the in-memory state as it happens (used by the CLI
+    with row-level backends, so "Save" doesn't have to rewrite everything).
+    Pass the pieces and the setlists together or one at a time, as they get loaded.
+    """
+    def on_piece(op, piece):
+        if op == "add":
+            backend.insert_piece(piece, library)
+        elif op == "edit":
+            backend.update_piece(piece, library)
+        elif op == "delete":
+            backend.delete_piece(piece.piece_id, library)
+
+    def on_performance(op, value):
+        if op == "add":
+            backend.insert_performance(value, performances, items)
+        elif op == "edit":
+            backend.update_performance(value, performances, items)
+        elif op == "delete":
+            backend.delete_performance(value, performances, items)
+
+    def on_item(op, value):
+        if op == "add_item":
+            backend.insert_setlist_item(value, performances, items)
+        elif op == "remove_item":
+            backend.delete_setlist_item(value, performances, items)
+        elif op == "move_item":
+            backend.move_setlist_item(value, performances, items)
+        elif op == "reorder":
+            backend.reorder_setlist(value, performances, items)
+        elif op == "drop":
+            backend.clear_setlist(value, performances, items)
+
+    if library is not None:
+        library.listeners.append(on_piece)
+    if performances is not None:
+        performances.listeners.append(on_performance)
+        items.listeners.append(on_item)
+
+
+def use_sequences(backend: StorageBackend, library: Optional[tpl.PieceLibrary] = None,
+                  performances: Optional[sl.Performances] = None, items: Optional[sl.SetlistStore] = None) -> None:
+    """
+    Makes next_id() / reserve_ids() of the in-memory state take ids from the dataset's
+    persistent sequences instead of max id + 1.
+    """
+    if library is not None:
+        library.ids = backend.sequence("piece")
+    if performances is not None:
+        performances.ids = backend.sequence("performance")
+    if items is not None:
+        items.ids = backend.sequence("setlist_item")
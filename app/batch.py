@@ -0,0 +1,211 @@
+# app/batch.py
+# Non-interactive batch mode: python app/main.py --batch FILE (- for stdin)
+# - one operation per line, as JSON ({"op": "add_piece", "title": "Ondine"}) or as a
+#   command with key=value arguments (add_piece title="Take Five" composer=Brubeck)
+# - every operation goes through the same checks as the menus (services.create_piece, ...);
+#   an invalid one is reported with its line number and skipped, the rest still run
+# - the data is loaded once (only the parts the operations need) and saved once at the end
+# - blank lines and lines starting with # are ignored
+
+import json
+import shlex
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Tuple
+try:
+    from . import services
+    from .piece_logic import KEEP
+except ImportError:
+    import services
+    from piece_logic import KEEP
+
+MAX_REPORTED_ERRORS = 1000    # every failed op is counted, only the first ones are kept
+
+
+class OpError(NamedTuple):
+    line: int
+    op: str
+    message: str
+
+
+class BatchReport:
+    def __init__(self):
+        self.ops = 0
+        self.ok = 0
+        self.error_count = 0
+        self.errors: List[OpError] = []
+        self.seconds = 0.0
+
+    def error(self, line: int, op: str, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(OpError(line, op, message))
+
+    @property
+    def ops_per_sec(self) -> float:
+        return self.ops / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "ops": self.ops,
+            "ok": self.ok,
+            "errors": self.error_count,
+            "seconds": round(self.seconds, 3),
+            "ops_per_sec": round(self.ops_per_sec, 1),
+        }
+
+    def summary(self) -> str:
+        return (f"{self.ops} ops: {self.ok} ok, {self.error_count} errors "
+                f"in {self.seconds:.2f}s ({self.ops_per_sec:,.0f} ops/s)")
+
+
+# ----------- Arguments ----------- #
+
+def _int(args: dict, key: str) -> int:
+    value = args.get(key)
+    if isinstance(value, bool) or value is None:
+        raise ValueError(f"{key} is required" if value is None else f"{key} must be an integer")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be an integer")
+
+def _user_id(state, args: dict) -> int:
+    # with --user only that user's records go into the partition
+    if "user_id" not in args:
+        return state.user_id
+    user_id = _int(args, "user_id")
+    if state.args.user is not None and user_id != state.user_id:
+        raise ValueError("user_id must be the current user's (--user)")
+    return user_id
+
+def _list(value) -> List[str]:
+    # JSON list, or "a,b" on a command line
+    return list(value) if isinstance(value, list) else [v for v in str(value).split(",") if v.strip()]
+
+
+# ----------- Operations ----------- #
+
+def _add_piece(state, a):
+    p = services.create_piece(state.library, a.get("title"), a.get("composer", ""), a.get("genre", ""),
+                              a.get("readiness_status", "learning"), a.get("duration"), _user_id(state, a))
+    return {"piece_id": p.piece_id}
+
+def _edit_piece(state, a):
+    # fields not given stay as they are; duration "" (or null) clears it
+    services.update_piece(state.library, _int(a, "piece_id"), a.get("title"), a.get("composer"), a.get("genre"),
+                          a.get("readiness_status"), a["duration"] if "duration" in a else KEEP)
+    return {"piece_id": _int(a, "piece_id")}
+
+def _delete_piece(state, a):
+    services.remove_piece(state.library, _int(a, "piece_id"))
+    return {"piece_id": _int(a, "piece_id")}
+
+def _add_setlist(state, a):
+    performances, _ = state.setlists()
+    pid = services.create_setlist(performances, a.get("title", ""), a.get("date", ""), a.get("location", ""),
+                                  _user_id(state, a))
+    return {"performance_id": pid}
+
+def _add_piece_to_setlist(state, a):
+    performances, items = state.setlists()
+    library = state.library
+    item = services.put_piece_in_setlist(performances, items, lambda pid: services.piece_exists(library, pid),
+                                         _int(a, "performance_id"), _int(a, "piece_id"))
+    return {"setlist_item_id": item.setlist_item_id, "order_index": item.order_index}
+
+def _remove_piece_from_setlist(state, a):
+    _, items = state.setlists()
+    services.take_piece_from_setlist(items, _int(a, "performance_id"), _int(a, "order_index"))
+    return {"performance_id": _int(a, "performance_id")}
+
+def _delete_setlist(state, a):
+    performances, items = state.setlists()
+    services.remove_setlist(performances, items, _int(a, "performance_id"))
+    return {"performance_id": _int(a, "performance_id")}
+
+def _build_setlist(state, a):
+    performances, items = state.setlists()
+    mix = services.parse_genre_mix(a.get("genre_mix"))
+    pid, built, runtime = services.make_setlist(
+        state.library, performances, items, a.get("title", ""), a.get("target"), a.get("date", ""),
+        a.get("location", ""), _user_id(state, a), genre_mix=mix,
+        readiness=_list(a.get("readiness_status", "performance-ready")))
+    return {"performance_id": pid, "pieces": len(built), "runtime": runtime}
+
+# op name -> (function, the fields it takes)
+OPS: Dict[str, Tuple[Callable, Tuple[str, ...]]] = {
+    "add_piece": (_add_piece, ("title", "composer", "genre", "readiness_status", "duration", "user_id")),
+    "edit_piece": (_edit_piece, ("piece_id", "title", "composer", "genre", "readiness_status", "duration")),
+    "delete_piece": (_delete_piece, ("piece_id",)),
+    "add_setlist": (_add_setlist, ("title", "date", "location", "user_id")),
+    "add_piece_to_setlist": (_add_piece_to_setlist, ("performance_id", "piece_id")),
+    "remove_piece_from_setlist": (_remove_piece_from_setlist, ("performance_id", "order_index")),
+    "delete_setlist": (_delete_setlist, ("performance_id",)),
+    "build_setlist": (_build_setlist, ("title", "target", "date", "location", "genre_mix", "readiness_status",
+                                       "user_id")),
+}
+
+
+# ----------- Running ----------- #
+
+def parse_line(text: str) -> Tuple[str, dict]:
+    """
+    '{"op": "delete_piece", "piece_id": 3}' or 'delete_piece piece_id=3' -> ("delete_piece", {"piece_id": 3}).
+    Raises ValueError for a line that is neither.
+    """
+    text = text.strip()
+    if text.startswith("{"):
+        try:
+            args = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"bad JSON: {e.msg}")
+        if not isinstance(args, dict):
+            raise ValueError("expected a JSON object")
+        args = dict(args)
+        return str(args.pop("op", "") or ""), args
+    try:
+        words = shlex.split(text)
+    except ValueError as e:
+        raise ValueError(f"bad command: {e}")
+    args = {}
+    for word in words[1:]:
+        key, eq, value = word.partition("=")
+        if not eq:
+            raise ValueError(f"expected key=value, got '{word}'")
+        args[key] = value
+    return words[0], args
+
+def apply(state, op: str, args: dict) -> dict:
+    """Runs one operation on the state; returns its result. Raises ValueError if it is invalid."""
+    if op not in OPS:
+        raise ValueError(f"unknown op '{op}' (options: {', '.join(OPS)})")
+    fn, fields = OPS[op]
+    unknown = [k for k in args if k not in fields]
+    if unknown:
+        raise ValueError(f"unknown field '{unknown[0]}' for {op} (fields: {', '.join(fields)})")
+    return fn(state, args)
+
+def run_batch(lines: Iterable[str], state, on_result: Callable[[dict], None] = None) -> BatchReport:
+    """
+    Applies every operation in `lines` to the state, then saves it once.
+    on_result gets {"line", "op", "ok", ...} for every operation as it runs.
+    """
+    report = BatchReport()
+    start = time.perf_counter()
+    for line_no, text in enumerate(lines, start=1):
+        if not text.strip() or text.lstrip().startswith("#"):
+            continue
+        report.ops += 1
+        op = ""
+        try:
+            op, args = parse_line(text)
+            result = {"line": line_no, "op": op, "ok": True, **apply(state, op, args)}
+            report.ok += 1
+        except ValueError as e:
+            report.error(line_no, op, str(e))
+            result = {"line": line_no, "op": op, "ok": False, "error": str(e)}
+        if on_result:
+            on_result(result)
+    state.save()
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,323 @@
+# app/importer.py
+# Streaming CSV import for large catalogues (hundreds of thousands of rows).
+# - rows are read lazily and handled in fixed-size batches, so memory stays flat
+#   however big the file is; each batch is persisted with one bulk write
+# - readiness values go through the same rules as the CLI (services.normalize_readiness);
+#   titles/composers are Unicode (NFC) and whitespace normalized
+# - rows already in the library (same title + composer, case-insensitive) are skipped
+# - files can also be validated in parallel: the file is cut into byte ranges on line
+#   boundaries, a process pool validates the shards, and the results are merged in file
+#   order so ids, duplicates and errors come out exactly as in a serial import
+# - every rejected row is reported with its line number, plus rows/sec and peak memory
+#
+# Imported pieces always get fresh ids: ids in the file belong to someone else's library.
+
+import csv
+import io
+import itertools
+import os
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+try:
+    from . import piece_logic as tpl
+    from .services import READINESS, normalize_readiness, parse_duration
+except ImportError:
+    import piece_logic as tpl
+    from services import READINESS, normalize_readiness, parse_duration
+try:
+    import resource
+except ImportError:      # Windows
+    resource = None
+
+BATCH_SIZE = 1000
+SHARDS_PER_WORKER = 4         # smaller shards even out uneven rows; merging stays in file order
+MAX_REPORTED_ERRORS = 1000    # every bad row is counted, only the first ones are kept
+
+
+class RowError(NamedTuple):
+    line: int
+    message: str
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors: List[RowError] = []
+        self.batches = 0
+        self.seconds = 0.0
+        self.peak_memory: Optional[int] = None    # peak resident bytes of the process (Unix only)
+
+    def error(self, line: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(line, message))
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "errors": self.error_count,
+            "error_rows": [e._asdict() for e in self.errors],
+            "batches": self.batches,
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.rows_per_sec, 1),
+            "peak_memory": self.peak_memory,
+        }
+
+    def summary(self) -> str:
+        text = (f"{self.rows} rows: {self.imported} imported, {self.duplicates} duplicates, "
+                f"{self.error_count} errors in {self.seconds:.2f}s ({self.rows_per_sec:,.0f} rows/s)")
+        if self.peak_memory is not None:
+            text += f", peak memory {self.peak_memory / 1_000_000:.1f} MB"
+        return text
+
+
+# ----------- Reading ----------- #
+
+def open_text(stream) -> io.TextIOWrapper:
+    """
+    Text view over a binary stream (an upload, a socket), decoded as it is read.
+    """
+    if not hasattr(stream, "read1"):
+        stream = io.BufferedReader(stream)
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+
+def _read_header(header_line: str) -> Tuple[str, List[str]]:
+    # the delimiter (comma or semicolon) is picked from the header line only
+    delimiter = ";" if ";" in header_line and "," not in header_line else ","
+    header = next(csv.reader([header_line], delimiter=delimiter), [])
+    return delimiter, [h.strip().lower() for h in header]
+
+def iter_rows(f) -> Iterator[Tuple[int, dict]]:
+    """
+    Yields (line number, row) from CSV text, one row at a time.
+    """
+    header_line = f.readline()
+    if not header_line:
+        return
+    delimiter, header = _read_header(header_line)
+    rd = csv.reader(f, delimiter=delimiter)
+    yield from ((line + 1, row) for line, row in _records(rd, header))    # +1: the header line
+
+def _records(rd, header: List[str]) -> Iterator[Tuple[int, dict]]:
+    for values in rd:
+        if not any(v.strip() for v in values):
+            continue
+        if len(values) > len(header):
+            yield rd.line_num, {"__error__": f"expected {len(header)} fields, got {len(values)}"}
+            continue
+        yield rd.line_num, dict(zip(header, values))
+
+def clean_text(value) -> str:
+    """NFC-normalized, with runs of whitespace collapsed ("Fu\u0308r  Elise " -> "Für Elise")."""
+    value = value or ""
+    if not value.isascii():
+        value = unicodedata.normalize("NFC", value)
+    return " ".join(value.split())
+
+def parse_row(row: dict, user_id: int = 0) -> tpl.Piece:
+    """
+    One CSV row -> a Piece without an id yet. Raises ValueError for rows that can't be imported.
+    """
+    if "__error__" in row:
+        raise ValueError(row["__error__"])
+    title = clean_text(row.get("title"))
+    if not title:
+        raise ValueError("title is required")
+
+    raw = (row.get("readiness_status") or "").strip()
+    readiness = normalize_readiness(raw) if raw else "learning"
+    if readiness is None:
+        raise ValueError(f"unknown readiness '{raw}' (options: {', '.join(READINESS)})")
+
+    return tpl.Piece(None, title, clean_text(row.get("composer")),
+                     clean_text(row.get("genre")), readiness, user_id,
+                     parse_duration(row.get("duration")))    # optional column, m:ss or seconds
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """Lists of up to `size` items. Raises ValueError right away for a size below 1."""
+    if size < 1:
+        raise ValueError(f"batch size must be at least 1 (got {size})")
+    return _batches(iter(items), size)
+
+def _batches(it: Iterator, size: int) -> Iterator[list]:
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+def peak_rss() -> Optional[int]:
+    # tracemalloc would be import-specific, but slows a bulk load down several times
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024    # macOS reports bytes, Linux KiB
+
+def _dedupe_key(piece: tpl.Piece) -> Tuple[str, str]:
+    return (clean_text(piece.title).casefold(), clean_text(piece.composer).casefold())
+
+
+# ----------- Import ----------- #
+
+def import_pieces(f, repo, batch_size: int = BATCH_SIZE, user_id: int = 0) -> ImportReport:
+    """
+    Streams CSV text from `f` into a PieceRepository, one batch per storage write.
+
+    Rows are parsed outside the storage lock; each batch then takes the lock only to
+    dedupe, allocate ids and persist, so other writers are not blocked for the whole import.
+    """
+    report = ImportReport()
+    started = time.perf_counter()
+    seen = None
+
+    try:
+        for batch in batched(iter_rows(f), batch_size):
+            parsed = []
+            for line, row in batch:
+                report.rows += 1
+                try:
+                    parsed.append(parse_row(row, user_id))
+                except ValueError as e:
+                    report.error(line, str(e))
+            seen = _store_batch(repo, parsed, report, seen)
+    finally:
+        report.seconds = time.perf_counter() - started
+        report.peak_memory = peak_rss()
+    return report
+
+def _store_batch(repo, parsed: List[tpl.Piece], report: ImportReport, seen: Optional[tuple]) -> tuple:
+    """
+    Dedupes a batch against the library, allocates ids in order and persists it (storage lock held).
+    Returns (the dedupe keys seen so far, the library version they match) for the next batch.
+    """
+    with repo.writing() as library:
+        seen, version = seen or (None, None)
+        if version != library.version:
+            # first batch, or the library changed since our last one (another writer,
+            # a reload): the keys are rebuilt from what is stored now
+            seen = {_dedupe_key(p) for p in library.pieces}
+        new = []
+        for piece in parsed:
+            key = _dedupe_key(piece)
+            if key in seen:
+                report.duplicates += 1
+                continue
+            seen.add(key)
+            new.append(piece)
+        # one reservation for the whole batch
+        for piece, piece_id in zip(new, library.reserve_ids(len(new))):
+            piece.piece_id = piece_id
+            library.add_piece(piece)
+        if new:
+            repo.insert_many(new)
+        version = library.version
+    report.imported += len(new)
+    report.batches += 1
+    return seen, version
+
+def import_file(path: str, repo, workers: int = 1, **kwargs) -> ImportReport:
+    """
+    Imports a CSV file. workers=1 streams it in this process; any other value validates
+    it in a process pool (0 or None: one worker per CPU).
+    """
+    if workers != 1:
+        return import_file_parallel(path, repo, workers, **kwargs)
+    with open(path, encoding="utf-8-sig", errors="replace", newline="") as f:
+        return import_pieces(f, repo, **kwargs)
+
+
+# ----------- Parallel import ----------- #
+# Shards are cut at newlines, so a quoted field spanning lines must not straddle a
+# shard boundary; catalogue exports keep one record per line.
+
+def shard_ranges(path: str, shards: int, start: int = 0) -> List[Tuple[int, int]]:
+    """
+    Splits bytes [start, end of file) into up to `shards` ranges that begin and end on line boundaries.
+    """
+    size = os.path.getsize(path)
+    bounds = [start]
+    with open(path, "rb") as f:
+        for i in range(1, shards):
+            f.seek(start + (size - start) * i // shards)
+            f.readline()              # finish the line we landed in
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    if size > bounds[-1]:
+        bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+def _validate_shard(job) -> Tuple[int, list, list, int]:
+    """
+    Worker: parses one byte range. Returns (lines read, valid rows, errors, duplicates
+    within the shard); line numbers are relative to the start of the shard.
+    """
+    path, start, end, header, delimiter, user_id = job
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8", errors="replace")
+
+    rows, errors, duplicates, seen = [], [], 0, set()
+    for line, row in _records(csv.reader(io.StringIO(text, newline=""), delimiter=delimiter), header):
+        try:
+            p = parse_row(row, user_id)
+        except ValueError as e:
+            errors.append((line, str(e)))
+            continue
+        key = _dedupe_key(p)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        rows.append((p.title, p.composer, p.genre, p.readiness_status, p.duration))   # tuples pickle cheaply
+    return text.count("\n"), rows, errors, duplicates
+
+def import_file_parallel(path: str, repo, workers: Optional[int] = None,
+                         batch_size: int = BATCH_SIZE, user_id: int = 0) -> ImportReport:
+    """
+    Validates a CSV file in a process pool, then stores the rows in file order in this process,
+    so the result (ids, duplicates, errors) is the same as a serial import's.
+    """
+    workers = workers or os.cpu_count() or 1
+    report = ImportReport()
+    started = time.perf_counter()
+
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        body_start = f.tell()
+    delimiter, header = _read_header(header_line.decode("utf-8-sig", errors="replace"))
+    jobs = [(path, start, end, header, delimiter, user_id)
+            for start, end in shard_ranges(path, workers * SHARDS_PER_WORKER, body_start)]
+
+    seen = None
+    lines_before = 1       # the header
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() hands results back in shard order while later shards are still being validated
+            for n_lines, rows, errors, duplicates in pool.map(_validate_shard, jobs):
+                report.rows += len(rows) + len(errors) + duplicates
+                report.duplicates += duplicates
+                for line, message in errors:
+                    report.error(lines_before + line, message)
+                for batch in batched(rows, batch_size):
+                    seen = _store_batch(repo, [tpl.Piece(None, t, c, g, r, user_id, d) for t, c, g, r, d in batch],
+                                        report, seen)
+                lines_before += n_lines
+    finally:
+        report.seconds = time.perf_counter() - started
+        report.peak_memory = peak_rss()
+    return report
@@ -0,0 +1,77 @@
+# app/iostats.py
+# Storage I/O counters for the work running on the current thread (one web request):
+# time spent loading/saving through the repositories, rows parsed, bytes read/written,
+# number of saves.
+# - storage.py, journal.py, sqlite_storage.py and repository.py report into them
+# - bytes of text files are counted as characters written/read (the same for ASCII data);
+#   SQLite only reports rows
+# - nothing is counted unless a record was started on this thread
+#   (web/instrumentation.py does that per request), so the calls cost ~nothing otherwise
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+_local = threading.local()
+
+
+class IOStats:
+    __slots__ = ("seconds", "rows", "bytes_read", "bytes_written", "saves", "_depth")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.saves = 0
+        self._depth = 0
+
+    def as_dict(self) -> dict:
+        return {"seconds": self.seconds, "rows": self.rows, "bytes_read": self.bytes_read,
+                "bytes_written": self.bytes_written, "saves": self.saves}
+
+
+def start() -> IOStats:
+    """Starts counting on this thread (replacing any record already there)."""
+    _local.stats = IOStats()
+    return _local.stats
+
+def stop() -> Optional[IOStats]:
+    """Stops counting on this thread; returns what was counted."""
+    stats = getattr(_local, "stats", None)
+    _local.stats = None
+    return stats
+
+def current() -> Optional[IOStats]:
+    return getattr(_local, "stats", None)
+
+
+def read(nbytes: int = 0, rows: int = 0) -> None:
+    stats = getattr(_local, "stats", None)
+    if stats is not None:
+        stats.bytes_read += nbytes
+        stats.rows += rows
+
+def wrote(nbytes: int = 0) -> None:
+    stats = getattr(_local, "stats", None)
+    if stats is not None:
+        stats.bytes_written += nbytes
+
+@contextmanager
+def timed(save: bool = False):
+    """Times a storage load (or a save, counted in `saves`); nested calls count once."""
+    stats = getattr(_local, "stats", None)
+    if stats is None:
+        yield
+        return
+    if save:
+        stats.saves += 1
+    stats._depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats._depth -= 1
+        if not stats._depth:
+            stats.seconds += time.perf_counter() - start
@@ -0,0 +1,518 @@
+# app/journal.py
+# Append-only change journal on top of the CSV files.
+# - the CSV files are the snapshot; every change after it is one JSON line in the journal
+# - appends are O(1); fsync is batched (every N records or T seconds, and on flush/close)
+# - loading = snapshot + replay of the journal
+# - once the journal passes a size threshold (and has outgrown the snapshot, so bulk
+#   loads don't rewrite a growing snapshot over and over), a background thread folds it
+#   into a fresh snapshot (compaction) while new changes keep going to a new journal file
+#
+# Replay is idempotent (pieces/performances are upserts, a setlist holds a piece once and
+# item records carry the setlist_item_id, which the CSV snapshot keeps too), so replaying
+# a record that already made it into the snapshot is harmless.
+# A moved setlist item is recorded by the piece it now follows, not by its rank: ranks
+# are not in the CSV snapshot (they are spread out again on every load).
+# That is what makes a crash at any point during compaction safe.
+# The pieces stamp only counts piece records and the setlists stamp only setlist records
+# (RecordCounter), so a setlist change doesn't make caches of the pieces reload, and back.
+# With snapshot=True the CSV pieces file also gets a binary snapshot (see snapshot.py) each
+# time it is written; while the journal holds no piece changes a library is opened straight
+# from it, otherwise the binary snapshot is decoded in one pass and the journal replayed on top.
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+try:
+    from . import iostats
+    from . import piece_logic as tpl
+    from . import setlist_logic as sl
+    from . import storage
+    from .backends import CsvBackend, _file_stamp, partition_path
+    from .locking import atomic_write
+except ImportError:
+    import iostats
+    import piece_logic as tpl
+    import setlist_logic as sl
+    import storage
+    from backends import CsvBackend, _file_stamp, partition_path
+    from locking import atomic_write
+
+JOURNAL_NAME = "changes.journal"
+COMPACT_AT_BYTES = 1_000_000
+SYNC_EVERY = 32          # records
+SYNC_INTERVAL = 1.0      # seconds
+
+PIECE_OPS = {"add_piece", "edit_piece", "delete_piece"}
+
+
+class Journal:
+    """
+    One append-only file of JSON records.
+    """
+    def __init__(self, path: str, sync_every: int = SYNC_EVERY, sync_interval: float = SYNC_INTERVAL):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._f = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _rotated(self) -> bool:
+        # another process compacted (renamed the file away) since we opened it
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._f.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _open(self):
+        if self._f is not None and self._rotated():
+            self.close()
+        if self._f is None:
+            storage._ensure_parent(self.path)
+            self._f = open(self.path, "a", encoding="utf-8")
+        return self._f
+
+    def append(self, record: dict) -> None:
+        self.append_many((record,))
+
+    def append_many(self, records) -> None:
+        f = self._open()
+        for record in records:
+            line = json.dumps(record, separators=(",", ":")) + "\n"
+            f.write(line)
+            iostats.wrote(len(line))
+            self._pending += 1
+        f.flush()    # visible to other readers right away; durable at the next sync
+        if self._pending >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        if self._f is not None and self._pending:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def close(self) -> None:
+        if self._f is not None:
+            self.sync()
+            self._f.close()
+            self._f = None
+
+    def rotate(self, to_path: str) -> bool:
+        """Moves the current file aside (for compaction); the next append starts a new one."""
+        self.close()
+        if not os.path.exists(self.path):
+            return False
+        os.replace(self.path, to_path)
+        return True
+
+
+def read_records(path: str) -> Iterator[dict]:
+    """
+    Records in a journal file. A torn last line (crash mid-write) is skipped.
+    """
+    try:
+        f = open(path, encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            iostats.read(len(line), 1)
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+class RecordCounter:
+    """
+    Number of (piece, setlist) records in a journal file, the same in every process that
+    reads the file. Counted incrementally: each call reads only the lines appended since
+    the last one, and starts over when the file was replaced.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, ino) -> None:
+        self._ino = ino
+        self._offset = 0
+        self._last = b""        # the last line counted, to tell an append from a rewrite
+        self._counts = (0, 0)
+
+    def _still_same(self, f) -> bool:
+        if not self._last:
+            return True
+        f.seek(self._offset - len(self._last))
+        return f.read(len(self._last)) == self._last
+
+    def counts(self) -> Optional[Tuple[int, int]]:
+        """(piece records, setlist records), None if there is no file."""
+        with self._lock:
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                self._reset(None)
+                return None
+            with f:
+                st = os.fstat(f.fileno())
+                if st.st_ino != self._ino or st.st_size < self._offset or not self._still_same(f):
+                    self._reset(st.st_ino)
+                if st.st_size == self._offset:
+                    return self._counts
+                f.seek(self._offset)
+                pieces, setlists = self._counts
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break       # torn or still being written: counted once it's complete
+                    self._offset += len(line)
+                    self._last = line
+                    try:
+                        op = json.loads(line).get("op")
+                    except ValueError:
+                        continue
+                    if op in PIECE_OPS:
+                        pieces += 1
+                    else:
+                        setlists += 1
+                self._counts = (pieces, setlists)
+                return self._counts
+
+
+# ----------- Records ----------- #
+
+def _piece_record(p: tpl.Piece) -> dict:
+    return {
+        "piece_id": p.piece_id, "title": p.title, "composer": p.composer, "genre": p.genre,
+        "readiness_status": p.readiness_status, "user_id": p.user_id, "duration": p.duration,
+        "created": str(p.created) if getattr(p, "created", None) else None,
+        "updated": str(p.updated) if getattr(p, "updated", None) else None,
+    }
+
+def _piece_from(r: dict) -> tpl.Piece:
+    p = tpl.Piece(r["piece_id"], r["title"], r["composer"], r["genre"], r["readiness_status"], r["user_id"],
+                  r.get("duration"))
+    p.created = r.get("created")
+    p.updated = r.get("updated")
+    return p
+
+def _performance_record(perf: sl.Performance) -> dict:
+    return {"performance_id": perf.performance_id, "title": perf.title, "date": perf.date,
+            "location": perf.location, "user_id": perf.user_id}
+
+def apply_piece_records(pieces: List[tpl.Piece], records) -> List[tpl.Piece]:
+    by_id = {p.piece_id: p for p in pieces}
+    for r in records:
+        op = r.get("op")
+        if op in ("add_piece", "edit_piece"):
+            by_id[r["piece"]["piece_id"]] = _piece_from(r["piece"])
+        elif op == "delete_piece":
+            by_id.pop(r["piece_id"], None)
+    return list(by_id.values())
+
+def _recorded_item(group, r: dict) -> Optional[sl.Setlist_Item]:
+    # by item id when the record has one, else by piece (a piece is in a setlist once)
+    item_id = r.get("setlist_item_id")
+    if item_id is not None:
+        return next((it for it in group if it.setlist_item_id == item_id), None)
+    return next((it for it in group if it.piece_id == r["piece_id"]), None)
+
+def apply_setlist_records(performances: Dict[int, sl.Performance], items: sl.SetlistStore, records) -> None:
+    for r in records:
+        op = r.get("op")
+        if op == "put_performance":
+            p = r["performance"]
+            performances[p["performance_id"]] = sl.Performance(
+                p["performance_id"], p["title"], p["date"], p["location"], p["user_id"])
+        elif op == "delete_performance":
+            performances.pop(r["performance_id"], None)
+            items.drop(r["performance_id"])
+        elif op == "clear_setlist":
+            items.drop(r["performance_id"])
+        elif op == "add_item":
+            pid, piece_id, item_id = r["performance_id"], r["piece_id"], r.get("setlist_item_id")
+            group = items.items_for(pid)
+            if any(it.piece_id == piece_id for it in group):
+                continue
+            if item_id is None:     # recorded before item ids were kept
+                sl.add_piece_to_setlist(items, pid, piece_id)
+            else:
+                items.append(sl.Setlist_Item(item_id, pid, piece_id, len(group) + 1))
+        elif op == "remove_item":
+            pid = r["performance_id"]
+            item = _recorded_item(items.items_for(pid), r)
+            if item is not None:
+                sl.remove_piece_from_setlist(items, pid, item.order_index)
+        elif op == "move_item":
+            pid, after = r["performance_id"], r.get("after")
+            group = items.items_for(pid)
+            item = _recorded_item(group, r)
+            if item is None:
+                continue
+            if after is None:
+                items.move(item, 1)
+                continue
+            at = next((i for i, it in enumerate(group) if it.piece_id == after), None)
+            if at is not None:
+                items.move(item, at + 2 if at < item.order_index - 1 else at + 1)
+        elif op == "reorder":
+            pid = r["performance_id"]
+            current = {it.piece_id: it for it in items.drop(pid)}
+            ordered = [current.pop(piece_id) for piece_id in r["piece_ids"] if piece_id in current]
+            ordered.extend(current.values())   # anything the record didn't know about stays at the end
+            for i, it in enumerate(ordered, start=1):
+                it.order_index, it.rank = i, None   # re-ranked in the new order
+                items.append(it)
+
+
+# ----------- Backend ----------- #
+
+class JournalBackend(CsvBackend):
+    """
+    CSV snapshot + change journal. Every row-level write is one journal append.
+    """
+    name = "journal"
+    row_level = True
+
+    def __init__(self, pieces_path: str = storage.PIECES_CSV, setlists_path: str = storage.SETLISTS_CSV,
+                 journal_path: Optional[str] = None, compact_at: int = COMPACT_AT_BYTES,
+                 sync_every: int = SYNC_EVERY, sync_interval: float = SYNC_INTERVAL, snapshot: bool = False):
+        super().__init__(pieces_path, setlists_path, snapshot=snapshot)
+        self.journal_path = journal_path or os.path.join(os.path.dirname(pieces_path), JOURNAL_NAME)
+        self.compacting_path = self.journal_path + ".compacting"
+        self.compact_at = compact_at
+        self.journal = Journal(self.journal_path, sync_every, sync_interval)
+        self._compactor: Optional[threading.Thread] = None
+        self.compactions = 0
+        # compaction changes the files but not the data: map the stamps it leaves
+        # behind to the ones before it, so our own caches don't reload for nothing
+        self._stamp_aliases = {}
+        self._counters = (RecordCounter(self.compacting_path), RecordCounter(self.journal_path))
+
+    @property
+    def key(self) -> tuple:
+        return ("journal",) + super().key[1:]
+
+    def partition(self, user_id):
+        return JournalBackend(partition_path(self.pieces_path, user_id), partition_path(self.setlists_path, user_id),
+                              compact_at=self.compact_at, sync_every=self.journal.sync_every,
+                              sync_interval=self.journal.sync_interval, snapshot=self.snapshot)
+
+    def _records(self) -> Iterator[dict]:
+        # a compaction that has not finished yet (or crashed) still counts
+        yield from read_records(self.compacting_path)
+        yield from read_records(self.journal_path)
+
+    # ----------- Load ----------- #
+
+    def load_pieces(self) -> List[tpl.Piece]:
+        with self.locked():
+            return apply_piece_records(super().load_pieces(), self._records())
+
+    def load_library(self, library):
+        if not self.snapshot:
+            return super().load_library(library)
+        with self.locked():
+            records = [r for r in self._records() if r.get("op") in PIECE_OPS]
+            if records:
+                library.pieces = apply_piece_records(CsvBackend.load_pieces(self), records)
+            else:
+                CsvBackend.load_library(self, library)     # the snapshot is the data as it is
+
+    def load_setlists(self) -> Tuple[Dict[int, sl.Performance], sl.SetlistStore]:
+        with self.locked():
+            performances, items = super().load_setlists()
+            apply_setlist_records(performances, items, self._records())
+            return performances, items
+
+    def _physical_stamps(self):
+        # each entity's CSV file + how many of its records the journal files hold
+        counts = [counter.counts() for counter in self._counters]
+        pieces = tuple(c and c[0] for c in counts)
+        setlists = tuple(c and c[1] for c in counts)
+        return ((super().pieces_stamp(),) + pieces, (super().setlists_stamp(),) + setlists)
+
+    @contextmanager
+    def _same_data(self):
+        # rotation and compaction move records between files without changing the data
+        before = (self.pieces_stamp(), self.setlists_stamp())
+        yield
+        after = self._physical_stamps()
+        self._stamp_aliases = {after[0]: before[0], after[1]: before[1]}
+
+    def pieces_stamp(self):
+        stamp = self._physical_stamps()[0]
+        return self._stamp_aliases.get(stamp, stamp)
+
+    def setlists_stamp(self):
+        stamp = self._physical_stamps()[1]
+        return self._stamp_aliases.get(stamp, stamp)
+
+    # ----------- Row-level writes ----------- #
+
+    def _append(self, *records: dict) -> None:
+        with self.locked():
+            self.journal.append_many(records)
+            if self._compaction_due():
+                self.compact(background=True)
+
+    def _compaction_due(self) -> bool:
+        size = self.journal.size()
+        if size < self.compact_at:
+            return False
+        snapshot = sum(os.path.getsize(p) for p in (self.pieces_path, self.setlists_path) if os.path.exists(p))
+        return size >= snapshot
+
+    def insert_piece(self, piece, library=None):
+        self._append({"op": "add_piece", "piece": _piece_record(piece)})
+
+    def insert_pieces(self, new, library=None):
+        self._append(*({"op": "add_piece", "piece": _piece_record(p)} for p in new))
+
+    def update_piece(self, piece, library=None):
+        self._append({"op": "edit_piece", "piece": _piece_record(piece)})
+
+    def write_piece_batch(self, ops, library=None):
+        records = {"add": lambda p: {"op": "add_piece", "piece": _piece_record(p)},
+                   "edit": lambda p: {"op": "edit_piece", "piece": _piece_record(p)},
+                   "delete": lambda pid: {"op": "delete_piece", "piece_id": pid}}
+        self._append(*(records[op](value) for op, value in ops))
+
+    def delete_piece(self, piece_id, library=None):
+        self._append({"op": "delete_piece", "piece_id": piece_id})
+
+    def insert_performance(self, perf, performances=None, items=None):
+        self._append({"op": "put_performance", "performance": _performance_record(perf)})
+
+    def update_performance(self, perf, performances=None, items=None):
+        self._append({"op": "put_performance", "performance": _performance_record(perf)})
+
+    def delete_performance(self, performance_id, performances=None, items=None):
+        self._append({"op": "delete_performance", "performance_id": performance_id})
+
+    def insert_setlist_item(self, item, performances=None, items=None):
+        self._append({"op": "add_item", "performance_id": item.performance_id, "piece_id": item.piece_id,
+                      "setlist_item_id": item.setlist_item_id})
+
+    def delete_setlist_item(self, item, performances=None, items=None):
+        self._append({"op": "remove_item", "performance_id": item.performance_id, "piece_id": item.piece_id,
+                      "setlist_item_id": item.setlist_item_id})
+
+    def move_setlist_item(self, item, performances=None, items=None):
+        group = sl.items_for(items or [], item.performance_id)
+        after = group[item.order_index - 2].piece_id if item.order_index > 1 else None
+        self._append({"op": "move_item", "performance_id": item.performance_id, "piece_id": item.piece_id,
+                      "setlist_item_id": item.setlist_item_id, "after": after})
+
+    def reorder_setlist(self, performance_id, performances=None, items=None):
+        order = [it.piece_id for it in sl.items_for(items or [], performance_id)]
+        self._append({"op": "reorder", "performance_id": performance_id, "piece_ids": order})
+
+    def clear_setlist(self, performance_id, performances=None, items=None):
+        self._append({"op": "clear_setlist", "performance_id": performance_id})
+
+    # ----------- Full saves ----------- #
+
+    def _write_snapshot(self, pieces=None, setlists=None) -> None:
+        # storage writes are atomic (temp file + rename), so readers never see half a snapshot
+        if pieces is not None:
+            storage.save_pieces(pieces, self.pieces_path)
+            if self.snapshot:
+                storage.save_snapshot(pieces, self.pieces_path)
+        if setlists is not None:
+            storage.save_setlists(*setlists, path=self.setlists_path)
+
+    def _drop_records(self, keep) -> None:
+        # rewrite the journal without the records a full save just made redundant
+        kept = [r for r in self._records() if keep(r)]
+        self.journal.close()
+        with atomic_write(self.journal_path, newline=None) as f:
+            for r in kept:
+                f.write(json.dumps(r, separators=(",", ":")) + "\n")
+        if os.path.exists(self.compacting_path):
+            os.remove(self.compacting_path)
+
+    # no waiting for a running compaction here: it re-checks under the lock and
+    # stands down once a full save has folded its records in
+    def save_pieces(self, pieces):
+        with self.locked():
+            self._write_snapshot(pieces=pieces)
+            self._drop_records(lambda r: r.get("op") not in PIECE_OPS)
+
+    def save_setlists(self, performances, items):
+        with self.locked():
+            self._write_snapshot(setlists=(performances, items))
+            self._drop_records(lambda r: r.get("op") in PIECE_OPS)
+
+    # ----------- Compaction ----------- #
+
+    def compact(self, background: bool = False) -> None:
+        """
+        Folds the journal into a fresh CSV snapshot. New appends go to a new journal meanwhile.
+        """
+        with self.locked():
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            if not os.path.exists(self.compacting_path):
+                with self._same_data():
+                    rotated = self.journal.rotate(self.compacting_path)
+                if not rotated:
+                    return
+            if background:
+                self._compactor = threading.Thread(target=self._compact, name="journal-compaction", daemon=True)
+                self._compactor.start()
+                return
+        self._compact()
+
+    def _compaction_inputs(self):
+        return (_file_stamp(self.compacting_path), _file_stamp(self.pieces_path), _file_stamp(self.setlists_path))
+
+    def _merge_compacting(self):
+        pieces = apply_piece_records(CsvBackend.load_pieces(self), read_records(self.compacting_path))
+        performances, items = CsvBackend.load_setlists(self)
+        apply_setlist_records(performances, items, read_records(self.compacting_path))
+        return pieces, performances, items
+
+    def _compact(self) -> None:
+        # merge outside the lock, so writers aren't held up for a whole snapshot...
+        inputs = self._compaction_inputs()
+        pieces, performances, items = self._merge_compacting()
+        with self.locked():
+            if not os.path.exists(self.compacting_path):
+                return   # a full save already folded these records in
+            if self._compaction_inputs() != inputs:
+                # ...unless another process saved or compacted (and rotated again) meanwhile:
+                # that merge is stale, so do it again from what is there now
+                pieces, performances, items = self._merge_compacting()
+            with self._same_data():
+                self._write_snapshot(pieces=pieces, setlists=(performances, items))
+                os.remove(self.compacting_path)
+            self.compactions += 1
+
+    def wait_for_compaction(self) -> None:
+        t = self._compactor
+        if t is not None:
+            t.join()
+
+    def flush(self) -> None:
+        with self.locked():
+            self.journal.sync()
+
+    def close(self) -> None:
+        super().close()
+        self.wait_for_compaction()
+        with self.locked():
+            self.journal.close()
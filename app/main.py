@@ -1,17 +1,127 @@
+import time
+_T0 = time.perf_counter()      # before the other imports, for --profile-startup
+
+import argparse, os, sys
+from contextlib import contextmanager
 import piece_logic as tpl
-from storage import load_pieces, save_pieces, load_setlists, save_setlists
+import setlist_logic as sl
+from backends import BACKENDS, DEFAULT_BACKEND, SQLITE_PATH, open_backend, use_sequences, write_through
 
 from services import (
     # pieces
-    list_pieces, add_piece, edit_piece, delete_piece, filter_by_readiness, filter_by_attribute, piece_exists,
+    list_pieces, add_piece, edit_piece, delete_piece, filter_by_readiness, filter_by_attribute, search_pieces, piece_exists,
     # setlists
     list_setlists, add_setlist, view_setlist, add_piece_to_setlist, remove_piece_from_setlist, delete_setlist,
+    build_setlist,
 )
+_T_IMPORTS = time.perf_counter()
+
+PROFILE = False     # --profile-startup
+
+def _report(label: str, seconds: float) -> None:
+    if PROFILE:
+        print(f"[startup] {label}: {seconds * 1000:.1f} ms", file=sys.stderr)
+
+@contextmanager
+def timed(label: str):
+    start = time.perf_counter()
+    yield
+    _report(label, time.perf_counter() - start)
+
+
+# ----------- State ----------- #
+
+class State:
+    """
+    What the CLI works on. Nothing is read at startup: the backend is opened and the
+    pieces / setlists are loaded the first time a menu needs them, and a setlist's
+    items are only built when that setlist is looked at.
+    With batch=True changes stay in memory until save(), which writes them all at once.
+    """
+    def __init__(self, args, batch: bool = False):
+        self.args = args
+        self.user_id = args.user if args.user is not None else 0   # owner of new pieces/setlists
+        self.batch = batch
+        self._backend = None
+        self._library = None
+        self._setlists = None
+        self._piece_ops = []            # batch: ("add" | "edit" | "delete", ...) for write_piece_batch
+        self._setlists_changed = False  # batch
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with timed("open backend"):
+                backend = open_backend(self.args.backend, sqlite_path=self.args.db, snapshot=self.args.snapshot)
+                if self.args.user is not None:
+                    shared, backend = backend, backend.partition(self.args.user)
+                    shared.close()
+            self._backend = backend
+        return self._backend
+
+    @property
+    def library(self) -> tpl.PieceLibrary:
+        if self._library is None:
+            backend = self.backend
+            with timed("load pieces"):
+                library = tpl.PieceLibrary()
+                backend.load_library(library)
+            use_sequences(backend, library)
+            if self.batch:
+                library.listeners.append(self._on_piece)
+            elif backend.row_level:
+                write_through(backend, library)
+            self._library = library
+        return self._library
+
+    def setlists(self):
+        """(performances, items), loaded on first use."""
+        if self._setlists is None:
+            backend = self.backend
+            with timed("load setlists"):
+                loaded, items = backend.load_setlists()
+                performances = sl.Performances(loaded)
+            use_sequences(backend, performances=performances, items=items)
+            if self.batch:
+                performances.listeners.append(self._on_setlists)
+                items.listeners.append(self._on_setlists)
+            elif backend.row_level:
+                write_through(backend, performances=performances, items=items)
+            self._setlists = performances, items
+        return self._setlists
+
+    def _on_piece(self, op, piece):
+        self._piece_ops.append((op, piece.piece_id if op == "delete" else piece))
 
-# in-memory state
-LIB = tpl.PieceLibrary()
-performances = {}
-setlist_items = []
+    def _on_setlists(self, op, value):
+        self._setlists_changed = True
+
+    def save(self) -> None:
+        if self._backend is None:
+            return      # nothing was opened, so nothing changed
+        if self.batch:
+            # one write for all the piece changes (one transaction / one journal append),
+            # one for the setlists
+            if self._piece_ops:
+                self._backend.write_piece_batch(self._piece_ops, self._library)
+            if self._setlists_changed:
+                self._backend.save_setlists(*self._setlists)
+            self._piece_ops, self._setlists_changed = [], False
+            self._backend.flush(); return
+        # row-level backends already wrote each change as it happened
+        if self._backend.row_level:
+            self._backend.flush(); return
+        # only what was loaded: the rest is still as it is on disk
+        if self._library is not None:
+            self._backend.save_pieces(self._library.pieces)
+        if self._setlists is not None:
+            self._backend.save_setlists(*self._setlists)
+
+    def close(self) -> None:
+        if self._backend is not None:
+            self._backend.close()
+
+STATE = None
 
 # ----------- Menus ----------- #
 
@@ -24,15 +134,18 @@ def pieces_menu():
         print("4) Delete piece")
         print("5) Filter by readiness")
         print("6) Search by Composer/Genre")
-        print("7) Back")
+        print("7) Search all (title/composer/genre)")
+        print("8) Back")
         choice = input("> ").strip()
-        if choice == "1": list_pieces(LIB)
-        elif choice == "2": add_piece(LIB)
-        elif choice == "3": edit_piece(LIB)
-        elif choice == "4": delete_piece(LIB)
-        elif choice == "5": filter_by_readiness(LIB)
-        elif choice == "6": filter_by_attribute(LIB)
-        elif choice == "7": return
+        if choice == "8": return
+        lib = STATE.library
+        if choice == "1": list_pieces(lib)
+        elif choice == "2": add_piece(lib, STATE.user_id)
+        elif choice == "3": edit_piece(lib)
+        elif choice == "4": delete_piece(lib)
+        elif choice == "5": filter_by_readiness(lib)
+        elif choice == "6": filter_by_attribute(lib)
+        elif choice == "7": search_pieces(lib)
         else: print("Invalid.")
 
 def setlists_menu():
@@ -44,24 +157,118 @@ def setlists_menu():
         print("4) Add piece to setlist")
         print("5) Remove piece from setlist")
         print("6) Delete setlist")
-        print("7) Back")
+        print("7) Build setlist for a time slot")
+        print("8) Back")
         choice = input("> ").strip()
+        if choice == "8": return
+        performances, setlist_items = STATE.setlists()
         if choice == "1": list_setlists(performances, setlist_items)
-        elif choice == "2": add_setlist(performances)
+        elif choice == "2": add_setlist(performances, STATE.user_id)
         elif choice == "3": view_setlist(performances, setlist_items)
-        elif choice == "4": add_piece_to_setlist(performances, setlist_items, lambda pid: piece_exists(LIB, pid))
+        elif choice == "4": add_piece_to_setlist(performances, setlist_items, lambda pid: piece_exists(STATE.library, pid))
         elif choice == "5": remove_piece_from_setlist(setlist_items)
         elif choice == "6": delete_setlist(performances, setlist_items)
-        elif choice == "7": return
+        elif choice == "7": build_setlist(STATE.library, performances, setlist_items, STATE.user_id)
         else: print("Invalid.")
 
 # ----------- App ----------- #
 
-def main():
-    LIB.pieces = load_pieces()    # load persistence
-    global performances, setlist_items
-    performances, setlist_items = load_setlists()
-    
+def _at_least_one(text):
+    n = int(text)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="RepertoireReady CLI")
+    ap.add_argument("--backend", choices=BACKENDS, default=os.environ.get("REPERTOIRE_BACKEND", DEFAULT_BACKEND),
+                    help=f"storage backend (default: {DEFAULT_BACKEND}, or $REPERTOIRE_BACKEND)")
+    ap.add_argument("--db", default=SQLITE_PATH, help="SQLite database path for --backend sqlite")
+    ap.add_argument("--snapshot", action="store_true", default=os.environ.get("REPERTOIRE_SNAPSHOT") == "1",
+                    help="open the pieces from a memory-mapped binary snapshot of the CSV file "
+                         "(csv/journal backends; or $REPERTOIRE_SNAPSHOT=1)")
+    ap.add_argument("--migrate", action="store_true",
+                    help="copy the CSV files into the SQLite database (--db) and exit")
+    ap.add_argument("--import-csv", metavar="FILE",
+                    help="bulk import pieces from a CSV file (title,composer,genre,readiness_status) and exit")
+    ap.add_argument("--batch-size", type=_at_least_one, default=1000, help="rows per storage write for --import-csv")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="processes validating --import-csv in parallel (0: one per CPU, 1: stream serially)")
+    ap.add_argument("--user", type=int, metavar="ID",
+                    help="work on this user's own partition of the data (data/users/ID/...)")
+    ap.add_argument("--split-users", action="store_true",
+                    help="copy the shared data into one partition per user and exit")
+    ap.add_argument("--batch", metavar="FILE",
+                    help="apply the operations in FILE (- for stdin; JSON or key=value lines) and exit")
+    ap.add_argument("--json", action="store_true", help="report --batch results as JSON lines")
+    ap.add_argument("--profile-startup", action="store_true",
+                    help="print import, backend and load timings to stderr")
+    return ap.parse_args(argv)
+
+def run_import(path, batch_size, workers):
+    from importer import import_file
+    from repository import PieceRepository
+    backend = STATE.backend
+    try:
+        report = import_file(path, PieceRepository(backend), workers=workers, batch_size=batch_size,
+                             user_id=STATE.user_id)
+        backend.flush()
+    finally:
+        STATE.close()
+    print(report.summary())
+    for e in report.errors:
+        print(f"  line {e.line}: {e.message}")
+    if report.error_count > len(report.errors):
+        print(f"  ... and {report.error_count - len(report.errors)} more")
+
+def run_batch_file(path, as_json):
+    import json
+    from batch import run_batch
+    def show(result):
+        if as_json:
+            print(json.dumps(result))
+        elif result["ok"]:
+            details = " ".join(f"{k}={v}" for k, v in result.items() if k not in ("line", "op", "ok"))
+            print(f"line {result['line']}: {result['op']} ok {details}".rstrip())
+        else:
+            print(f"line {result['line']}: {result['op'] or '?'} failed: {result['error']}")
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        report = run_batch(f, STATE, show)
+    finally:
+        STATE.close()
+        if f is not sys.stdin:
+            f.close()
+    print(json.dumps(report.as_dict()) if as_json else report.summary())
+    return 1 if report.error_count else 0
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.migrate:
+        from sqlite_storage import migrate_csv_to_sqlite
+        n_pieces, n_setlists = migrate_csv_to_sqlite(args.db)
+        print(f"Migrated {n_pieces} pieces and {n_setlists} setlists into {args.db}.")
+        return
+
+    global PROFILE, STATE
+    PROFILE = args.profile_startup
+    _report("imports", _T_IMPORTS - _T0)
+    if args.split_users:
+        from partitions import split_by_user
+        backend = open_backend(args.backend, sqlite_path=args.db)
+        try:
+            for user_id, n_pieces in split_by_user(backend).items():
+                print(f"user {user_id}: {n_pieces} pieces")
+        finally:
+            backend.close()
+        return
+    STATE = State(args, batch=bool(args.batch))
+    if args.batch:
+        return run_batch_file(args.batch, args.json)
+    if args.import_csv:
+        run_import(args.import_csv, args.batch_size, args.workers)
+        return
+    _report("startup", time.perf_counter() - _T0)
 
     try:
         while True:
@@ -74,13 +281,15 @@ def main():
             if choice == "1": pieces_menu()
             elif choice == "2": setlists_menu()
             elif choice == "3":
-                save_pieces(LIB.pieces); save_setlists(performances, setlist_items); print("Saved.")
+                STATE.save(); print("Saved.")
             elif choice == "4":
-                save_pieces(LIB.pieces); save_setlists(performances, setlist_items); print("Saved. Goodbye!"); break
+                STATE.save(); print("Saved. Goodbye!"); break
             else: print("Invalid.")
     except KeyboardInterrupt:
         print("\nInterrupted. Saving...")
-        save_pieces(LIB.pieces); save_setlists(performances, setlist_items); print("Saved. Goodbye!")
+        STATE.save(); print("Saved. Goodbye!")
+    finally:
+        STATE.close()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# app/paging.py
+# Keyset ("cursor") pagination over a PieceLibrary.
+# - a page starts right after (or ends right before) the sort key of a known piece,
+#   found by bisect in the library's sorted keys - no OFFSET, no full sort per request
+# - filters use the library's readiness/composer/genre buckets:
+#     * most pieces match: walk the sorted keys and skip the few that don't
+#     * few match: sort just the smallest bucket once (cached until the library changes)
+#   either way a page costs about the same however big the library gets
+# - cursors are opaque url-safe tokens of the (sort key, piece_id) they point at
+
+import base64
+import bisect
+import json
+import weakref
+from typing import Dict, List, Optional, Tuple
+try:
+    from . import piece_logic as tpl
+except ImportError:
+    import piece_logic as tpl
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+FILTERS = ("readiness", "composer", "genre")
+DENSE = 16     # filters matching at least 1/DENSE of the library walk the full sorted order
+
+
+class Page:
+    def __init__(self, items: List[tpl.Piece], next_cursor: Optional[str], prev_cursor: Optional[str]):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def encode_cursor(key: tuple) -> str:
+    raw = json.dumps(list(key), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str) -> tuple:
+    """Raises ValueError for a token that encode_cursor did not make."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"bad cursor: {token!r}") from e
+    if not (isinstance(key, list) and len(key) == 2 and isinstance(key[1], int)):
+        raise ValueError(f"bad cursor: {token!r}")
+    return tuple(key)
+
+
+# sorted views of small buckets: library -> (library version, {(attr, value, sort): keys})
+_bucket_views: "weakref.WeakKeyDictionary[tpl.PieceLibrary, Tuple[int, dict]]" = weakref.WeakKeyDictionary()
+
+def _sorted_bucket(library: tpl.PieceLibrary, attr: str, value: str, sort: str) -> List[tuple]:
+    version, views = _bucket_views.get(library, (None, None))
+    if version != library.version:
+        views = {}
+        _bucket_views[library] = (library.version, views)
+    name = (attr, tpl._norm(value), sort)
+    keys = views.get(name)
+    if keys is None:
+        key = tpl.SORTS[sort]
+        keys = views[name] = sorted(key(p) for p in library.bucket(attr, value).values())
+    return keys
+
+
+def paginate(library: tpl.PieceLibrary, sort: str = "id", filters: Optional[Dict[str, str]] = None,
+             after: Optional[str] = None, before: Optional[str] = None, size: int = PAGE_SIZE) -> Page:
+    """
+    One page of the library in `sort` order, restricted to pieces whose readiness/composer/genre
+    equal the given `filters` (case-insensitive). Pass a page's next_cursor as `after`, or its
+    prev_cursor as `before`. Raises ValueError for an unknown sort/filter or a bad cursor.
+    """
+    if sort not in tpl.SORTS:
+        raise ValueError(f"unknown sort '{sort}' (options: {', '.join(tpl.SORTS)})")
+    filters = {k: v for k, v in (filters or {}).items() if v}
+    for attr in filters:
+        if attr not in FILTERS:
+            raise ValueError(f"unknown filter '{attr}' (options: {', '.join(FILTERS)})")
+    size = max(1, min(size, MAX_PAGE_SIZE))
+    cursor = decode_cursor(before or after) if (before or after) else None
+    if cursor is not None and not isinstance(cursor[0], int if sort == "id" else str):
+        raise ValueError(f"cursor does not belong to sort '{sort}'")
+
+    # walk the full sorted order while matches are dense enough to fill a page quickly;
+    # otherwise walk the sorted smallest bucket (estimating filters as independent)
+    keys, check = library.sorted_keys(sort), dict(filters)
+    if filters:
+        sizes = {attr: len(library.bucket(attr, v)) for attr, v in filters.items()}
+        share = 1.0
+        for n in sizes.values():
+            share *= n / max(len(library), 1)
+        if share * DENSE < 1:
+            attr = min(sizes, key=sizes.get)
+            keys = _sorted_bucket(library, attr, filters[attr], sort)
+            del check[attr]
+    wanted = {attr: tpl._norm(v) for attr, v in check.items()}
+
+    def matches(piece):
+        return all(tpl._norm(getattr(piece, "readiness_status" if attr == "readiness" else attr)) == v
+                   for attr, v in wanted.items())
+
+    def collect(indices):
+        # up to size + 1 matching pieces: the extra one only says there is more
+        found = []
+        for i in indices:
+            piece = library.get(keys[i][1])
+            if piece is not None and matches(piece):
+                found.append(piece)
+                if len(found) > size:
+                    break
+        return found
+
+    key_of = tpl.SORTS[sort]
+    if before:
+        found = collect(range(bisect.bisect_left(keys, cursor) - 1, -1, -1))
+        more = len(found) > size
+        items = found[:size][::-1]
+        return Page(items, encode_cursor(key_of(items[-1])) if items else None,
+                    encode_cursor(key_of(items[0])) if items and more else None)
+
+    start = bisect.bisect_right(keys, cursor) if cursor else 0
+    found = collect(range(start, len(keys)))
+    more = len(found) > size
+    items = found[:size]
+    return Page(items, encode_cursor(key_of(items[-1])) if items and more else None,
+                encode_cursor(key_of(items[0])) if items and cursor else None)
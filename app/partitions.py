@@ -0,0 +1,138 @@
+# app/partitions.py
+# Per-user partitions of the data, for one deployment hosting many musicians.
+# - each user's pieces and setlists live apart (data/users/<id>/piece_library.csv ...,
+#   or data/users/<id>/repertoire.db), so ids are numbered per user and a request only
+#   loads, scans and rewrites the active user's data, whatever the size of the site
+# - a partition is opened on first use; open partitions are kept in an LRU, and when
+#   their estimated memory goes over max_bytes (or there are more than max_partitions)
+#   the least recently used ones are closed and dropped, to be reloaded when needed
+# - split_by_user() moves a shared dataset (everyone in one file) into partitions
+#
+# With per_user=False every user shares the one dataset, as before.
+
+import threading
+from collections import OrderedDict
+from typing import Dict
+try:
+    from . import setlist_logic as sl
+    from .backends import StorageBackend
+    from .repository import PieceRepository, SetlistRepository, get_piece_repository, get_setlist_repository
+except ImportError:
+    import setlist_logic as sl
+    from backends import StorageBackend
+    from repository import PieceRepository, SetlistRepository, get_piece_repository, get_setlist_repository
+
+# estimated memory of loaded data: a piece with its search indexes measured ~1.1 KB,
+# plus the strings read from storage; a setlist item ~130 bytes
+PIECE_BYTES = 1500
+ITEM_BYTES = 150
+MAX_BYTES = 256 * 1024 * 1024
+MAX_PARTITIONS = 1000
+
+
+class Partition:
+    """One user's backend and the repositories over it."""
+    __slots__ = ("user_id", "backend", "pieces", "setlists")
+
+    def __init__(self, user_id: int, backend: StorageBackend,
+                 pieces: PieceRepository = None, setlists: SetlistRepository = None):
+        self.user_id = user_id
+        self.backend = backend
+        self.pieces = pieces or PieceRepository(backend)
+        self.setlists = setlists or SetlistRepository(backend)
+
+    def memory_bytes(self) -> int:
+        """Estimate for what is loaded right now (nothing until the repositories are read)."""
+        return len(self.pieces.library) * PIECE_BYTES + len(self.setlists.items) * ITEM_BYTES
+
+
+class Partitions:
+    def __init__(self, backend: StorageBackend, per_user: bool = True,
+                 max_bytes: int = MAX_BYTES, max_partitions: int = MAX_PARTITIONS):
+        self.backend = backend
+        self.per_user = per_user
+        self.max_bytes = max_bytes
+        self.max_partitions = max_partitions
+        self._open: "OrderedDict[int, Partition]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.evictions = 0
+        self._shared = None
+
+    def get(self, user_id: int) -> Partition:
+        """The user's partition, opened if needed; makes room by dropping the least recently used."""
+        if not self.per_user:
+            if self._shared is None:
+                self._shared = Partition(None, self.backend, get_piece_repository(self.backend),
+                                         get_setlist_repository(self.backend))
+            return self._shared
+        user_id = int(user_id)
+        with self._lock:
+            part = self._open.get(user_id)
+            if part is None:
+                part = self._open[user_id] = Partition(user_id, self.backend.partition(user_id))
+                self.opened += 1
+            self._open.move_to_end(user_id)
+            # sizes are known once loaded: this counts what earlier requests loaded
+            self._trim(keep=user_id)
+            return part
+
+    def _trim(self, keep: int) -> None:
+        total = sum(p.memory_bytes() for p in self._open.values())
+        for user_id in list(self._open):
+            if total <= self.max_bytes and len(self._open) <= self.max_partitions:
+                break
+            if user_id == keep:
+                continue
+            part = self._open.pop(user_id)
+            total -= part.memory_bytes()
+            part.backend.close()
+            self.evictions += 1
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(p.memory_bytes() for p in self._open.values())
+
+    def close(self) -> None:
+        with self._lock:
+            for part in self._open.values():
+                part.backend.close()
+            self._open.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "per_user": self.per_user,
+                "open": len(self._open),
+                "bytes": sum(p.memory_bytes() for p in self._open.values()),
+                "max_bytes": self.max_bytes,
+                "max_partitions": self.max_partitions,
+                "opened": self.opened,
+                "evictions": self.evictions,
+            }
+
+
+def split_by_user(backend: StorageBackend) -> Dict[int, int]:
+    """
+    Copies a shared dataset into per-user partitions: pieces by their user_id, setlists
+    (with their items) by the performance's user_id. Ids are kept, so each user's
+    sequence carries on from their highest id. The shared data is left as it is.
+    Returns user_id -> number of pieces.
+    """
+    with backend.locked():
+        pieces = backend.load_pieces()
+        performances, items = backend.load_setlists()
+    users: Dict[int, list] = {}
+    for p in pieces:
+        users.setdefault(int(p.user_id or 0), []).append(p)
+    perfs_by_user: Dict[int, dict] = {}
+    for perf in performances.values():
+        perfs_by_user.setdefault(int(perf.user_id or 0), {})[perf.performance_id] = perf
+    for user_id in sorted(set(users) | set(perfs_by_user)):
+        part = backend.partition(user_id)
+        perfs = perfs_by_user.get(user_id, {})
+        with part.locked():
+            part.save_pieces(users.get(user_id, []))
+            part.save_setlists(perfs, sl.SetlistStore(it for pid in perfs for it in items.items_for(pid)))
+        part.close()
+    return {user_id: len(users.get(user_id, [])) for user_id in sorted(set(users) | set(perfs_by_user))}
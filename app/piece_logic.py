@@ -1,51 +1,288 @@
+import bisect
+import threading
 from datetime import date
+try:
+    from .search import SearchIndex
+except ImportError:
+    from search import SearchIndex
 
 # Piece class (Parent class)
+# __slots__: no per-instance __dict__, so large libraries take far less memory
 class Piece:
-    def __init__(self, piece_id, title, composer, genre, readiness_status, user_id):
+    __slots__ = ("piece_id", "title", "composer", "genre", "readiness_status", "user_id", "duration",
+                 "created", "updated")
+
+    def __init__(self, piece_id, title, composer, genre, readiness_status, user_id, duration=None):
         self.piece_id = piece_id
         self.title = title
         self.composer = composer
         self.genre = genre
         self.readiness_status = readiness_status
         self.user_id = user_id
+        self.duration = duration     # seconds, None if not known
 
         self.created = None
         self.updated = None
 
 
-# Creates an array of pieces
+KEEP = object()     # edit_piece(..., new_duration=KEEP): leave the duration as it is
+
+
+def _norm(value):
+    return (value or "").strip().lower()
+
+
+# sort orders for paged listings: sort key of a piece, ties broken by piece_id
+SORTS = {
+    "id": lambda p: (p.piece_id, p.piece_id),
+    "title": lambda p: (_norm(p.title), p.piece_id),
+    "composer": lambda p: (_norm(p.composer), p.piece_id),
+    "genre": lambda p: (_norm(p.genre), p.piece_id),
+    "readiness": lambda p: (_norm(p.readiness_status), p.piece_id),
+}
+
+
+# Creates a collection of pieces, indexed so lookups don't scan the whole library:
+# - by id (the main store, kept in insertion order)
+# - by readiness status, composer and genre (normalized, lowercase)
+# - running max id, so new ids don't need a max() over every piece; with an id sequence
+#   attached (ids, see sequences.py) new ids come from it and are never reused
+# - full-text search index, built on the first search and then kept up to date
+# - one sorted key list per sort order (see SORTS), built on first use and then kept
+#   up to date, so a page of a sorted listing is a bisect instead of a sort
+# Listeners are called as fn(op, piece) after add/edit/delete (e.g. to journal the change),
+# and as fn("load", None) after the whole library was replaced.
+# A library opened from a binary snapshot (defer, see snapshot.py) is built on first need:
+# get(), len() and new ids read the mapped file; anything else builds the indexes once.
 class PieceLibrary():
     def __init__(self):
-        self.pieces = []
+        self.listeners = []
+        self._by_id = {}
+        self._by_readiness = {}
+        self._by_composer = {}
+        self._by_genre = {}
+        self._search = None
+        self._sorted = {}
+        self.max_id = 0
+        self.ids = None      # optional sequences.Sequence for new ids
+        self.version = 0     # bumped on every change (cache key for derived views)
+        self._deferred = None        # snapshot.PieceSnapshot not built into the indexes yet
+        self._decoded = {}           # pieces already looked up in it, by id
+        self._building = threading.Lock()
+
+    # all pieces as a list (a copy - add/edit/delete go through the methods below)
+    @property
+    def pieces(self):
+        self._materialize()
+        return list(self._by_id.values())
+
+    @pieces.setter
+    def pieces(self, pieces):
+        self._clear()
+        for piece in pieces:
+            self._insert(piece)
+        self._notify("load", None)
+
+    def _clear(self):
+        self._by_id = {}
+        self._by_readiness = {}
+        self._by_composer = {}
+        self._by_genre = {}
+        self._search = None
+        self._sorted = {}
+        self._deferred = None
+        self._decoded = {}
+        self.max_id = 0
+        self.version += 1
+
+    def __len__(self):
+        snapshot = self._deferred
+        return len(snapshot) if snapshot is not None else len(self._by_id)
+
+    # ----------- Deferred loading ----------- #
+
+    def defer(self, snapshot):
+        """
+        Replaces the library with the pieces of a snapshot.PieceSnapshot without building
+        them. Listeners get ("load", None) as with `pieces = ...`.
+        """
+        self._clear()
+        self._deferred = snapshot
+        self.max_id = snapshot.max_id
+        self._notify("load", None)
+
+    def _materialize(self):
+        if self._deferred is None:
+            return
+        with self._building:
+            snapshot = self._deferred
+            if snapshot is None:
+                return      # another thread built it meanwhile
+            decoded = self._decoded
+            for piece in snapshot:
+                # pieces handed out by get() stay the ones in the library
+                self._insert(decoded.get(piece.piece_id, piece))
+            self._deferred, self._decoded = None, {}
+
+    def _buckets(self, piece):
+        return ((self._by_readiness, _norm(piece.readiness_status)),
+                (self._by_composer, _norm(piece.composer)),
+                (self._by_genre, _norm(piece.genre)))
+
+    def _index(self, piece):
+        for index, key in self._buckets(piece):
+            index.setdefault(key, {})[piece.piece_id] = piece
+        for sort, keys in self._sorted.items():
+            bisect.insort(keys, SORTS[sort](piece))
+        self.version += 1
+
+    def _unindex(self, piece):
+        for index, key in self._buckets(piece):
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.pop(piece.piece_id, None)
+                if not bucket:
+                    del index[key]
+        for sort, keys in self._sorted.items():
+            key = SORTS[sort](piece)
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+        self.version += 1
+
+    def _insert(self, piece):
+        old = self._by_id.get(piece.piece_id)
+        if old is not None:
+            self._unindex(old)
+        self._by_id[piece.piece_id] = piece
+        self._index(piece)
+        if self._search is not None:
+            self._search.add(piece)
+        if piece.piece_id > self.max_id:
+            self.max_id = piece.piece_id
 
     # adds new pieces to the array and adds the date the were created
     def add_piece(self, piece):
+        self._materialize()
         piece.created = date.today()
-        self.pieces.append(piece)
+        self._insert(piece)
+        self._notify("add", piece)
 
+    def _notify(self, op, piece):
+        for fn in self.listeners:
+            fn(op, piece)
 
-    def edit_piece(self, piece_id, new_title, new_composer, new_genre, new_readiness_status):
-        for piece in self.pieces:
-            if piece.piece_id == piece_id:
-                piece.title = new_title
-                piece.composer = new_composer
-                piece.genre = new_genre
-                piece.readiness_status = new_readiness_status
-
-                piece.updated = date.today()
-                return True
-            
-        return False
+
+    def edit_piece(self, piece_id, new_title, new_composer, new_genre, new_readiness_status,
+                   new_duration=KEEP):
+        self._materialize()
+        piece = self._by_id.get(piece_id)
+        if piece is None:
+            return False
+
+        self._unindex(piece)
+        piece.title = new_title
+        piece.composer = new_composer
+        piece.genre = new_genre
+        piece.readiness_status = new_readiness_status
+        if new_duration is not KEEP:
+            piece.duration = new_duration
+        self._index(piece)
+        if self._search is not None:
+            self._search.add(piece)
+
+        piece.updated = date.today()
+        self._notify("edit", piece)
+        return True
     
 
     def delete_piece(self, piece_id):
-        for piece in self.pieces:
-            if piece.piece_id == piece_id:
-                self.pieces.remove(piece)
-                return True
-        return False
+        self._materialize()
+        piece = self._by_id.pop(piece_id, None)
+        if piece is None:
+            return False
+        self._unindex(piece)
+        if self._search is not None:
+            self._search.remove(piece_id)
+        self._notify("delete", piece)
+        return True
+
+
+    # ----------- Lookups ----------- #
+
+    def get(self, piece_id):
+        if self._deferred is not None:
+            with self._building:
+                snapshot = self._deferred
+                if snapshot is not None:
+                    piece = self._decoded.get(piece_id)
+                    if piece is None:
+                        piece = snapshot.get(piece_id)
+                        if piece is not None:
+                            self._decoded[piece_id] = piece
+                    return piece
+        return self._by_id.get(piece_id)
+
+    def next_id(self):
+        """An id for a new piece (taken from the sequence, if there is one)."""
+        if self.ids is not None:
+            return self.ids.next(self.max_id)
+        return self.max_id + 1
+
+    def reserve_ids(self, n):
+        """n consecutive ids for new pieces, as a range."""
+        if self.ids is not None:
+            return self.ids.reserve(n, self.max_id)
+        return range(self.max_id + 1, self.max_id + 1 + n)
+
+    def with_readiness(self, readiness_status):
+        self._materialize()
+        return list(self._by_readiness.get(_norm(readiness_status), {}).values())
+
+    def bucket(self, attr, value):
+        """
+        Pieces whose readiness/composer/genre equals `value` (case-insensitive), as {piece_id: piece}.
+        The live index - don't modify it.
+        """
+        self._materialize()
+        index = {"readiness": self._by_readiness, "composer": self._by_composer, "genre": self._by_genre}[attr]
+        return index.get(_norm(value), {})
 
+    def sorted_keys(self, sort):
+        """
+        (sort key, piece_id) of every piece in `sort` order (see SORTS). The live list - don't modify it.
+        """
+        self._materialize()
+        keys = self._sorted.get(sort)
+        if keys is None:
+            key = SORTS[sort]
+            keys = self._sorted[sort] = sorted(key(p) for p in self._by_id.values())
+        return keys
+
+    def matching(self, attr, query):
+        """
+        Pieces whose composer/genre contains `query` (case-insensitive).
+        Only the distinct values are scanned, not every piece.
+        """
+        self._materialize()
+        index = {"composer": self._by_composer, "genre": self._by_genre}[attr]
+        query = _norm(query)
+        found = []
+        for key, bucket in index.items():
+            if query in key:
+                found.extend(bucket.values())
+        return found
+
+    def search(self, query, limit=None):
+        """
+        Ranked full-text search over title/composer/genre (see search.py).
+        """
+        self._materialize()
+        if self._search is None:
+            self._search = SearchIndex()
+            for piece in self._by_id.values():
+                self._search.add(piece)
+        return [self._by_id[pid] for pid, _ in self._search.search(query, limit)]
 
 
     # Displays all the pieces in no particular order
@@ -60,17 +297,13 @@ class PieceLibrary():
     def filter_by_readiness(self, readiness_status):
         found = False
 
-        for piece in self.pieces:
-            if piece.readiness_status.lower() == readiness_status.lower():
-                found = True
-                if piece.updated:
-                    print(f'{piece.piece_id} - {piece.title}: {piece.composer}, {piece.genre}, {piece.readiness_status}, {piece.created}, {piece.updated}')
-                else:
-                    print(f'{piece.piece_id} - {piece.title}: {piece.composer}, {piece.genre}, {piece.readiness_status}, {piece.created}')
+        for piece in self.with_readiness(readiness_status):
+            found = True
+            if piece.updated:
+                print(f'{piece.piece_id} - {piece.title}: {piece.composer}, {piece.genre}, {piece.readiness_status}, {piece.created}, {piece.updated}')
+            else:
+                print(f'{piece.piece_id} - {piece.title}: {piece.composer}, {piece.genre}, {piece.readiness_status}, {piece.created}')
 
         
         if not found:
             print(f'No pieces found with {readiness_status} readiness status.')
-
-    
-library = PieceLibrary()
\ No newline at end of file
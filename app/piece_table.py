@@ -0,0 +1,213 @@
+# app/piece_table.py
+# Columnar piece store for very large libraries (optional - PieceLibrary stays the default).
+# - one column per field instead of one object per piece: ids, readiness codes, durations and
+#   user ids are typed arrays (array module, or NumPy when installed), strings are
+#   interned so repeated composers/genres are stored once
+# - readiness/user filters are mask operations over whole columns, not Python loops
+# - deleted rows are tombstoned and swept out once they make up half the table
+# Rows come back out as regular Piece objects, so callers see the same attributes.
+
+import sys
+from array import array
+from itertools import compress
+from typing import Dict, Iterable, Iterator, List, Optional
+try:
+    from . import piece_logic as tpl
+    from .services import READINESS
+except ImportError:
+    import piece_logic as tpl
+    from services import READINESS
+
+try:
+    import numpy as np
+except ImportError:      # optional: the array module + itertools.compress fallback is used
+    np = None
+
+OTHER = len(READINESS)      # readiness code for values outside READINESS (kept as text)
+NO_DURATION = -1
+_CODES = {r: i for i, r in enumerate(READINESS)}
+
+
+def readiness_code(value) -> int:
+    return _CODES.get(tpl._norm(value), OTHER)
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class PieceTable:
+    def __init__(self, pieces: Iterable[tpl.Piece] = ()):
+        self.ids = array("q")
+        self.readiness = array("b")
+        self.user_ids = array("q")
+        self.durations = array("l")                  # seconds, NO_DURATION if unknown
+        self.alive = array("b")
+        self.titles: List[str] = []
+        self.composers: List[str] = []
+        self.genres: List[str] = []
+        self.created: List[Optional[str]] = []
+        self.updated: List[Optional[str]] = []
+        self._other_readiness: Dict[int, str] = {}    # row -> raw value, for codes == OTHER
+        self._row: Dict[int, int] = {}               # piece_id -> row
+        for piece in pieces:
+            self.append(piece)
+
+    def __len__(self):
+        return len(self._row)
+
+    def __iter__(self) -> Iterator[tpl.Piece]:
+        return (self._piece(row) for row in compress(range(len(self.ids)), self.alive))
+
+    def __contains__(self, piece_id):
+        return piece_id in self._row
+
+    # ----------- Writes ----------- #
+
+    def append(self, piece: tpl.Piece) -> None:
+        if piece.piece_id in self._row:
+            self.update(piece)
+            return
+        row = len(self.ids)
+        self._row[piece.piece_id] = row
+        self.ids.append(piece.piece_id)
+        self.user_ids.append(piece.user_id or 0)
+        self.durations.append(NO_DURATION if piece.duration is None else piece.duration)
+        self.alive.append(1)
+        self.titles.append(_intern(piece.title))
+        self.composers.append(_intern(piece.composer))
+        self.genres.append(_intern(piece.genre))
+        self.created.append(_intern(_text(piece.created)))
+        self.updated.append(_intern(_text(piece.updated)))
+        self.readiness.append(0)
+        self._set_readiness(row, piece.readiness_status)
+
+    def update(self, piece: tpl.Piece) -> bool:
+        row = self._row.get(piece.piece_id)
+        if row is None:
+            return False
+        self.user_ids[row] = piece.user_id or 0
+        self.durations[row] = NO_DURATION if piece.duration is None else piece.duration
+        self.titles[row] = _intern(piece.title)
+        self.composers[row] = _intern(piece.composer)
+        self.genres[row] = _intern(piece.genre)
+        self.created[row] = _intern(_text(piece.created))
+        self.updated[row] = _intern(_text(piece.updated))
+        self._set_readiness(row, piece.readiness_status)
+        return True
+
+    def delete(self, piece_id: int) -> bool:
+        row = self._row.pop(piece_id, None)
+        if row is None:
+            return False
+        self.alive[row] = 0
+        self._other_readiness.pop(row, None)
+        if len(self._row) * 2 < len(self.ids):
+            self._sweep()
+        return True
+
+    def _set_readiness(self, row: int, value) -> None:
+        code = readiness_code(value)
+        self.readiness[row] = code
+        if code == OTHER:
+            self._other_readiness[row] = value
+        else:
+            self._other_readiness.pop(row, None)
+
+    def _sweep(self) -> None:
+        # rebuild without the tombstoned rows (keeps insertion order)
+        pieces = list(self)
+        self.__init__(pieces)
+
+    # ----------- Reads ----------- #
+
+    def _piece(self, row: int) -> tpl.Piece:
+        code = self.readiness[row]
+        readiness = READINESS[code] if code != OTHER else self._other_readiness.get(row)
+        duration = self.durations[row]
+        p = tpl.Piece(self.ids[row], self.titles[row], self.composers[row], self.genres[row],
+                      readiness, self.user_ids[row], None if duration == NO_DURATION else duration)
+        p.created = self.created[row]
+        p.updated = self.updated[row]
+        return p
+
+    def get(self, piece_id: int) -> Optional[tpl.Piece]:
+        row = self._row.get(piece_id)
+        return None if row is None else self._piece(row)
+
+    def _mask(self, code: Optional[int], user_id: Optional[int]):
+        # one byte/bool per row: live and matching every given filter
+        if np is not None:
+            mask = np.frombuffer(self.alive, dtype=np.int8).astype(bool)
+            if code is not None:
+                mask &= np.frombuffer(self.readiness, dtype=np.int8) == code
+            if user_id is not None:
+                mask &= np.frombuffer(self.user_ids, dtype=np.int64) == user_id
+            return mask
+
+        # no NumPy: bytes.translate / map run the comparisons in C, big-int & combines them
+        mask = None if len(self._row) == len(self.ids) else bytes(self.alive)
+        if code is not None:
+            mask = _and(mask, _equals(self.readiness, code))
+        if user_id is not None:
+            mask = _and(mask, bytes(map(user_id.__eq__, self.user_ids)))
+        return bytes(self.alive) if mask is None else mask
+
+    def _other_rows(self, readiness, user_id: Optional[int]) -> List[int]:
+        # free-text readiness values are rare: check those rows one by one
+        wanted = tpl._norm(readiness)
+        return sorted(r for r, v in self._other_readiness.items()
+                      if tpl._norm(v) == wanted and (user_id is None or self.user_ids[r] == user_id))
+
+    def rows(self, readiness=None, user_id: Optional[int] = None) -> List[int]:
+        """
+        Row numbers of the live pieces matching every given filter, computed as column masks.
+        """
+        code = None if readiness is None else readiness_code(readiness)
+        if code == OTHER:
+            return self._other_rows(readiness, user_id)
+        mask = self._mask(code, user_id)
+        if np is not None:
+            return np.flatnonzero(mask).tolist()
+        return list(compress(range(len(self.ids)), mask))
+
+    def filter(self, readiness=None, user_id: Optional[int] = None) -> List[tpl.Piece]:
+        return [self._piece(r) for r in self.rows(readiness, user_id)]
+
+    def count(self, readiness=None, user_id: Optional[int] = None) -> int:
+        code = None if readiness is None else readiness_code(readiness)
+        if code == OTHER:
+            return len(self._other_rows(readiness, user_id))
+        mask = self._mask(code, user_id)
+        return int(np.count_nonzero(mask)) if np is not None else mask.count(1)
+
+    def to_library(self) -> tpl.PieceLibrary:
+        lib = tpl.PieceLibrary()
+        lib.pieces = list(self)
+        return lib
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the columns (strings counted once, as they are interned)."""
+        size = sum(col.itemsize * len(col) for col in (self.ids, self.readiness, self.user_ids,
+                                                             self.durations, self.alive))
+        size += sum(sys.getsizeof(col) for col in (self.titles, self.composers, self.genres,
+                                                  self.created, self.updated, self._row))
+        strings = {id(s): s for col in (self.titles, self.composers, self.genres) for s in col}
+        size += sum(sys.getsizeof(s) for s in strings.values())
+        return size
+
+
+def _text(value):
+    return str(value) if value else None
+
+# translate tables: byte value -> 1 if it equals the code, else 0
+_EQ_TABLES = {code: bytes(1 if (b if b < 128 else b - 256) == code else 0 for b in range(256))
+              for code in range(OTHER + 1)}
+
+def _equals(col: array, code: int) -> bytes:
+    return col.tobytes().translate(_EQ_TABLES[code])
+
+def _and(a: Optional[bytes], b: bytes) -> bytes:
+    if a is None:
+        return b
+    n = len(a)
+    return (int.from_bytes(a, "little") & int.from_bytes(b, "little")).to_bytes(n, "little")
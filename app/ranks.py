@@ -0,0 +1,70 @@
+# app/ranks.py
+# Fractional rank keys: strings that sort in list order, so an item is moved by giving
+# it a key between its new neighbours' keys - no other item changes.
+# - digits 0-9A-Za-z (ASCII order = digit order), read as a base-62 fraction 0.xyz...
+# - keys never end in "0", so there is always room for another key between two keys
+# - between() adds about one character per six halvings of the same gap; lists whose
+#   keys got longer than MAX_LENGTH are rebalanced with spread() (short, evenly spaced keys)
+# - after() is for appending: it counts the last digit up, so a list that only grows at
+#   the end gets one character longer per ~36 appends
+
+from typing import List, Optional
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+MAX_LENGTH = 12
+
+_VALUE = {d: i for i, d in enumerate(DIGITS)}
+
+
+def between(before: str = "", after: Optional[str] = None) -> str:
+    """
+    A key that sorts after `before` and before `after`.
+    "" is below every key, None above every key.
+    """
+    if before.endswith("0") or (after is not None and (after.endswith("0") or before >= after)):
+        raise ValueError(f"no rank key between {before!r} and {after!r}")
+    out = []
+    i = 0
+    while True:
+        lo = _VALUE[before[i]] if i < len(before) else 0
+        hi = _VALUE[after[i]] if after is not None else BASE
+        if lo == hi:                    # common prefix
+            out.append(DIGITS[lo])
+            i += 1
+            continue
+        if hi - lo > 1:
+            out.append(DIGITS[(lo + hi) // 2])
+            return "".join(out)
+        # neighbouring digits: after's digit alone still sorts below the longer `after`
+        if after is not None and i + 1 < len(after):
+            out.append(after[i])
+            return "".join(out)
+        # otherwise keep before's digit and find room above the rest of `before`
+        out.append(DIGITS[lo])
+        i += 1
+        after = None
+
+def after(key: str) -> str:
+    """A key that sorts after `key`, with no upper bound."""
+    if not key:
+        return between()
+    last = _VALUE[key[-1]]
+    if last + 1 < BASE:
+        return key[:-1] + DIGITS[last + 1]
+    return key + DIGITS[BASE // 2]
+
+def spread(n: int) -> List[str]:
+    """n keys in ascending order, evenly spaced and as short as possible."""
+    width = 1
+    while BASE ** width <= n:
+        width += 1
+    step = BASE ** width // (n + 1)
+    keys = []
+    for i in range(1, n + 1):
+        value, digits = i * step, []
+        for _ in range(width):
+            value, d = divmod(value, BASE)
+            digits.append(DIGITS[d])
+        keys.append("".join(reversed(digits)).rstrip("0"))
+    return keys
@@ -0,0 +1,278 @@
+# app/repository.py
+# Shared in-memory copy of the piece library and the setlists for long-running
+# processes (web workers).
+# - the backend is read once per process and reads are served from memory
+# - the copy is reloaded only when the backend's stamp changes (CSV mtime/size,
+#   SQLite generation counter), i.e. another process wrote to it
+# - hits/misses are counted so we can check the cache is doing its job
+# - writes go through writing(): storage lock (across processes) -> refresh if another
+#   process wrote meanwhile -> mutate -> persist, so ids never collide and no write is lost
+# - new ids come from the dataset's persistent sequences (next_id() / reserve_ids())
+
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+try:
+    from . import iostats
+    from . import piece_logic as tpl
+    from . import setlist_logic as sl
+    from .backends import StorageBackend, CsvBackend, use_sequences
+    from .locking import StaleWriteError
+except ImportError:
+    import iostats
+    import piece_logic as tpl
+    import setlist_logic as sl
+    from backends import StorageBackend, CsvBackend, use_sequences
+    from locking import StaleWriteError
+
+
+class PieceRepository:
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+        self.library = tpl.PieceLibrary()
+        use_sequences(backend, self.library)
+        self.lock = threading.RLock()
+
+        self.generation = 0             # bumped on every (re)load and write
+        self.modified: Optional[float] = None   # when this process last saw the data change
+        self.hits = 0
+        self.misses = 0
+        self._stamp = None
+        self._loaded = False
+
+    def get(self) -> tpl.PieceLibrary:
+        """
+        Returns the cached library, reloading it first if the stored data changed.
+        """
+        with self.lock:
+            stamp = self.backend.pieces_stamp()
+            if self._loaded and stamp == self._stamp:
+                self.hits += 1
+                return self.library
+
+            self.misses += 1
+            # load and stamp under the storage lock: a write landing in between would
+            # otherwise be stamped as seen without being loaded
+            with self.backend.locked(), iostats.timed():
+                self.backend.load_library(self.library)
+                self._stamp = self.backend.pieces_stamp()   # loading may have created the file
+            self._loaded = True
+            self.generation += 1
+            self.modified = time.time()
+            return self.library
+
+    @property
+    def version(self) -> str:
+        """
+        Short token for the stored data as last seen. Same data -> same token in every
+        process, so clients can send it back to detect stale writes. Includes the dataset,
+        so two users' partitions never share a token.
+        """
+        return hashlib.sha1(repr((self.backend.key, self._stamp)).encode()).hexdigest()[:16]
+
+    @contextmanager
+    def writing(self, expected_version: Optional[str] = None) -> Iterator[tpl.PieceLibrary]:
+        """
+        Yields the up-to-date library with the storage lock held. Persist changes with
+        insert()/update()/remove()/save() inside the block.
+
+        With expected_version, the write is rejected (StaleWriteError) if the data
+        changed since the caller read it, instead of being applied on top.
+        """
+        with self.lock, self.backend.locked():
+            library = self.get()
+            if expected_version is not None and expected_version != self.version:
+                raise StaleWriteError(f"data changed since version {expected_version} (now {self.version})")
+            yield library
+
+    def _wrote(self) -> None:
+        # remember the new stamp so our own write does not count as an outside change
+        self._stamp = self.backend.pieces_stamp()
+        self.generation += 1
+        self.modified = time.time()
+
+    def insert(self, piece: tpl.Piece) -> None:
+        """Persists a piece already added to the cached library."""
+        with self.lock, iostats.timed(save=True):
+            self.backend.insert_piece(piece, self.library)
+            self._wrote()
+
+    def insert_many(self, pieces: List[tpl.Piece]) -> None:
+        """Persists a batch of pieces already added to the cached library."""
+        with self.lock, iostats.timed(save=True):
+            self.backend.insert_pieces(pieces, self.library)
+            self._wrote()
+
+    def update(self, piece: tpl.Piece) -> None:
+        with self.lock, iostats.timed(save=True):
+            self.backend.update_piece(piece, self.library)
+            self._wrote()
+
+    def remove(self, piece_id: int) -> None:
+        """Persists a delete already applied to the cached library."""
+        with self.lock, iostats.timed(save=True):
+            self.backend.delete_piece(piece_id, self.library)
+            self._wrote()
+
+    def apply(self, ops: List[tuple]) -> None:
+        """
+        Persists a batch already applied to the cached library in one write:
+        ("add", piece), ("edit", piece), ("delete", piece_id).
+        """
+        with self.lock, iostats.timed(save=True):
+            self.backend.write_piece_batch(ops, self.library)
+            self._wrote()
+
+    def save(self) -> None:
+        """Writes the whole cached library back to storage."""
+        with self.lock, iostats.timed(save=True):
+            self.backend.save_pieces(self.library.pieces)
+            self._wrote()
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self._loaded = False
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "pieces": len(self.library),
+            "generation": self.generation,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / total) if total else 0.0,
+        }
+
+
+class SetlistRepository:
+    """
+    The same for performances + setlist items: cached, reloaded on outside writes,
+    written through writing() with the storage lock held.
+    """
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+        self.performances = sl.Performances()
+        self.items = sl.SetlistStore()
+        self.lock = threading.RLock()
+        self.generation = 0
+        self.modified: Optional[float] = None
+        self._stamp = None
+        self._loaded = False
+        self._totals: Optional[sl.SetlistTotals] = None
+
+    def get(self) -> Tuple[sl.Performances, sl.SetlistStore]:
+        with self.lock:
+            if self._loaded and self.backend.setlists_stamp() == self._stamp:
+                return self.performances, self.items
+            with self.backend.locked(), iostats.timed():
+                loaded, self.items = self.backend.load_setlists()
+                self._stamp = self.backend.setlists_stamp()
+            self.performances = sl.Performances(loaded)
+            use_sequences(self.backend, performances=self.performances, items=self.items)
+            self._loaded = True
+            self.generation += 1
+            self.modified = time.time()
+            return self.performances, self.items
+
+    @contextmanager
+    def writing(self) -> Iterator[Tuple[sl.Performances, sl.SetlistStore]]:
+        """
+        Yields the up-to-date (performances, items) with the storage lock held.
+        Persist changes with the methods below inside the block.
+        """
+        with self.lock, self.backend.locked():
+            yield self.get()
+
+    def _wrote(self) -> None:
+        self._stamp = self.backend.setlists_stamp()
+        self.generation += 1
+        self.modified = time.time()
+
+    def _persist(self, method: str, value) -> None:
+        with self.lock, iostats.timed(save=True):
+            getattr(self.backend, method)(value, self.performances, self.items)
+            self._wrote()
+
+    def insert_performance(self, perf: sl.Performance) -> None:
+        self._persist("insert_performance", perf)
+
+    def update_performance(self, perf: sl.Performance) -> None:
+        self._persist("update_performance", perf)
+
+    def delete_performance(self, performance_id: int) -> None:
+        self._persist("delete_performance", performance_id)
+
+    def insert_item(self, item: sl.Setlist_Item) -> None:
+        self._persist("insert_setlist_item", item)
+
+    def delete_item(self, item: sl.Setlist_Item) -> None:
+        self._persist("delete_setlist_item", item)
+
+    def move_item(self, item: sl.Setlist_Item) -> None:
+        self._persist("move_setlist_item", item)
+
+    def reorder(self, performance_id: int) -> None:
+        self._persist("reorder_setlist", performance_id)
+
+    def clear(self, performance_id: int) -> None:
+        self._persist("clear_setlist", performance_id)
+
+    def save(self) -> None:
+        """Writes every performance and item back in one write (bulk changes)."""
+        with self.lock, iostats.timed(save=True):
+            self.backend.save_setlists(self.performances, self.items)
+            self._wrote()
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self._loaded = False
+
+    def totals(self, library: tpl.PieceLibrary) -> sl.SetlistTotals:
+        """
+        Piece count + runtime per setlist, with durations from `library`. Built once per
+        loaded item store, then kept current by the item and piece change events.
+        """
+        with self.lock:
+            _, items = self.get()
+            totals = self._totals
+            if totals is None or totals.items is not items or totals.library is not library:
+                if totals is not None:
+                    totals.detach()
+                totals = self._totals = sl.SetlistTotals(items, library)
+            return totals
+
+    @property
+    def version(self) -> str:
+        return hashlib.sha1(repr((self.backend.key, self._stamp)).encode()).hexdigest()[:16]
+
+
+# ----------- Process-wide registry ----------- #
+
+_repositories: Dict[tuple, PieceRepository] = {}
+_setlist_repositories: Dict[tuple, SetlistRepository] = {}
+_registry_lock = threading.Lock()
+
+def get_piece_repository(backend) -> PieceRepository:
+    """
+    One repository per dataset per process, so every request shares the same copy.
+    Accepts a backend, or a CSV path as shorthand for CsvBackend(path).
+    """
+    if isinstance(backend, str):
+        backend = CsvBackend(backend)
+    with _registry_lock:
+        repo = _repositories.get(backend.key)
+        if repo is None:
+            repo = _repositories[backend.key] = PieceRepository(backend)
+        return repo
+
+def get_setlist_repository(backend: StorageBackend) -> SetlistRepository:
+    """One setlist repository per dataset per process."""
+    with _registry_lock:
+        repo = _setlist_repositories.get(backend.key)
+        if repo is None:
+            repo = _setlist_repositories[backend.key] = SetlistRepository(backend)
+        return repo
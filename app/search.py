@@ -0,0 +1,120 @@
+# app/search.py
+# Full-text search over piece title/composer/genre.
+# - inverted index: token -> {piece_id: weight}, updated one piece at a time
+# - every query term must match (AND); a term matches whole tokens or token prefixes
+# - ranking: field weight (title > composer > genre), exact > prefix, rarer tokens count more
+
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+FIELD_WEIGHTS = {"title": 3.0, "composer": 2.0, "genre": 1.0}
+PREFIX_FACTOR = 0.5   # a prefix hit counts half as much as a whole-word hit
+
+_TOKEN = re.compile(r"\w+")
+
+def tokenize(text) -> List[str]:
+    """
+    Lowercase, accent-free word tokens ("Für Elise" -> ["fur", "elise"]).
+    """
+    return list(_tokens(str(text or "")))
+
+# composer/genre values repeat a lot, so tokenized strings are cached
+@lru_cache(maxsize=8192)
+def _tokens(text: str) -> Tuple[str, ...]:
+    if text.isascii():
+        return tuple(_TOKEN.findall(text.lower()))
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return tuple(_TOKEN.findall(text))
+
+
+class SearchIndex:
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._doc_tokens: Dict[int, Set[str]] = {}
+        self._vocab: List[str] = []    # sorted, for prefix lookups
+
+    def __len__(self):
+        return len(self._doc_tokens)
+
+    def add(self, piece) -> None:
+        if piece.piece_id in self._doc_tokens:
+            self.remove(piece.piece_id)
+
+        weights: Dict[str, float] = {}
+        for field, w in FIELD_WEIGHTS.items():
+            for tok in _tokens(str(getattr(piece, field, "") or "")):
+                weights[tok] = weights.get(tok, 0.0) + w
+
+        for tok, w in weights.items():
+            posting = self._postings.get(tok)
+            if posting is None:
+                posting = self._postings[tok] = {}
+                bisect.insort(self._vocab, tok)
+            posting[piece.piece_id] = w
+        self._doc_tokens[piece.piece_id] = set(weights)
+
+    def remove(self, piece_id: int) -> None:
+        for tok in self._doc_tokens.pop(piece_id, ()):
+            posting = self._postings[tok]
+            posting.pop(piece_id, None)
+            if not posting:
+                del self._postings[tok]
+                i = bisect.bisect_left(self._vocab, tok)
+                del self._vocab[i]
+
+    def _prefixed(self, prefix: str) -> List[str]:
+        i = bisect.bisect_left(self._vocab, prefix)
+        out = []
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix):
+            out.append(self._vocab[i])
+            i += 1
+        return out
+
+    def _term_scores(self, term: str, toks: List[str], only: Optional[Dict[int, float]] = None) -> Dict[int, float]:
+        """
+        Best score per piece for one query term. With `only`, just those pieces are looked up.
+        """
+        n = len(self._doc_tokens)
+        scores: Dict[int, float] = {}
+        for tok in toks:
+            posting = self._postings[tok]
+            mult = (1.0 if tok == term else PREFIX_FACTOR) * math.log(1 + n / len(posting))
+            if only is not None and len(only) < len(posting):
+                hits = ((pid, posting[pid]) for pid in only if pid in posting)
+            else:
+                hits = posting.items()
+            for pid, w in hits:
+                s = w * mult
+                if s > scores.get(pid, 0.0):
+                    scores[pid] = s
+        return scores
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Returns (piece_id, score) pairs, best first. Every term in the query must match.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        # start from the rarest term, then only look up the surviving candidates for the rest
+        expanded = [(t, self._prefixed(t)) for t in terms]
+        expanded.sort(key=lambda e: sum(len(self._postings[tok]) for tok in e[1]))
+
+        totals = self._term_scores(*expanded[0])
+        for term, toks in expanded[1:]:
+            if not totals:
+                return []
+            scores = self._term_scores(term, toks, only=totals)
+            totals = {pid: s + scores[pid] for pid, s in totals.items() if pid in scores}
+
+        order = lambda kv: (-kv[1], kv[0])
+        if limit:
+            return heapq.nsmallest(limit, totals.items(), key=order)
+        return sorted(totals.items(), key=order)
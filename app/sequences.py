@@ -0,0 +1,134 @@
+# app/sequences.py
+# Persistent id sequences, one per kind of record ("piece", "performance", "setlist_item"),
+# stored with the data (sequences.json next to the CSV files, a table in SQLite).
+# Ids only go up: a deleted record's id is never handed out again.
+# - next() is O(1): ids come out of a block reserved in advance, so the store is
+#   written once per BLOCK ids instead of once per id
+# - reserve(n) takes n consecutive ids in one go (bulk imports, batch endpoints)
+# - blocks are reserved under the dataset's storage lock, so processes sharing the data
+#   never get the same id (increasing within a process, unique across processes)
+# - no id at or below the highest id already in the data is handed out (data saved
+#   before sequences existed, hand-edited CSV files)
+# - release() gives the unused rest of a block back if nothing was reserved after it,
+#   so a CLI session that adds two pieces doesn't leave a gap of BLOCK ids
+
+import json
+import os
+import threading
+from typing import Dict
+try:
+    from . import iostats
+    from .locking import atomic_write
+except ImportError:
+    import iostats
+    from locking import atomic_write
+
+KINDS = ("piece", "performance", "setlist_item")
+BLOCK = 32
+SEQUENCES_NAME = "sequences.json"
+
+
+class Sequence:
+    """
+    Hands out the ids of one sequence from a reserved block. `store` is the backend:
+    store.reserve_ids(name, n, floor) -> first id, store.release_ids(name, reserved_to, used_to).
+    """
+    def __init__(self, name: str, store, block: int = BLOCK):
+        self.name = name
+        self.store = store
+        self.block = block
+        self._next = 0      # ids _next .. _end - 1 are reserved and unused
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def next(self, floor: int = 0) -> int:
+        """A new id above floor (the highest id in the caller's data)."""
+        return self.reserve(1, floor)[0]
+
+    def reserve(self, n: int, floor: int = 0) -> range:
+        """n new consecutive ids above floor."""
+        with self._lock:
+            start = max(self._next, floor + 1)
+            if start + n <= self._end:
+                self._next = start + n
+                return range(start, start + n)
+        # out of reserved ids: take a new block, without holding our lock while
+        # waiting for the storage lock
+        size = max(n, self.block)
+        first = self.store.reserve_ids(self.name, size, floor)
+        with self._lock:
+            start = max(self._next, floor + 1)
+            if first == self._end and start + n <= first + size:
+                # nobody reserved in between: carry on from the old block without a gap
+                self._next, self._end = start + n, first + size
+                return range(start, start + n)
+            if first + size > self._end:    # another thread may have got a newer block meanwhile
+                self._next, self._end = first + n, first + size
+        return range(first, first + n)
+
+    def release(self) -> None:
+        """Gives back the unused ids of the current block (they stay skipped if that's too late)."""
+        with self._lock:
+            reserved_to, used_to = self._end - 1, self._next - 1
+            self._next = self._end = 0
+        if used_to < reserved_to:
+            self.store.release_ids(self.name, reserved_to, used_to)
+
+
+# ----------- Per-dataset registry ----------- #
+
+_sequences: Dict[tuple, Sequence] = {}
+_guard = threading.Lock()
+
+def for_backend(backend, name: str) -> Sequence:
+    """The process-wide sequence `name` of the backend's dataset (one per dataset, like lock_for)."""
+    if name not in KINDS:
+        raise ValueError(f"Unknown sequence '{name}'. Options: {list(KINDS)}")
+    key = (backend.key, name)
+    with _guard:
+        seq = _sequences.get(key)
+        if seq is None:
+            seq = _sequences[key] = Sequence(name, backend)
+        else:
+            seq.store = backend     # the newest backend object for the data (older ones may be closed)
+        return seq
+
+def release(backend) -> None:
+    """Gives back the unused ids of every sequence of the backend's dataset (on close)."""
+    with _guard:
+        seqs = [seq for (key, _), seq in _sequences.items() if key == backend.key]
+    for seq in seqs:
+        seq.release()
+
+
+# ----------- File store (CSV / journal backends) ----------- #
+# The caller holds the storage lock.
+
+def read_file(path: str) -> Dict[str, int]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        return {}
+    iostats.read(len(text))
+    return {name: int(value) for name, value in json.loads(text or "{}").items()}
+
+def write_file(path: str, values: Dict[str, int]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    text = json.dumps(values, sort_keys=True)
+    with atomic_write(path) as f:
+        f.write(text)
+    iostats.wrote(len(text))
+
+def reserve_in_file(path: str, name: str, n: int, floor: int = 0) -> int:
+    values = read_file(path)
+    first = max(values.get(name, 0), floor) + 1
+    values[name] = first + n - 1
+    write_file(path, values)
+    return first
+
+def release_in_file(path: str, name: str, reserved_to: int, used_to: int) -> None:
+    values = read_file(path)
+    if values.get(name) == reserved_to:
+        values[name] = used_to
+        write_file(path, values)
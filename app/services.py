@@ -1,3 +1,4 @@
+import math
 try: 
     from . import piece_logic as tpl
     from . import setlist_logic as sl
@@ -6,38 +7,130 @@ except ImportError:
     import setlist_logic as sl
 
 READINESS = ["learning", "rehearsing", "performance-ready"]
+MAX_TIME_SLOT = 24 * 3600       # seconds; the longest slot the setlist builder fills
+
+def normalize_readiness(value):
+    """
+    "Performance ready" / "performance_ready" -> "performance-ready".
+    Returns None if the value is not one of READINESS.
+    """
+    r = (value or "").strip().lower().replace(" ", "-").replace("_", "-")
+    return r if r in READINESS else None
+
+def parse_duration(value):
+    """
+    "4:30" / "1:02:03" / "270" (seconds) -> seconds; ints and whole-number floats (JSON)
+    count as seconds. Empty -> None. Raises ValueError for anything else.
+    """
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if value is None:
+        text = ""
+    elif isinstance(value, str):
+        text = value.strip()
+    elif isinstance(value, int) and not isinstance(value, bool):
+        text = str(value)
+    else:
+        raise ValueError(f"bad duration '{value}' (use m:ss, h:mm:ss or seconds)")
+    if not text:
+        return None
+    parts = text.split(":")
+    if len(parts) > 3 or not all(p.isdigit() for p in parts) or any(int(p) >= 60 for p in parts[1:]):
+        raise ValueError(f"bad duration '{value}' (use m:ss, h:mm:ss or seconds)")
+    seconds = 0
+    for p in parts:
+        seconds = seconds * 60 + int(p)
+    return seconds
+
+def parse_time_slot(value):
+    """
+    parse_duration for the setlist builder's target: required and at most MAX_TIME_SLOT.
+    Raises ValueError otherwise.
+    """
+    target = parse_duration(value)
+    if not target:
+        raise ValueError("A time slot is needed.")
+    if target > MAX_TIME_SLOT:
+        raise ValueError(f"A time slot can be at most {format_duration(MAX_TIME_SLOT)}.")
+    return target
+
+def parse_genre_mix(text):
+    """
+    "Jazz:2, Classical:1" -> {"Jazz": 2.0, "Classical": 1.0}; a genre without a weight
+    counts 1. A {genre: weight} dict (JSON) is checked the same way. Empty -> None (any genre).
+    Raises ValueError for a bad weight or anything else.
+    """
+    if isinstance(text, dict):
+        pairs = [(str(genre), weight, f"{genre}:{weight}") for genre, weight in text.items()]
+    elif text is None or isinstance(text, str):
+        pairs = []
+        for part in (text or "").split(","):
+            genre, _, weight = part.partition(":")
+            pairs.append((genre, weight.strip() or 1.0, part.strip()))
+    else:
+        raise ValueError("genre mix must look like 'Jazz:2, Classical:1'")
+    mix = {}
+    for genre, weight, shown in pairs:
+        if not genre.strip():
+            continue
+        try:
+            if isinstance(weight, bool) or not isinstance(weight, (str, int, float)):
+                raise ValueError
+            weight = float(weight)
+            if not math.isfinite(weight):
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"bad weight in '{shown}' (use genre:weight)")
+        mix[genre.strip()] = weight
+    return mix or None
+
+def format_duration(seconds):
+    """270 -> "4:30", 3723 -> "1:02:03", None -> ""."""
+    if seconds is None:
+        return ""
+    h, rest = divmod(int(seconds), 3600)
+    m, s = divmod(rest, 60)
+    return f"{h}:{m:02}:{s:02}" if h else f"{m}:{s:02}"
 
 # ----------- Pieces ----------- #
 
 def _next_piece_id(lib: tpl.PieceLibrary) -> int:
-    return max([p.piece_id for p in lib.pieces], default=0) + 1
+    return lib.next_id()
 
 def piece_exists(lib: tpl.PieceLibrary, pid: int) -> bool:
-    return any(p.piece_id == pid for p in lib.pieces)
+    return lib.get(pid) is not None
 
 def _fmt_piece(p: tpl.Piece) -> str:
-    return f"#{p.piece_id} {p.title} — {p.composer} [{p.genre}] readiness={p.readiness_status}"
+    length = f" ({format_duration(p.duration)})" if p.duration is not None else ""
+    return f"#{p.piece_id} {p.title} — {p.composer} [{p.genre}] readiness={p.readiness_status}{length}"
+
+def _ask_duration(prompt: str, default=None):
+    while True:
+        raw = input(prompt).strip()
+        if not raw:
+            return default
+        try:
+            return parse_duration(raw)
+        except ValueError as e:
+            print(e)
 
 def list_pieces(lib: tpl.PieceLibrary) -> None:
-    if not lib.pieces:
+    if not len(lib):
         print("No pieces yet."); return
     for p in lib.pieces:
         print("-", _fmt_piece(p))
 
-def add_piece(lib: tpl.PieceLibrary) -> None:
+def add_piece(lib: tpl.PieceLibrary, user_id: int = 0) -> None:
     title = input("Title: ").strip()
     if not title:
         print("Title is required."); return
     composer = input("Composer: ").strip()
     genre = input("Genre/Key: ").strip()
     print(f"Readiness options: {READINESS}")
-    r = (input("Readiness [learning]: ").strip().lower() or "learning")
-    r = r.replace(" ", "-").replace("_", "-")
-    if r not in READINESS:
-        r = "learning"
+    r = normalize_readiness(input("Readiness [learning]: ")) or "learning"
+    duration = _ask_duration("Duration (m:ss, optional): ")
 
-    p = tpl.Piece(_next_piece_id(lib), title, composer, genre, r, user_id=0)
-    lib.add_piece(p)
+    create_piece(lib, title, composer, genre, r, duration, user_id)
     print("Added.")
 
 def edit_piece(lib: tpl.PieceLibrary) -> None:
@@ -46,20 +139,17 @@ def edit_piece(lib: tpl.PieceLibrary) -> None:
     except ValueError:
         print("Invalid id."); return
 
-    cur = next((x for x in lib.pieces if x.piece_id == pid), None)
+    cur = lib.get(pid)
     if not cur:
         print("Not found."); return
 
     title = input(f"Title [{cur.title}]: ").strip() or cur.title
     composer = input(f"Composer [{cur.composer}]: ").strip() or cur.composer
     genre = input(f"Genre/Key [{cur.genre}]: ").strip() or cur.genre
-    r = (input(f"Readiness {READINESS} [{cur.readiness_status}]: ").strip().lower()
-         or cur.readiness_status)
-    r = r.replace(" ", "-").replace("_", "-")
-    if r not in READINESS:
-        r = cur.readiness_status
+    r = normalize_readiness(input(f"Readiness {READINESS} [{cur.readiness_status}]: ")) or cur.readiness_status
+    duration = _ask_duration(f"Duration [{format_duration(cur.duration)}]: ", cur.duration)
 
-    lib.edit_piece(pid, title, composer, genre, r)
+    update_piece(lib, pid, title, composer, genre, r, duration)
     print("Updated.")
 
 def delete_piece(lib: tpl.PieceLibrary) -> None:
@@ -70,16 +160,51 @@ def delete_piece(lib: tpl.PieceLibrary) -> None:
     ok = lib.delete_piece(pid)
     print("Deleted." if ok else "Not found.")
 
+# the checks behind the prompts, also used by batch mode (batch.py): bad input -> ValueError
+
+def create_piece(lib: tpl.PieceLibrary, title, composer="", genre="", readiness="learning",
+                 duration=None, user_id: int = 0) -> tpl.Piece:
+    title = str(title or "").strip()
+    if not title:
+        raise ValueError("Title is required.")
+    p = tpl.Piece(_next_piece_id(lib), title, str(composer or "").strip(), str(genre or "").strip(),
+                  _readiness(readiness), user_id=int(user_id), duration=parse_duration(duration))
+    lib.add_piece(p)
+    return p
+
+def update_piece(lib: tpl.PieceLibrary, pid: int, title=None, composer=None, genre=None, readiness=None,
+                 duration=tpl.KEEP) -> tpl.Piece:
+    """Fields left as None (duration: KEEP) stay as they are; an empty title is kept too."""
+    cur = lib.get(pid)
+    if not cur:
+        raise ValueError(f"Piece {pid} not found.")
+    lib.edit_piece(pid, str(title or "").strip() or cur.title,
+                   cur.composer if composer is None else str(composer).strip(),
+                   cur.genre if genre is None else str(genre).strip(),
+                   cur.readiness_status if readiness is None else _readiness(readiness),
+                   duration if duration is tpl.KEEP else parse_duration(duration))
+    return cur
+
+def remove_piece(lib: tpl.PieceLibrary, pid: int) -> None:
+    if not lib.delete_piece(pid):
+        raise ValueError(f"Piece {pid} not found.")
+
+def _readiness(value) -> str:
+    r = normalize_readiness(str(value))
+    if r is None:
+        raise ValueError(f"Unknown status '{value}' (options: {', '.join(READINESS)}).")
+    return r
+
 def filter_by_readiness(lib: tpl.PieceLibrary) -> None:
     print(f"\nReadiness options: {READINESS}")
-    val = (input("Show pieces with status: ").strip().lower()
-           .replace(" ", "-").replace("_", "-"))
-    if not val:
+    raw = input("Show pieces with status: ").strip()
+    if not raw:
         print("No status entered."); return
-    if val not in READINESS:
-        print(f"Unknown status '{val}'."); return
+    val = normalize_readiness(raw)
+    if val is None:
+        print(f"Unknown status '{raw.lower()}'."); return
 
-    matches = [p for p in lib.pieces if (getattr(p, "readiness_status", "") or "").lower() == val]
+    matches = lib.with_readiness(val)
     if not matches:
         print(f"No pieces found with readiness '{val}'.")
     else:
@@ -94,32 +219,42 @@ def filter_by_attribute(lib: tpl.PieceLibrary) -> None:
     if not attr:
         print("Invalid option."); return
     q = input(f"Enter {attr}: ").strip().lower()
-    matches = [p for p in lib.pieces if q in (getattr(p, attr, "") or "").lower()]
+    matches = lib.matching(attr, q)
     if not matches:
         print(f"No matches for {attr}: '{q}'."); return
     print(f"\n--- Results for {attr.capitalize()}: {q} ---")
     for p in matches:
         print("-", _fmt_piece(p))
 
+def search_pieces(lib: tpl.PieceLibrary) -> None:
+    q = input("Search title/composer/genre: ").strip()
+    if not q:
+        print("No search terms entered."); return
+    matches = lib.search(q)
+    if not matches:
+        print(f"No matches for '{q}'."); return
+    print(f"\n--- Results for: {q} ---")
+    for p in matches:
+        print("-", _fmt_piece(p))
+
 
 # ----------- Setlists ----------- #
 
 def _next_setlist_id(performances: dict[int, sl.Performance]) -> int:
-    return max(performances.keys(), default=0) + 1
+    return sl.next_performance_id(performances)
 
 def list_setlists(performances: dict[int, sl.Performance], setlist_items: list[sl.Setlist_Item]) -> None:
     if not performances:
         print("No setlists yet."); return
     for pid, perf in performances.items():
-        count = sum(1 for it in setlist_items if it.performance_id == pid)
+        count = sl.count_items(setlist_items, pid)
         print(f"- #{pid} {perf.title} (pieces: {count})")
 
-def add_setlist(performances: dict[int, sl.Performance]) -> None:
+def add_setlist(performances: dict[int, sl.Performance], user_id: int = 0) -> None:
     title = input("Setlist title: ").strip()
     date  = input("Date (free text ok): ").strip()
     loc   = input("Location (optional): ").strip()
-    pid = _next_setlist_id(performances)
-    performances[pid] = sl.Performance(pid, title, date, loc, 0)
+    pid = create_setlist(performances, title, date, loc, user_id)
     print(f"Added setlist #{pid}.")
 
 def view_setlist(performances: dict[int, sl.Performance], setlist_items: list[sl.Setlist_Item]) -> None:
@@ -140,14 +275,10 @@ def add_piece_to_setlist(performances: dict[int, sl.Performance],
         piece_id = int(input("Piece id to add: ").strip())
     except ValueError:
         print("Invalid id."); return
-    if pid not in performances:
-        print("Setlist not found."); return
-    if not piece_exists_fn(piece_id):
-        print("That piece does not exist."); return
-    # prevent duplicates
-    if any((it.performance_id == pid and it.piece_id == piece_id) for it in setlist_items):
-        print("That piece is already in this setlist."); return
-    sl.add_piece_to_setlist(setlist_items, pid, piece_id)
+    try:
+        put_piece_in_setlist(performances, setlist_items, piece_exists_fn, pid, piece_id)
+    except ValueError as e:
+        print(e); return
     print("Added.")
 
 def remove_piece_from_setlist(setlist_items: list[sl.Setlist_Item]) -> None:
@@ -156,18 +287,89 @@ def remove_piece_from_setlist(setlist_items: list[sl.Setlist_Item]) -> None:
         order_index = int(input("Order number to remove: ").strip())
     except ValueError:
         print("Invalid number."); return
-    ok = sl.remove_piece_from_setlist(setlist_items, pid, order_index)
-    print("Removed." if ok else "Not found at that order.")
+    try:
+        take_piece_from_setlist(setlist_items, pid, order_index)
+    except ValueError as e:
+        print(e); return
+    print("Removed.")
+
+def build_setlist(lib: tpl.PieceLibrary, performances: dict[int, sl.Performance],
+                  setlist_items: list[sl.Setlist_Item], user_id: int = 0) -> None:
+    title = input("Setlist title: ").strip()
+    date  = input("Date (free text ok): ").strip()
+    loc   = input("Location (optional): ").strip()
+    target = _ask_duration("Time slot (m:ss or h:mm:ss): ")
+    if not target:
+        print("A time slot is needed."); return
+    try:
+        mix = parse_genre_mix(input("Genre mix (e.g. Jazz:2, Classical:1; blank for any): "))
+    except ValueError as e:
+        print(e); return
+    readiness = ["performance-ready"]
+    if input("Include rehearsing pieces? (y/N): ").strip().lower() == "y":
+        readiness.append("rehearsing")
+
+    try:
+        pid, items, runtime = make_setlist(lib, performances, setlist_items, title, target, date, loc, user_id,
+                                           genre_mix=mix, readiness=readiness)
+    except ValueError as e:
+        print(e); return
+    print(f"Built setlist #{pid}: {len(items)} pieces, {format_duration(runtime)} of {format_duration(target)}.")
 
 def delete_setlist(performances: dict[int, sl.Performance], setlist_items: list[sl.Setlist_Item]) -> None:
     try:
         pid = int(input("Setlist id to delete: ").strip())
     except ValueError:
         print("Invalid id."); return
-    if pid not in performances:
+    try:
+        remove_setlist(performances, setlist_items, pid)
+    except ValueError:
         print("Not found."); return
+    print("Deleted.")
+
+# setlist checks for the prompts and batch mode
+
+def create_setlist(performances: dict[int, sl.Performance], title, date="", location="", user_id: int = 0) -> int:
+    pid = _next_setlist_id(performances)
+    performances[pid] = sl.Performance(pid, str(title or "").strip(), str(date or "").strip(),
+                                       str(location or "").strip(), int(user_id))
+    return pid
+
+def put_piece_in_setlist(performances: dict[int, sl.Performance], setlist_items: list[sl.Setlist_Item],
+                         piece_exists_fn, pid: int, piece_id: int) -> sl.Setlist_Item:
+    if pid not in performances:
+        raise ValueError("Setlist not found.")
+    if not piece_exists_fn(piece_id):
+        raise ValueError("That piece does not exist.")
+    # prevent duplicates
+    if any(it.piece_id == piece_id for it in sl.items_for(setlist_items, pid)):
+        raise ValueError("That piece is already in this setlist.")
+    return sl.add_piece_to_setlist(setlist_items, pid, piece_id)
+
+def take_piece_from_setlist(setlist_items: list[sl.Setlist_Item], pid: int, order_index: int) -> None:
+    if not sl.remove_piece_from_setlist(setlist_items, pid, order_index):
+        raise ValueError("Not found at that order.")
+
+def remove_setlist(performances: dict[int, sl.Performance], setlist_items: list[sl.Setlist_Item], pid: int) -> None:
+    if pid not in performances:
+        raise ValueError(f"Setlist {pid} not found.")
     del performances[pid]
-    for it in list(setlist_items):
-        if it.performance_id == pid:
-            setlist_items.remove(it)
-    print("Deleted.")
\ No newline at end of file
+    sl.drop_setlist(setlist_items, pid)
+
+def make_setlist(lib: tpl.PieceLibrary, performances: dict[int, sl.Performance], setlist_items: list[sl.Setlist_Item],
+                 title, target, date="", location="", user_id: int = 0, genre_mix=None,
+                 readiness=("performance-ready",)):
+    """Builds and stores a setlist filling `target` (seconds or "m:ss"). Returns (id, items, runtime)."""
+    target = parse_time_slot(target)
+    pid = _next_setlist_id(performances)
+    perf, items = sl.build_setlist(lib.pieces, target, pid, str(title or "").strip(), str(date or "").strip(),
+                                   str(location or "").strip(), int(user_id), genre_mix=genre_mix,
+                                   readiness=[_readiness(r) for r in readiness])
+    if not items:
+        raise ValueError("No pieces with a duration fit that slot.")
+    for it, item_id in zip(items, sl.reserve_item_ids(setlist_items, len(items))):
+        it.setlist_item_id = item_id
+    performances[pid] = perf
+    for it in items:
+        setlist_items.append(it)
+    return pid, items, sum(lib.get(it.piece_id).duration for it in items)
\ No newline at end of file
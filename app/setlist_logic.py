@@ -1,12 +1,27 @@
 # app/setlist_logic.py
 # Simple setlist code based on the class diagram:
 # - Performance = the setlist container
-# - Setlist_Item = one entry inside the setlist (with order_index)
+# - Setlist_Item = one entry inside the setlist (with order_index = its position, and
+#   rank = a fractional key that stores the order, see ranks.py: moving an item only
+#   changes its own rank)
+# - Performances / SetlistStore = all setlists / all items (grouped per performance, in
+#   order); both keep their max id, or take new ids from a sequence (see sequences.py)
+# - SetlistTotals = piece count + runtime per setlist, updated from change events
+# - build_setlist() = fills a time slot from the library (subset-sum over durations)
 
-from typing import Dict, List
+import bisect
+import heapq
+from itertools import zip_longest
+from typing import Dict, Iterator, List, Optional, Tuple
+try:
+    from . import ranks
+except ImportError:
+    import ranks
 
-# Data classes
+# Data classes (slotted: no per-instance __dict__, same attributes)
 class Performance:
+    __slots__ = ("performance_id", "title", "date", "location", "user_id")
+
     def __init__(self, performance_id, title, date, location, user_id):
         self.performance_id = performance_id
         self.title = title
@@ -18,28 +33,375 @@ class Performance:
         print(f"Setlist: {self.title} | {self.date} | {self.location} | user={self.user_id}")
 
 class Setlist_Item:
-    def __init__(self, setlist_item_id, performance_id, piece_id, order_index):
+    __slots__ = ("setlist_item_id", "performance_id", "piece_id", "order_index", "rank")
+
+    def __init__(self, setlist_item_id, performance_id, piece_id, order_index, rank=None):
         self.setlist_item_id = setlist_item_id
         self.performance_id = performance_id
         self.piece_id = piece_id
         self.order_index = order_index
+        self.rank = rank        # set by the SetlistStore when None
 
     def show(self):
         print(f"{self.order_index}. piece_id={self.piece_id} (item_id={self.setlist_item_id})")
 
+class SetlistStore:
+    """
+    Setlist items grouped by performance_id, each group kept in order (rank order, which
+    is also order_index order). Appending, counting and looking up one setlist never touch
+    the other setlists; moving an item gives it a new rank and leaves the others' alone.
+
+    Also acts like the old flat list (iterate, len, append, remove, [i]) so code
+    written against `setlist_items: list` keeps working.
+
+    Setlists loaded with defer() keep their stored piece ids ("12;7;3") and item ids
+    ("40;41;57") and only become Setlist_Items when one of their items is first looked at.
+
+    Listeners are called as fn(op, value) after each change:
+    ("add_item", item), ("remove_item", item), ("move_item", item), ("reorder", performance_id),
+    ("drop", performance_id). "reorder" means every item of the setlist got a new rank.
+    """
+    def __init__(self, items=()):
+        self._by_perf: Dict[int, List[Setlist_Item]] = {}
+        self._pending: Dict[int, Tuple[str, list, int]] = {}   # performance_id -> (piece ids, item ids, count)
+        self._count = 0
+        self.listeners = []
+        self.ids = None     # optional sequences.Sequence for new item ids
+        self.max_id = 0     # highest setlist_item_id held
+        for it in items:
+            self._place(it)
+
+    def _notify(self, op, value):
+        for fn in self.listeners:
+            fn(op, value)
+
+    def defer(self, performance_id, piece_ids: str, first_item_id: int, item_ids: str = "") -> int:
+        """
+        Adds one stored setlist's items (piece ids separated by ";", in order) without
+        building them yet. They keep their stored item_ids (same separator); files written
+        before item ids were stored number them first_item_id, first_item_id + 1, ...
+        Returns how many there are. No listeners are called (this is loading, not a change).
+        """
+        count = sum(1 for x in piece_ids.split(";") if x.strip())
+        if count:
+            ids = [int(x) for x in item_ids.split(";") if x.strip()]
+            if len(ids) != count:
+                ids = list(range(first_item_id, first_item_id + count))
+            self._pending[performance_id] = (piece_ids, ids, count)
+            self._count += count
+            self.max_id = max(self.max_id, max(ids))
+        return count
+
+    def _materialize(self, performance_id) -> None:
+        pending = self._pending.pop(performance_id, None)
+        if pending is None:
+            return
+        piece_ids, item_ids, count = pending
+        self._count -= count
+        ids = [int(x) for x in piece_ids.split(";") if x.strip()]
+        for idx, (piece_id, item_id, rank) in enumerate(zip(ids, item_ids, ranks.spread(len(ids))), start=1):
+            self._place(Setlist_Item(item_id, performance_id, piece_id, idx, rank))
+
+    def items_for(self, performance_id) -> List[Setlist_Item]:
+        """The ordered items of one setlist (the live list - don't modify it directly)."""
+        self._materialize(performance_id)
+        return self._by_perf.get(performance_id, [])
+
+    def count(self, performance_id) -> int:
+        pending = self._pending.get(performance_id)
+        return len(self._by_perf.get(performance_id, ())) + (pending[2] if pending else 0)
+
+    def performance_ids(self) -> List[int]:
+        return list(self._by_perf) + [pid for pid in self._pending if pid not in self._by_perf]
+
+    def append(self, item: Setlist_Item) -> None:
+        self._materialize(item.performance_id)
+        self._place(item)
+        self._notify("add_item", item)
+
+    def _place(self, item: Setlist_Item) -> None:
+        group = self._by_perf.setdefault(item.performance_id, [])
+        if item.rank is None:
+            # a new item (or one built outside the store): placed by order_index, then ranked
+            if not group or group[-1].order_index <= item.order_index:
+                i = len(group)
+                item.rank = ranks.after(group[-1].rank if group else "")
+            else:
+                i = bisect.bisect_right([it.order_index for it in group], item.order_index)
+                item.rank = ranks.between(group[i - 1].rank if i else "", group[i].rank)
+        elif not group or group[-1].rank < item.rank:
+            i = len(group)
+        else:
+            # out-of-order insert (e.g. loading unsorted rows)
+            i = bisect.bisect_right([it.rank for it in group], item.rank)
+        group.insert(i, item)
+        self._count += 1
+        if item.setlist_item_id is not None and item.setlist_item_id > self.max_id:
+            self.max_id = item.setlist_item_id
+
+    def next_id(self) -> int:
+        """An id for a new item."""
+        if self.ids is not None:
+            return self.ids.next(self.max_id)
+        return self.max_id + 1
+
+    def reserve_ids(self, n: int) -> range:
+        if self.ids is not None:
+            return self.ids.reserve(n, self.max_id)
+        return range(self.max_id + 1, self.max_id + 1 + n)
+
+    def remove(self, item: Setlist_Item) -> None:
+        self._materialize(item.performance_id)
+        group = self._by_perf.get(item.performance_id)
+        if group is None:
+            raise ValueError("item not in store")
+        at = group.index(item)
+        del group[at]
+        if not group:
+            del self._by_perf[item.performance_id]
+        for i in range(at, len(group)):
+            group[i].order_index = i + 1
+        self._count -= 1
+        self._notify("remove_item", item)
+
+    def move(self, item: Setlist_Item, position: int) -> bool:
+        """
+        Moves an item to `position` (1-based) in its setlist. Only its rank changes;
+        the positions of the items it passed shift by one.
+        Returns True if the new rank got too long and the whole setlist was rebalanced.
+        """
+        group = self.items_for(item.performance_id)
+        old = item.order_index - 1
+        if not (0 <= old < len(group) and group[old] is item):
+            old = group.index(item)
+        new = min(max(position, 1), len(group)) - 1
+        if new == old:
+            return False
+        del group[old]
+        group.insert(new, item)
+        item.rank = ranks.between(group[new - 1].rank if new else "",
+                                  group[new + 1].rank if new + 1 < len(group) else None)
+        for i in range(min(old, new), max(old, new) + 1):
+            group[i].order_index = i + 1
+        if len(item.rank) > ranks.MAX_LENGTH:
+            self.rebalance(item.performance_id)
+            return True
+        self._notify("move_item", item)
+        return False
+
+    def rebalance(self, performance_id) -> None:
+        """Gives every item of one setlist short, evenly spaced ranks (and clean positions)."""
+        group = self.items_for(performance_id)
+        for i, (it, rank) in enumerate(zip(group, ranks.spread(len(group))), start=1):
+            it.order_index, it.rank = i, rank
+        self._notify("reorder", performance_id)
+
+    def reordered(self, performance_id) -> None:
+        """Called after the items of one setlist were moved around in place."""
+        self.rebalance(performance_id)
+
+    def drop(self, performance_id) -> List[Setlist_Item]:
+        """Removes and returns every item of one setlist."""
+        self._materialize(performance_id)
+        group = self._by_perf.pop(performance_id, [])
+        self._count -= len(group)
+        self._notify("drop", performance_id)
+        return group
+
+    # ----------- flat-list compatibility ----------- #
+
+    def __iter__(self) -> Iterator[Setlist_Item]:
+        for performance_id in list(self._pending):
+            self._materialize(performance_id)
+        for group in list(self._by_perf.values()):
+            yield from group
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i):
+        return list(self)[i]
+
+class Performances(dict):
+    """
+    performance_id -> Performance, telling listeners about changes:
+    ("add", perf), ("edit", perf), ("delete", performance_id).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.listeners = []
+        self.ids = None     # optional sequences.Sequence for new ids
+        self.max_id = max(self, default=0)
+
+    def __setitem__(self, performance_id, perf):
+        op = "edit" if performance_id in self else "add"
+        super().__setitem__(performance_id, perf)
+        if performance_id > self.max_id:
+            self.max_id = performance_id
+        for fn in self.listeners:
+            fn(op, perf)
+
+    def __delitem__(self, performance_id):
+        super().__delitem__(performance_id)
+        for fn in self.listeners:
+            fn("delete", performance_id)
+
+    def next_id(self) -> int:
+        if self.ids is not None:
+            return self.ids.next(self.max_id)
+        return self.max_id + 1
+
+    def reserve_ids(self, n: int) -> range:
+        if self.ids is not None:
+            return self.ids.reserve(n, self.max_id)
+        return range(self.max_id + 1, self.max_id + 1 + n)
+
+class SetlistTotals:
+    """
+    Piece count and total runtime (seconds) per setlist, kept current from the change
+    events of a SetlistStore and a PieceLibrary: adding or removing an item touches one
+    setlist's sums, a duration edit touches only the setlists that use that piece.
+    Pieces without a duration count as 0 seconds.
+    """
+    def __init__(self, items: SetlistStore, library):
+        self.items = items
+        self.library = library
+        self._count: Dict[int, int] = {}
+        self._runtime: Dict[int, int] = {}
+        self._duration: Dict[int, int] = {}                 # piece_id -> seconds counted in the sums
+        self._uses: Dict[int, Dict[int, int]] = {}          # piece_id -> {performance_id: items}
+        self._pieces: Dict[int, Dict[int, int]] = {}        # performance_id -> {piece_id: items}
+        for it in items:
+            self._add(it, 1)
+        items.listeners.append(self._on_item)
+        library.listeners.append(self._on_piece)
+
+    def detach(self) -> None:
+        """Stops following the store and the library."""
+        if self._on_item in self.items.listeners:
+            self.items.listeners.remove(self._on_item)
+        if self._on_piece in self.library.listeners:
+            self.library.listeners.remove(self._on_piece)
+
+    def count(self, performance_id) -> int:
+        return self._count.get(performance_id, 0)
+
+    def runtime(self, performance_id) -> int:
+        return self._runtime.get(performance_id, 0)
+
+    def _seconds(self, piece_id) -> int:
+        piece = self.library.get(piece_id)
+        return (piece.duration or 0) if piece is not None else 0
+
+    def _add(self, item: Setlist_Item, sign: int) -> None:
+        perf, pid = item.performance_id, item.piece_id
+        seconds = self._duration.get(pid)
+        if seconds is None:
+            seconds = self._duration[pid] = self._seconds(pid)
+        self._count[perf] = self._count.get(perf, 0) + sign
+        self._runtime[perf] = self._runtime.get(perf, 0) + sign * seconds
+        for outer, inner, other in ((self._uses, pid, perf), (self._pieces, perf, pid)):
+            counts = outer.setdefault(inner, {})
+            counts[other] = counts.get(other, 0) + sign
+            if not counts[other]:
+                del counts[other]
+                if not counts:
+                    del outer[inner]
+        if pid not in self._uses:
+            del self._duration[pid]
+        if not self._count[perf]:
+            del self._count[perf], self._runtime[perf]
+
+    def _on_item(self, op, value) -> None:
+        if op == "add_item":
+            self._add(value, 1)
+        elif op == "remove_item":
+            self._add(value, -1)
+        elif op == "drop":
+            # the items are already gone from the store: forget what we counted for them
+            for pid in self._pieces.pop(value, {}):
+                uses = self._uses[pid]
+                del uses[value]
+                if not uses:
+                    del self._uses[pid], self._duration[pid]
+            self._count.pop(value, None)
+            self._runtime.pop(value, None)
+        # "move_item" and "reorder" change neither the count nor the runtime
+
+    def _retime(self, piece_id, seconds: int) -> None:
+        old = self._duration.get(piece_id)
+        if old is None or old == seconds:
+            return
+        self._duration[piece_id] = seconds
+        for perf, n in self._uses[piece_id].items():
+            self._runtime[perf] += n * (seconds - old)
+
+    def _on_piece(self, op, piece) -> None:
+        if op in ("add", "edit"):
+            self._retime(piece.piece_id, piece.duration or 0)
+        elif op == "delete":
+            self._retime(piece.piece_id, 0)
+        elif op == "load":
+            for pid in list(self._uses):
+                self._retime(pid, self._seconds(pid))
+
+def items_for(setlist_items, performance_id) -> List[Setlist_Item]:
+    """
+    Ordered items of one setlist. O(1) on a SetlistStore; filter + sort on a flat list.
+    """
+    if isinstance(setlist_items, SetlistStore):
+        return setlist_items.items_for(performance_id)
+    items = [it for it in setlist_items if it.performance_id == performance_id]
+    items.sort(key=lambda it: it.order_index)
+    return items
+
+def count_items(setlist_items, performance_id) -> int:
+    """
+    Number of items in one setlist, without building deferred ones on a SetlistStore.
+    """
+    if isinstance(setlist_items, SetlistStore):
+        return setlist_items.count(performance_id)
+    return sum(1 for it in setlist_items if it.performance_id == performance_id)
+
+def drop_setlist(setlist_items, performance_id) -> None:
+    """
+    Removes every item belonging to one setlist.
+    """
+    if isinstance(setlist_items, SetlistStore):
+        setlist_items.drop(performance_id)
+        return
+    setlist_items[:] = [it for it in setlist_items if it.performance_id != performance_id]
+
 def create_setlist(performance_id, title, date, location, user_id):
     """
     Creates a setlist (Performance).
     """
     return Performance(performance_id, title, date, location, user_id)
 
+def next_performance_id(performances) -> int:
+    """
+    An id for a new setlist (Performances: from its sequence / running max; a plain dict: max + 1).
+    """
+    if isinstance(performances, Performances):
+        return performances.next_id()
+    return max(performances, default=0) + 1
+
+def reserve_item_ids(setlist_items, n) -> range:
+    """
+    n ids for new setlist items (SetlistStore: from its sequence / running max; a list: max + 1 ...).
+    """
+    if isinstance(setlist_items, SetlistStore):
+        return setlist_items.reserve_ids(n)
+    first = max((it.setlist_item_id for it in setlist_items), default=0) + 1
+    return range(first, first + n)
+
 def add_piece_to_setlist(setlist_items, performance_id, piece_id):
     """
     Adds a piece to the end of the setlist as a Setlist_Item.
     """
-    current = [it for it in setlist_items if it.performance_id == performance_id]
+    current = items_for(setlist_items, performance_id)
     next_order = len(current) + 1
-    next_item_id = len(setlist_items) + 1
+    next_item_id = reserve_item_ids(setlist_items, 1)[0]
 
     item = Setlist_Item(next_item_id, performance_id, piece_id, next_order)
     setlist_items.append(item)
@@ -50,8 +412,15 @@ def remove_piece_from_setlist(setlist_items, performance_id, order_index):
     Removes a piece from the setlist by its order number (order_index).
     Then renumbers the remaining items to keep order clean.
     """
-    for it in list(setlist_items):
-        if it.performance_id == performance_id and it.order_index == order_index:
+    if isinstance(setlist_items, SetlistStore):
+        # the store keeps its groups in order and renumbers the items after the removed one
+        items = setlist_items.items_for(performance_id)
+        if not 1 <= order_index <= len(items):
+            return False
+        setlist_items.remove(items[order_index - 1])
+        return True
+    for it in items_for(setlist_items, performance_id):
+        if it.order_index == order_index:
             setlist_items.remove(it)
             _renumber_setlist(setlist_items, performance_id)
             return True
@@ -62,8 +431,7 @@ def view_setlist(setlist, setlist_items):
     Prints the setlist and its items in order.
     """
     setlist.show()
-    items = [it for it in setlist_items if it.performance_id == setlist.performance_id]
-    items.sort(key=lambda it: it.order_index)
+    items = items_for(setlist_items, setlist.performance_id)
 
     if not items:
         print("(no pieces yet)")
@@ -72,42 +440,149 @@ def view_setlist(setlist, setlist_items):
     for it in items:
         it.show()
 
-def move_up(setlist_items, performance_id, order_index):
+def move_item(setlist_items, performance_id, order_index, to_index):
     """
-    Moves an item up by one spot (swap with the item above).
+    Moves the item at order_index to position to_index (both 1-based).
+    In a SetlistStore only the moved item gets a new rank, so only it needs saving.
     """
-    items = [it for it in setlist_items if it.performance_id == performance_id]
-    items.sort(key=lambda it: it.order_index)
+    items = items_for(setlist_items, performance_id)
 
-    idx = order_index - 1
-    if idx <= 0 or idx >= len(items):
+    if not 1 <= order_index <= len(items) or not 1 <= to_index <= len(items) or order_index == to_index:
         return False
 
-    items[idx].order_index, items[idx - 1].order_index = items[idx - 1].order_index, items[idx].order_index
-    _renumber_setlist(setlist_items, performance_id)
+    if isinstance(setlist_items, SetlistStore):
+        setlist_items.move(items[order_index - 1], to_index)
+        return True
+    items.insert(to_index - 1, items.pop(order_index - 1))
+    for i, it in enumerate(items, start=1):
+        it.order_index = i
     return True
 
+def move_up(setlist_items, performance_id, order_index):
+    """
+    Moves an item up by one spot (swap with the item above).
+    """
+    return move_item(setlist_items, performance_id, order_index, order_index - 1)
+
 def move_down(setlist_items, performance_id, order_index):
     """
     Moves an item down by one spot (swap with the item below).
     """
-    items = [it for it in setlist_items if it.performance_id == performance_id]
-    items.sort(key=lambda it: it.order_index)
-
-    idx = order_index - 1
-    if idx < 0 or idx >= len(items) - 1:
-        return False
-
-    items[idx].order_index, items[idx + 1].order_index = items[idx + 1].order_index, items[idx].order_index
-    _renumber_setlist(setlist_items, performance_id)
-    return True
+    return move_item(setlist_items, performance_id, order_index, order_index + 1)
 
 def _renumber_setlist(setlist_items, performance_id):
     """
     Keeps order_index clean (1..n) for one setlist.
     """
-    items = [it for it in setlist_items if it.performance_id == performance_id]
-    items.sort(key=lambda it: it.order_index)
+    items = items_for(setlist_items, performance_id)
 
     for i, it in enumerate(items, start=1):
-        it.order_index = i
\ No newline at end of file
+        it.order_index = i
+
+
+# ----------- Setlist builder ----------- #
+
+def _key(text) -> str:
+    return str(text or "").strip().casefold()
+
+def _fill(candidates, budget: int) -> list:
+    """
+    The subset of `candidates` whose durations add up closest to `budget` without going
+    over. Subset-sum DP over seconds: the reachable totals are the bits of one int, so a
+    piece costs one shift + or over `budget` bits, and first[t] remembers which piece
+    first reached total t. Earlier candidates win ties.
+    A budget of at least all the candidates together takes them all, so the work never
+    grows past the library's total runtime whatever the target.
+    """
+    if budget <= 0:
+        return []
+    if budget >= sum(p.duration for p in candidates):
+        return list(candidates)
+    mask = (1 << (budget + 1)) - 1
+    reach = 1
+    first = [0] * (budget + 1)
+    for i, p in enumerate(candidates):
+        new = (reach << p.duration) & mask & ~reach
+        if not new:
+            continue
+        reach |= new
+        while new:
+            low = new & -new
+            first[low.bit_length() - 1] = i
+            new ^= low
+        if reach >> budget & 1:
+            break           # filled exactly
+    # walk back: the total before the piece that reached t was reached by earlier pieces only
+    chosen = []
+    total = reach.bit_length() - 1
+    while total:
+        p = candidates[first[total]]
+        chosen.append(p)
+        total -= p.duration
+    return chosen[::-1]
+
+def _spread(pieces) -> list:
+    """Pieces interleaved by composer, so ties in _fill() go to a mix of composers."""
+    groups: Dict[str, list] = {}
+    for p in pieces:
+        groups.setdefault(_key(p.composer), []).append(p)
+    return [p for row in zip_longest(*groups.values()) for p in row if p is not None]
+
+def _order(pieces) -> list:
+    """
+    Running order with no composer twice in a row wherever the selection allows it:
+    always continue with the composer who has the most pieces left, other than the last one.
+    """
+    groups: Dict[str, list] = {}
+    for p in pieces:
+        groups.setdefault(_key(p.composer), []).append(p)
+    for group in groups.values():
+        group.reverse()         # pop() from the end keeps each composer's pieces in order
+    heap = [(-len(group), n, key) for n, (key, group) in enumerate(groups.items())]
+    heapq.heapify(heap)
+    out, held = [], None
+    while heap:
+        left, n, key = heapq.heappop(heap)
+        out.append(groups[key].pop())
+        if held is not None:
+            heapq.heappush(heap, held)
+        held = (left + 1, n, key) if left + 1 < 0 else None
+    if held is not None:
+        out.extend(reversed(groups[held[2]]))       # only one composer left: repeats can't be avoided
+    return out
+
+def build_setlist(pieces, target_seconds: int, performance_id, title, date="", location="", user_id=0,
+                  genre_mix: Optional[Dict[str, float]] = None,
+                  readiness=("performance-ready",), first_item_id: int = 1
+                  ) -> Tuple[Performance, List[Setlist_Item]]:
+    """
+    Builds a Performance and its Setlist_Items from `pieces`, filling target_seconds as
+    closely as possible without going over. Pieces without a duration are skipped.
+    - readiness: the statuses a piece may have (None: any)
+    - genre_mix: {genre: weight}; each genre first gets its share of the time, what is left
+      is then filled from any of those genres. Without it every genre can be used.
+    Item ids start at first_item_id; nothing is added to a store.
+    """
+    allowed = None if readiness is None else set(readiness)
+    mix = {_key(g): w for g, w in (genre_mix or {}).items() if w > 0}
+    candidates = _spread(p for p in pieces
+                         if p.duration and (allowed is None or p.readiness_status in allowed)
+                         and (not mix or _key(p.genre) in mix))
+    if mix:
+        by_genre: Dict[str, list] = {}
+        for p in candidates:
+            by_genre.setdefault(_key(p.genre), []).append(p)
+        weights = sum(mix.values())
+        chosen = []
+        for genre, w in mix.items():
+            chosen += _fill(by_genre.get(genre, []), int(target_seconds * w / weights))
+        used = {id(p) for p in chosen}
+        chosen += _fill([p for p in candidates if id(p) not in used],
+                        target_seconds - sum(p.duration for p in chosen))
+    else:
+        chosen = _fill(candidates, target_seconds)
+
+    perf = Performance(performance_id, title, date, location, user_id)
+    items = [Setlist_Item(first_item_id + i, performance_id, p.piece_id, i + 1)
+             for i, p in enumerate(_order(chosen))]
+    return perf, items
@@ -0,0 +1,204 @@
+# app/snapshot.py
+# Binary, memory-mapped snapshot of the pieces file (optional - see CsvBackend(snapshot=True)).
+# Layout, little-endian:
+# - header: magic, version, stamp of the CSV file it was built from (mtime_ns, size, inode),
+#   number of pieces, highest id, where the sections below start
+# - record table: one fixed-width RECORD per piece, in file order; strings are numbers into
+#   the string table (NONE for a missing value), NO_DURATION for a missing duration
+# - id index: (piece_id, row) sorted by id, so get() is a binary search
+# - string table: an offset per distinct string (plus one for the end), then the UTF-8 heap;
+#   repeated composers/genres/readiness values are stored once
+# Opening maps the file and reads the header - nothing is parsed and no Piece is built.
+# A record becomes a Piece when it is looked at, and each distinct string is decoded once.
+# The mapped pages are the OS page cache, so processes mapping the same file share them.
+#
+# The snapshot is a cache of the CSV file, never the data itself: storage.py writes it next
+# to the CSV after a save and ignores (then rebuilds) it once its stamp no longer matches.
+
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+try:
+    from . import iostats
+    from . import piece_logic as tpl
+    from .locking import atomic_write
+except ImportError:
+    import iostats
+    import piece_logic as tpl
+    from locking import atomic_write
+
+MAGIC = b"RRPS"
+VERSION = 1
+SUFFIX = ".snap"        # data/piece_library.csv -> data/piece_library.csv.snap
+
+# magic, version, mtime_ns, size, inode, count, max_id, index at, strings, offsets at, heap at
+HEADER = struct.Struct("<4sIqQQqqQQQQ")
+# piece_id, user_id, duration, title, composer, genre, readiness_status, created, updated
+RECORD = struct.Struct("<qqqIIIIII")
+INDEX = struct.Struct("<qq")        # piece_id, row
+OFFSET = struct.Struct("<Q")
+
+NONE = 0xFFFFFFFF
+NO_DURATION = -(2 ** 63)
+
+
+def stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    """(mtime_ns, size, inode) of a file, None if it doesn't exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+# ----------- Writing ----------- #
+
+def write(pieces: Iterable[tpl.Piece], path: str, source: Tuple[int, int, int]) -> int:
+    """
+    Writes a snapshot of `pieces` (stamped with `source`, the stamp of the CSV file they
+    came from) atomically. Returns the number of bytes written.
+    """
+    strings: Dict[str, int] = {}
+
+    def string_id(value) -> int:
+        if value is None:
+            return NONE
+        value = str(value)
+        i = strings.get(value)
+        if i is None:
+            i = strings[value] = len(strings)
+        return i
+
+    records = bytearray()
+    ids = []
+    max_id = 0
+    for row, p in enumerate(pieces):
+        records += RECORD.pack(
+            p.piece_id, int(p.user_id or 0), NO_DURATION if p.duration is None else p.duration,
+            string_id(p.title), string_id(p.composer), string_id(p.genre), string_id(p.readiness_status),
+            string_id(p.created or None), string_id(p.updated or None))
+        ids.append((p.piece_id, row))
+        max_id = max(max_id, p.piece_id)
+    ids.sort()
+
+    heap = [s.encode("utf-8") for s in strings]
+    offsets = bytearray()
+    at = 0
+    for data in heap:
+        offsets += OFFSET.pack(at)
+        at += len(data)
+    offsets += OFFSET.pack(at)
+
+    index_at = HEADER.size + len(records)
+    offsets_at = index_at + len(ids) * INDEX.size
+    heap_at = offsets_at + len(offsets)
+    header = HEADER.pack(MAGIC, VERSION, *source, len(ids), max_id, index_at, len(heap), offsets_at, heap_at)
+    with atomic_write(path, binary=True) as f:
+        f.write(header)
+        f.write(records)
+        f.write(b"".join(INDEX.pack(*entry) for entry in ids))
+        f.write(offsets)
+        f.write(b"".join(heap))
+        return f.tell()
+
+
+# ----------- Reading ----------- #
+
+class PieceSnapshot:
+    """
+    The pieces of a snapshot file, read-only. Each lookup decodes one record into a new Piece.
+    """
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, mtime_ns, size, inode, self._count, self.max_id,
+             self._index_at, _, self._offsets_at, self._heap_at) = HEADER.unpack_from(self._mm, 0)
+        except struct.error:
+            magic = version = None
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a version {VERSION} piece snapshot")
+        self.path = path
+        self.stamp = (mtime_ns, size, inode)
+        self._strings: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _string(self, i: int) -> Optional[str]:
+        if i == NONE:
+            return None
+        s = self._strings.get(i)
+        if s is None:
+            start, = OFFSET.unpack_from(self._mm, self._offsets_at + i * OFFSET.size)
+            end, = OFFSET.unpack_from(self._mm, self._offsets_at + (i + 1) * OFFSET.size)
+            s = self._strings[i] = self._mm[self._heap_at + start:self._heap_at + end].decode("utf-8")
+        return s
+
+    def _piece(self, values) -> tpl.Piece:
+        piece_id, user_id, duration, title, composer, genre, readiness, created, updated = values
+        s = self._string
+        p = tpl.Piece(piece_id, s(title), s(composer), s(genre), s(readiness), user_id,
+                      None if duration == NO_DURATION else duration)
+        p.created = s(created)
+        p.updated = s(updated)
+        return p
+
+    def __getitem__(self, row: int) -> tpl.Piece:
+        """The piece in row `row` (file order)."""
+        if not 0 <= row < self._count:
+            raise IndexError(row)
+        return self._piece(RECORD.unpack_from(self._mm, HEADER.size + row * RECORD.size))
+
+    def row_of(self, piece_id: int) -> Optional[int]:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            found, row = INDEX.unpack_from(self._mm, self._index_at + mid * INDEX.size)
+            if found == piece_id:
+                return row
+            if found < piece_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def get(self, piece_id: int) -> Optional[tpl.Piece]:
+        row = self.row_of(piece_id)
+        return None if row is None else self[row]
+
+    def __iter__(self) -> Iterator[tpl.Piece]:
+        """Every piece, in file order."""
+        table = memoryview(self._mm)[HEADER.size:HEADER.size + self._count * RECORD.size]
+        try:
+            for values in RECORD.iter_unpack(table):
+                yield self._piece(values)
+        finally:
+            table.release()
+        iostats.read(rows=self._count)
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_snapshot(path: str, source: Optional[Tuple[int, int, int]] = None) -> Optional[PieceSnapshot]:
+    """
+    Maps the snapshot at `path`. None if there is none, it isn't a snapshot, or (with
+    `source`) it was built from a different version of the CSV file.
+    """
+    try:
+        snap = PieceSnapshot(path)
+    except (OSError, ValueError):
+        return None
+    if source is not None and snap.stamp != tuple(source):
+        snap.close()
+        return None
+    return snap
@@ -0,0 +1,339 @@
+# app/sqlite_storage.py
+# SQLite backend: one row per piece / performance / setlist item.
+# - WAL mode so readers (other web workers) never block the writer
+# - edits touch only the affected rows instead of rewriting the whole dataset
+# - a per-table generation counter in `meta` tells caches when to reload
+# - id sequences (see sequences.py) in the `sequences` table
+# - setlist items are ordered by their rank key (see ranks.py): moving one item updates
+#   one row; order_index is the position as of the item's last full write
+
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Tuple
+try:
+    from . import iostats
+    from . import piece_logic as tpl
+    from . import ranks
+    from . import sequences
+    from . import setlist_logic as sl
+    from . import storage
+    from .backends import StorageBackend, partition_path
+    from .locking import lock_for
+except ImportError:
+    import iostats
+    import piece_logic as tpl
+    import ranks
+    import sequences
+    import setlist_logic as sl
+    import storage
+    from backends import StorageBackend, partition_path
+    from locking import lock_for
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pieces (
+    piece_id         INTEGER PRIMARY KEY,
+    title            TEXT NOT NULL DEFAULT '',
+    composer         TEXT NOT NULL DEFAULT '',
+    genre            TEXT NOT NULL DEFAULT '',
+    readiness_status TEXT NOT NULL DEFAULT 'learning',
+    user_id          INTEGER NOT NULL DEFAULT 0,
+    created          TEXT,
+    updated          TEXT,
+    duration         INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_pieces_user_readiness ON pieces(user_id, readiness_status);
+CREATE INDEX IF NOT EXISTS idx_pieces_composer ON pieces(composer COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_pieces_genre ON pieces(genre COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS performances (
+    performance_id INTEGER PRIMARY KEY,
+    title          TEXT NOT NULL DEFAULT '',
+    date           TEXT NOT NULL DEFAULT '',
+    location       TEXT NOT NULL DEFAULT '',
+    user_id        INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_performances_user ON performances(user_id);
+
+CREATE TABLE IF NOT EXISTS setlist_items (
+    setlist_item_id INTEGER PRIMARY KEY,
+    performance_id  INTEGER NOT NULL REFERENCES performances(performance_id) ON DELETE CASCADE,
+    piece_id        INTEGER NOT NULL,
+    order_index     INTEGER NOT NULL,
+    rank            TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_setlist_items_order ON setlist_items(performance_id, order_index);
+CREATE INDEX IF NOT EXISTS idx_setlist_items_piece ON setlist_items(piece_id);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta(key, value) VALUES ('pieces_generation', 0), ('setlists_generation', 0);
+
+CREATE TABLE IF NOT EXISTS sequences (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL      -- last id reserved
+);
+"""
+
+def _text(value):
+    return str(value) if value else None
+
+def _piece_row(p: tpl.Piece) -> tuple:
+    return (p.piece_id, p.title or "", p.composer or "", p.genre or "",
+            (p.readiness_status or "learning"), p.user_id or 0,
+            _text(getattr(p, "created", None)), _text(getattr(p, "updated", None)), p.duration)
+
+PIECE_INSERT = "INSERT INTO pieces VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+PIECE_UPSERT = "INSERT OR REPLACE INTO pieces VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+class SqliteBackend(StorageBackend):
+    name = "sqlite"
+    row_level = True
+
+    def __init__(self, path: str):
+        self.path = path
+        storage._ensure_parent(path)
+        self._local = threading.local()   # sqlite3 connections are per-thread
+        with self._conn() as db:
+            db.executescript(SCHEMA)
+            # databases made before pieces had a duration
+            if "duration" not in {row[1] for row in db.execute("PRAGMA table_info(pieces)")}:
+                db.execute("ALTER TABLE pieces ADD COLUMN duration INTEGER")
+            # databases made before setlist items had a rank: rank them in their current order
+            if "rank" not in {row[1] for row in db.execute("PRAGMA table_info(setlist_items)")}:
+                db.execute("ALTER TABLE setlist_items ADD COLUMN rank TEXT")
+                groups: Dict[int, List[int]] = {}
+                for item_id, pid in db.execute("SELECT setlist_item_id, performance_id FROM setlist_items "
+                                               "ORDER BY performance_id, order_index"):
+                    groups.setdefault(pid, []).append(item_id)
+                db.executemany("UPDATE setlist_items SET rank = ? WHERE setlist_item_id = ?",
+                               ((rank, item_id) for ids in groups.values()
+                                for item_id, rank in zip(ids, ranks.spread(len(ids)))))
+            db.execute("CREATE INDEX IF NOT EXISTS idx_setlist_items_rank ON setlist_items(performance_id, rank)")
+
+    @property
+    def key(self) -> tuple:
+        return ("sqlite", os.path.abspath(self.path))
+
+    def locked(self):
+        return lock_for(self.path)
+
+    def partition(self, user_id):
+        return SqliteBackend(partition_path(self.path, user_id))
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA foreign_keys=ON")
+            self._local.db = db
+        return db
+
+    def _bump(self, db: sqlite3.Connection, table: str) -> None:
+        db.execute("UPDATE meta SET value = value + 1 WHERE key = ?", (f"{table}_generation",))
+
+    def close(self) -> None:
+        super().close()
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+    # ----------- Pieces ----------- #
+
+    def load_pieces(self) -> List[tpl.Piece]:
+        rows = self._conn().execute(
+            "SELECT piece_id, title, composer, genre, readiness_status, user_id, created, updated, duration "
+            "FROM pieces ORDER BY piece_id")
+        pieces = []
+        for pid, title, composer, genre, readiness, user_id, created, updated, duration in rows:
+            p = tpl.Piece(pid, title, composer, genre, readiness, user_id, duration)
+            p.created = created
+            p.updated = updated
+            pieces.append(p)
+        iostats.read(rows=len(pieces))      # no byte counts: SQLite reads pages, not rows
+        return pieces
+
+    def save_pieces(self, pieces: List[tpl.Piece]) -> None:
+        with self._conn() as db:
+            db.execute("DELETE FROM pieces")
+            db.executemany(PIECE_INSERT, (_piece_row(p) for p in pieces))
+            self._bump(db, "pieces")
+
+    def insert_piece(self, piece, library=None) -> None:
+        with self._conn() as db:
+            db.execute(PIECE_INSERT, _piece_row(piece))
+            self._bump(db, "pieces")
+
+    def insert_pieces(self, new, library=None) -> None:
+        with self._conn() as db:
+            db.executemany(PIECE_INSERT, (_piece_row(p) for p in new))
+            self._bump(db, "pieces")
+
+    def update_piece(self, piece, library=None) -> None:
+        row = _piece_row(piece)
+        with self._conn() as db:
+            db.execute("UPDATE pieces SET title = ?, composer = ?, genre = ?, readiness_status = ?, "
+                       "user_id = ?, created = ?, updated = ?, duration = ? WHERE piece_id = ?", row[1:] + row[:1])
+            self._bump(db, "pieces")
+
+    def delete_piece(self, piece_id, library=None) -> None:
+        with self._conn() as db:
+            db.execute("DELETE FROM pieces WHERE piece_id = ?", (piece_id,))
+            self._bump(db, "pieces")
+
+    def write_piece_batch(self, ops, library=None) -> None:
+        with self._conn() as db:     # one transaction: all or nothing
+            for op, value in ops:
+                if op == "delete":
+                    db.execute("DELETE FROM pieces WHERE piece_id = ?", (value,))
+                else:
+                    db.execute(PIECE_UPSERT, _piece_row(value))
+            self._bump(db, "pieces")
+
+    def pieces_stamp(self):
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'pieces_generation'").fetchone()[0]
+
+    # ----------- Setlists ----------- #
+
+    def load_setlists(self) -> Tuple[Dict[int, sl.Performance], sl.SetlistStore]:
+        db = self._conn()
+        performances: Dict[int, sl.Performance] = {}
+        for pid, title, date, location, user_id in db.execute(
+                "SELECT performance_id, title, date, location, user_id FROM performances ORDER BY performance_id"):
+            performances[pid] = sl.Performance(pid, title, date, location, user_id)
+        rows, position, last = [], 0, None
+        for item_id, pid, piece_id, rank in db.execute(
+                "SELECT setlist_item_id, performance_id, piece_id, rank FROM setlist_items "
+                "ORDER BY performance_id, rank, order_index"):
+            position = position + 1 if pid == last else 1
+            last = pid
+            rows.append(sl.Setlist_Item(item_id, pid, piece_id, position, rank))
+        items = sl.SetlistStore(rows)
+        iostats.read(rows=len(performances) + len(items))
+        return performances, items
+
+    def save_setlists(self, performances: Dict[int, sl.Performance], items: List[sl.Setlist_Item]) -> None:
+        with self._conn() as db:
+            db.execute("DELETE FROM setlist_items")
+            db.execute("DELETE FROM performances")
+            db.executemany("INSERT INTO performances VALUES (?, ?, ?, ?, ?)",
+                           ((pid, p.title, p.date, p.location, p.user_id) for pid, p in performances.items()))
+            db.executemany("INSERT INTO setlist_items VALUES (?, ?, ?, ?, ?)",
+                           ((it.setlist_item_id, it.performance_id, it.piece_id, it.order_index, it.rank)
+                            for it in items if it.performance_id in performances))
+            self._bump(db, "setlists")
+
+    def insert_performance(self, perf, performances=None, items=None) -> None:
+        with self._conn() as db:
+            db.execute("INSERT INTO performances VALUES (?, ?, ?, ?, ?)",
+                       (perf.performance_id, perf.title, perf.date, perf.location, perf.user_id))
+            self._bump(db, "setlists")
+
+    def update_performance(self, perf, performances=None, items=None) -> None:
+        with self._conn() as db:
+            db.execute("UPDATE performances SET title = ?, date = ?, location = ?, user_id = ? "
+                       "WHERE performance_id = ?",
+                       (perf.title, perf.date, perf.location, perf.user_id, perf.performance_id))
+            self._bump(db, "setlists")
+
+    def delete_performance(self, performance_id, performances=None, items=None) -> None:
+        with self._conn() as db:
+            db.execute("DELETE FROM performances WHERE performance_id = ?", (performance_id,))
+            self._bump(db, "setlists")
+
+    def insert_setlist_item(self, item, performances=None, items=None) -> None:
+        """
+        Inserts one item. Without a setlist_item_id SQLite hands one out, which is written back to the item.
+        """
+        with self._conn() as db:
+            cur = db.execute("INSERT INTO setlist_items VALUES (?, ?, ?, ?, ?)",
+                             (item.setlist_item_id, item.performance_id, item.piece_id, item.order_index, item.rank))
+            item.setlist_item_id = cur.lastrowid
+            self._bump(db, "setlists")
+
+    def delete_setlist_item(self, item, performances=None, items=None) -> None:
+        with self._conn() as db:
+            # the others keep their ranks, so nothing else moves
+            db.execute("DELETE FROM setlist_items WHERE setlist_item_id = ?", (item.setlist_item_id,))
+            self._bump(db, "setlists")
+
+    def move_setlist_item(self, item, performances=None, items=None) -> None:
+        with self._conn() as db:
+            db.execute("UPDATE setlist_items SET rank = ?, order_index = ? WHERE setlist_item_id = ?",
+                       (item.rank, item.order_index, item.setlist_item_id))
+            self._bump(db, "setlists")
+
+    def reorder_setlist(self, performance_id, performances=None, items=None) -> None:
+        ordered = sl.items_for(items or [], performance_id)
+        with self._conn() as db:
+            db.executemany("UPDATE setlist_items SET order_index = ?, rank = ? WHERE setlist_item_id = ?",
+                           ((it.order_index, it.rank, it.setlist_item_id) for it in ordered))
+            self._bump(db, "setlists")
+
+    def clear_setlist(self, performance_id, performances=None, items=None) -> None:
+        with self._conn() as db:
+            db.execute("DELETE FROM setlist_items WHERE performance_id = ?", (performance_id,))
+            self._bump(db, "setlists")
+
+    def setlists_stamp(self):
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'setlists_generation'").fetchone()[0]
+
+    # ----------- Id sequences ----------- #
+
+    def reserve_ids(self, name, n, floor=0):
+        with self.locked(), self._conn() as db:
+            row = db.execute("SELECT value FROM sequences WHERE name = ?", (name,)).fetchone()
+            first = max(row[0] if row else 0, floor) + 1
+            db.execute("INSERT OR REPLACE INTO sequences VALUES (?, ?)", (name, first + n - 1))
+        return first
+
+    def release_ids(self, name, reserved_to, used_to):
+        with self.locked(), self._conn() as db:
+            db.execute("UPDATE sequences SET value = ? WHERE name = ? AND value = ?", (used_to, name, reserved_to))
+
+
+# ----------- Migration ----------- #
+
+def migrate_csv_to_sqlite(sqlite_path: str,
+                          pieces_csv: str = storage.PIECES_CSV,
+                          setlists_csv: str = storage.SETLISTS_CSV,
+                          force: bool = False) -> Tuple[int, int]:
+    """
+    One-shot copy of the CSV files into a SQLite database, read through the journal backend
+    so changes still in the journal are copied too, along with the id sequences.
+    Refuses to run over a database that already has data unless force=True.
+    Returns (pieces copied, setlists copied).
+    """
+    try:
+        from .journal import JournalBackend
+    except ImportError:
+        from journal import JournalBackend
+    backend = SqliteBackend(sqlite_path)
+    source = JournalBackend(pieces_csv, setlists_csv)
+    try:
+        db = backend._conn()
+        existing = db.execute("SELECT (SELECT COUNT(*) FROM pieces) + (SELECT COUNT(*) FROM performances)").fetchone()[0]
+        if existing and not force:
+            raise RuntimeError(f"{sqlite_path} already has data; pass force=True to overwrite it.")
+
+        with source.locked():
+            pieces = source.load_pieces()
+            performances, items = source.load_setlists()
+            counters = sequences.read_file(source.sequences_path)
+        backend.save_pieces(pieces)
+        backend.save_setlists(performances, items)
+        with backend.locked(), backend._conn() as db:
+            # ids already handed out stay used: the database carries on after them
+            for name, value in counters.items():
+                db.execute("INSERT INTO sequences VALUES (?, ?) "
+                           "ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)", (name, value))
+        return len(pieces), len(performances)
+    finally:
+        source.close()
+        backend.close()
@@ -1,17 +1,23 @@
 import os, csv
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 try: 
+    from . import iostats
     from . import piece_logic as tpl
     from . import setlist_logic as sl
+    from . import snapshot
+    from .locking import atomic_write
 except ImportError:
+    import iostats
     import piece_logic as tpl
     import setlist_logic as sl
+    import snapshot
+    from locking import atomic_write
 # file locations
 PIECES_CSV = os.path.join("data", "piece_library.csv")
 SETLISTS_CSV = os.path.join("data", "setlist_library.csv")
 
-PIECE_HEADER_WRITE = ["piece_id","title","composer","genre","readiness_status","user_id","created","updated"]
-SETLIST_HEADER_WRITE = ["id","title","date","location","user_id","piece_ids"]  # piece_ids joined by ";"
+PIECE_HEADER_WRITE = ["piece_id","title","composer","genre","readiness_status","user_id","created","updated","duration"]
+SETLIST_HEADER_WRITE = ["id","title","date","location","user_id","piece_ids","item_ids"]  # ids joined by ";"
 
 def _ensure_parent(path: str) -> None:
     parent = os.path.dirname(path)
@@ -24,10 +30,13 @@ def load_pieces(path: str = PIECES_CSV) -> List[tpl.Piece]:
     _ensure_parent(path)
     pieces: List[tpl.Piece] = []
     if not os.path.exists(path):
-        # create empty file
-        with open(path, "w", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow(PIECE_HEADER_WRITE)
-        return pieces
+        # create empty file ("x": never clobber a file another process just wrote)
+        try:
+            with open(path, "x", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(PIECE_HEADER_WRITE)
+            return pieces
+        except FileExistsError:
+            pass
 
     with open(path, newline="", encoding="utf-8-sig", errors="ignore") as f:
         rd = csv.DictReader(f)
@@ -50,37 +59,114 @@ def load_pieces(path: str = PIECES_CSV) -> List[tpl.Piece]:
             )
             p.created = (r.get("created") or "").strip() or None
             p.updated = (r.get("updated") or "").strip() or None
+            p.duration = _int_or_none(r.get("duration"))   # files written before durations have no column
             pieces.append(p)
+        iostats.read(os.fstat(f.fileno()).st_size, len(pieces))
     return pieces
 
+def _int_or_none(value):
+    try:
+        return int((value or "").strip())
+    except ValueError:
+        return None
+
+def _piece_row(p: tpl.Piece) -> list:
+    return [
+        p.piece_id,
+        p.title,
+        p.composer,
+        p.genre,
+        (p.readiness_status or "learning"),
+        p.user_id,
+        p.created if getattr(p, "created", None) else "",
+        p.updated if getattr(p, "updated", None) else "",
+        "" if p.duration is None else p.duration,
+    ]
+
 def save_pieces(pieces: List[tpl.Piece], path: str = PIECES_CSV) -> None:
     _ensure_parent(path)
-    with open(path, "w", newline="", encoding="utf-8") as f:
+    with atomic_write(path) as f:    # temp file + rename: readers never see a half-written file
         wr = csv.writer(f)
         wr.writerow(PIECE_HEADER_WRITE)
         for p in pieces:
-            wr.writerow([
-                p.piece_id,
-                p.title,
-                p.composer,
-                p.genre,
-                (p.readiness_status or "learning"),
-                p.user_id,
-                p.created if getattr(p, "created", None) else "",
-                p.updated if getattr(p, "updated", None) else "",
-            ])
+            wr.writerow(_piece_row(p))
+        iostats.wrote(f.tell())
+
+def append_pieces(pieces: List[tpl.Piece], path: str = PIECES_CSV) -> None:
+    """
+    Adds rows to the end of an existing pieces file (bulk import) instead of rewriting it.
+    Callers hold the storage lock, so nobody reads the file mid-append.
+    """
+    if not os.path.exists(path):
+        save_pieces(pieces, path); return
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), None)
+    if header != PIECE_HEADER_WRITE:
+        # older layout (or semicolons): rewrite once in the current one rather than mix layouts
+        save_pieces(load_pieces(path) + list(pieces), path); return
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        start = f.tell()
+        wr = csv.writer(f)
+        for p in pieces:
+            wr.writerow(_piece_row(p))
+        iostats.wrote(f.tell() - start)
+        f.flush()
+        os.fsync(f.fileno())
+
+# ----------- Binary snapshot of the pieces (snapshot.py) ----------- #
+
+def snapshot_path(path: str = PIECES_CSV) -> str:
+    return path + snapshot.SUFFIX
+
+def save_snapshot(pieces: List[tpl.Piece], path: str = PIECES_CSV) -> bool:
+    """
+    Writes the binary snapshot of the pieces file at `path`. `pieces` must be what the file
+    holds now (call it right after save_pieces, with the lock still held).
+    False if it couldn't be written - the CSV file is still the data, so that's not an error.
+    """
+    source = snapshot.stamp(path)
+    if source is None:
+        return False
+    try:
+        iostats.wrote(snapshot.write(pieces, snapshot_path(path), source))
+    except OSError:
+        return False
+    return True
+
+def open_snapshot(path: str = PIECES_CSV) -> Optional[snapshot.PieceSnapshot]:
+    """
+    The memory-mapped snapshot of the pieces file at `path`. A missing or outdated one
+    is rebuilt from the CSV file first; None if that isn't possible (read-only folder).
+    """
+    source = snapshot.stamp(path)
+    if source is None:
+        load_pieces(path)           # creates the empty file
+        source = snapshot.stamp(path)
+    snap = snapshot.open_snapshot(snapshot_path(path), source)
+    if snap is None:
+        # stamped as the file was before parsing: if it changes meanwhile, the next open rebuilds
+        pieces = load_pieces(path)
+        try:
+            iostats.wrote(snapshot.write(pieces, snapshot_path(path), source))
+        except OSError:
+            return None
+        snap = snapshot.open_snapshot(snapshot_path(path), source)
+    return snap
 
 # ----------- Setlists ----------- #
 
-def load_setlists(path: str = SETLISTS_CSV) -> Tuple[Dict[int, sl.Performance], List[sl.Setlist_Item]]:
+def load_setlists(path: str = SETLISTS_CSV) -> Tuple[Dict[int, sl.Performance], sl.SetlistStore]:
     _ensure_parent(path)
     performances: Dict[int, sl.Performance] = {}
-    items: List[sl.Setlist_Item] = []
+    items = sl.SetlistStore()
 
     if not os.path.exists(path):
-        with open(path, "w", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow(SETLIST_HEADER_WRITE)
-        return performances, items
+        try:
+            with open(path, "x", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(SETLIST_HEADER_WRITE)
+            return performances, items
+        except FileExistsError:
+            pass
 
     with open(path, newline="", encoding="utf-8-sig", errors="ignore") as f:
         rd = csv.DictReader(f)
@@ -101,19 +187,22 @@ def load_setlists(path: str = SETLISTS_CSV) -> Tuple[Dict[int, sl.Performance],
             )
             performances[pid] = perf
 
-            ids = [int(x) for x in (r.get("piece_ids","").split(";")) if x.strip()]
-            for idx, piece_id in enumerate(ids, start=1):
-                items.append(sl.Setlist_Item(len(items)+1, pid, piece_id, idx))
+            # items are built when their setlist is first looked at; files without
+            # item_ids (written before ids were kept) number them in file order
+            items.defer(pid, r.get("piece_ids", "") or "", len(items) + 1, r.get("item_ids", "") or "")
+        iostats.read(os.fstat(f.fileno()).st_size, len(performances))
 
     return performances, items
 
 def save_setlists(performances: Dict[int, sl.Performance], items: List[sl.Setlist_Item], path: str = SETLISTS_CSV) -> None:
     _ensure_parent(path)
-    with open(path, "w", newline="", encoding="utf-8") as f:
+    with atomic_write(path) as f:
         wr = csv.writer(f)
         wr.writerow(SETLIST_HEADER_WRITE)
         for pid, perf in performances.items():
-            # inline items_for(pid) to keep main simpler elsewhere
-            ordered = sorted([it for it in items if it.performance_id == pid], key=lambda t: t.order_index)
+            ordered = sl.items_for(items, pid)
             piece_ids = [str(it.piece_id) for it in ordered]
-            wr.writerow([pid, perf.title, perf.date, perf.location, perf.user_id, ";".join(piece_ids)])
\ No newline at end of file
+            item_ids = [str(it.setlist_item_id) for it in ordered]
+            wr.writerow([pid, perf.title, perf.date, perf.location, perf.user_id, ";".join(piece_ids),
+                         ";".join(item_ids)])
+        iostats.wrote(f.tell())
\ No newline at end of file
@@ -0,0 +1 @@
+# benchmark scripts: run from the root folder with python -m benchmarks.<name>
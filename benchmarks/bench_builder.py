@@ -0,0 +1,40 @@
+# benchmarks/bench_builder.py
+# setlist_logic.build_setlist() on 10k performance-ready candidate pieces: time to fill
+# slots from a short set to an evening, with and without a genre mix.
+# Run from the root folder: python -m benchmarks.bench_builder [n_pieces]
+
+import random
+import sys
+
+from app import piece_logic as pl
+from app.setlist_logic import build_setlist
+from benchmarks.bench_search import COMPOSERS, GENRES, timed
+
+SLOTS = [20 * 60, 45 * 60, 2 * 3600, 4 * 3600 + 7]
+MIXES = [None, {"Jazz": 2, "Classical": 1, "Film": 1}]
+
+
+def make_pieces(n, seed=42, step=1):
+    rnd = random.Random(seed)
+    return [pl.Piece(i, f"Piece {i}", rnd.choice(COMPOSERS), rnd.choice(GENRES), "performance-ready", 0,
+                     rnd.randint(90 // step, 720 // step) * step) for i in range(1, n + 1)]
+
+def main(n=10_000):
+    pieces = make_pieces(n)
+    print(f"candidates: {n}")
+    print(f"{'slot':>8}  {'genre mix':<42}{'ms':>8}{'filled':>10}{'pieces':>8}")
+    for mix in MIXES:
+        for slot in SLOTS:
+            best, (_, items) = timed(lambda: build_setlist(pieces, slot, 1, "bench", genre_mix=mix))
+            filled = sum(pieces[it.piece_id - 1].duration for it in items)
+            print(f"{slot:>8}  {str(mix or 'any'):<42}{best * 1000:>8.1f}{filled:>10}{len(items):>8}")
+
+    # worst case: whole-minute durations never fill a slot ending in :59 exactly, so the
+    # search cannot stop early and every candidate is tried
+    pieces = make_pieces(n, step=60)
+    best, (_, items) = timed(lambda: build_setlist(pieces, 4 * 3600 + 59, 1, "bench"))
+    filled = sum(pieces[it.piece_id - 1].duration for it in items)
+    print(f"{4 * 3600 + 59:>8}  {'any (no exact fill)':<42}{best * 1000:>8.1f}{filled:>10}{len(items):>8}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,77 @@
+# benchmarks/bench_memory.py
+# Memory per piece and readiness/user filter latency at 1M pieces:
+# plain objects (the old Piece with a __dict__) vs. slotted Piece vs. the columnar PieceTable.
+# Run from the root folder: python -m benchmarks.bench_memory [n_pieces]
+
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+from app import piece_logic as pl
+from app.piece_table import PieceTable, np
+from app.services import READINESS
+from benchmarks.bench_search import COMPOSERS, GENRES, WORDS, timed
+
+
+class DictPiece:
+    # Piece as it was before __slots__
+    def __init__(self, piece_id, title, composer, genre, readiness_status, user_id):
+        self.piece_id = piece_id
+        self.title = title
+        self.composer = composer
+        self.genre = genre
+        self.readiness_status = readiness_status
+        self.user_id = user_id
+        self.created = None
+        self.updated = None
+
+
+def rows(n, seed=42):
+    rnd = random.Random(seed)
+    titles = [" ".join(rnd.choice(WORDS).capitalize() for _ in range(3)) for _ in range(5000)]
+    for i in range(1, n + 1):
+        # fresh strings per row, like values parsed from a CSV file
+        yield (i, "".join(rnd.choice(titles)), "".join(rnd.choice(COMPOSERS)), "".join(rnd.choice(GENRES)),
+               READINESS[i % len(READINESS)], i % 50)
+
+def measured(build):
+    gc.collect()
+    tracemalloc.start()
+    out = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, out
+
+def main(n=1_000_000):
+    print(f"pieces: {n}  (numpy: {'yes' if np is not None else 'no, array fallback'})")
+
+    size_dict, dict_pieces = measured(lambda: [DictPiece(*r) for r in rows(n)])
+    del dict_pieces
+    size_slots, pieces = measured(lambda: [pl.Piece(*r) for r in rows(n)])
+    size_table, table = measured(lambda: PieceTable(pl.Piece(*r) for r in rows(n)))
+
+    print(f"{'store':<26}{'MB':>8}{'bytes/piece':>14}")
+    for name, size in (("objects with __dict__", size_dict), ("slotted Piece", size_slots), ("PieceTable", size_table)):
+        print(f"{name:<26}{size / 1e6:>8.1f}{size / n:>14.0f}")
+
+    lib = pl.PieceLibrary()
+    lib.pieces = pieces
+    print(f"\n{'filter':<34}{'scan ms':>10}{'index ms':>10}{'table ms':>10}{'hits':>9}")
+    for readiness, user in (("performance-ready", None), (None, 7), ("learning", 7)):
+        label = f"readiness={readiness} user={user}"
+        t_scan, hits = timed(lambda: [p for p in pieces
+                                      if (readiness is None or p.readiness_status == readiness)
+                                      and (user is None or p.user_id == user)], repeat=3)
+        t_index = float("nan")
+        if user is None:
+            t_index, _ = timed(lambda: lib.with_readiness(readiness), repeat=3)
+        t_table, _ = timed(lambda: table.rows(readiness, user), repeat=3)
+        print(f"{label:<34}{t_scan * 1000:>10.1f}{t_index * 1000:>10.1f}{t_table * 1000:>10.1f}{len(hits):>9}")
+
+    t_count, _ = timed(lambda: table.count("performance-ready", 7), repeat=3)
+    print(f"PieceTable.count(readiness, user) without building rows: {t_count * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,55 @@
+# benchmarks/bench_search.py
+# Inverted-index search vs. the old substring scan (services.filter_by_attribute) at 100k pieces.
+# Run from the root folder: python -m benchmarks.bench_search [n_pieces]
+
+import random
+import sys
+import time
+
+from app import piece_logic as pl
+from benchmarks.datagen import COMPOSERS, GENRES, WORDS
+
+QUERIES = ["chopin", "nocturne", "debussy night", "brub", "sonata minor beethoven", "jazz blue"]
+
+
+def make_library(n, seed=42):
+    rnd = random.Random(seed)
+    lib = pl.PieceLibrary()
+    lib.pieces = [
+        pl.Piece(i, " ".join(rnd.choice(WORDS).capitalize() for _ in range(rnd.randint(1, 4))),
+                 rnd.choice(COMPOSERS), rnd.choice(GENRES), "learning", 0)
+        for i in range(1, n + 1)
+    ]
+    return lib
+
+def scan(pieces, query):
+    # what filter_by_attribute did: lowercase substring test, one attribute at a time
+    q = query.lower()
+    return [p for p in pieces if q in (p.composer or "").lower()]
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main(n=100_000):
+    lib = make_library(n)
+    pieces = lib.pieces
+
+    build, _ = timed(lambda: lib.search("warmup"), repeat=1)
+    print(f"pieces: {n}")
+    print(f"index build (first search): {build * 1000:.1f} ms")
+    print(f"{'query':<26}{'scan ms':>10}{'index ms':>10}{'hits':>8}")
+    for q in QUERIES:
+        t_scan, _ = timed(lambda: scan(pieces, q.split()[0]))
+        t_idx, hits = timed(lambda: lib.search(q, limit=50))
+        print(f"{q:<26}{t_scan * 1000:>10.2f}{t_idx * 1000:>10.2f}{len(lib.search(q)):>8}")
+
+    t_edit, _ = timed(lambda: lib.edit_piece(1, "Nocturne in Blue", "Chopin", "Jazz", "learning"))
+    print(f"incremental update (edit_piece): {t_edit * 1e6:.0f} us")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
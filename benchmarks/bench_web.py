@@ -0,0 +1,75 @@
+# benchmarks/bench_web.py
+# Time to first byte and bytes on the wire for the large listing pages, over a real socket:
+# buffered + uncompressed (before) vs. streamed + gzip (after).
+# Run from the root folder: python -m benchmarks.bench_web [n_pieces]
+
+import http.client
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from benchmarks.bench_search import COMPOSERS, GENRES, WORDS
+from web import create_app
+
+PAGES = ["/pieces/?size=200", "/pieces/search?q=sonata"]
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+def make_app(folder, n, **config):
+    app = create_app(dict({"PIECES_CSV": f"{folder}/pieces.csv", "SETLISTS_CSV": f"{folder}/setlists.csv"},
+                          **config))
+    client = app.test_client()
+    if not client.get("/api/v1/pieces?size=1").get_json()["items"]:
+        rnd = random.Random(42)
+        client.post("/api/v1/pieces/bulk", json={"create": [
+            {"title": " ".join(rnd.choice(WORDS).capitalize() for _ in range(3)),
+             "composer": rnd.choice(COMPOSERS), "genre": rnd.choice(GENRES)} for _ in range(n)]})
+    return app
+
+def fetch(port, path, headers):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    start = time.perf_counter()
+    conn.request("GET", path, headers=headers)
+    response = conn.getresponse()
+    first = response.read(1)
+    ttfb = time.perf_counter() - start
+    size = len(first) + len(response.read())
+    total = time.perf_counter() - start
+    conn.close()
+    return ttfb, total, size
+
+def measure(app, path, headers, repeat=5):
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        runs = []
+        for _ in range(repeat):
+            app.extensions["fragments"].clear()        # measure rendering, not the fragment cache
+            runs.append(fetch(server.server_port, path, headers))
+        return min(runs)
+    finally:
+        server.shutdown()
+
+def main(n=20_000):
+    folder = tempfile.mkdtemp()
+    setups = [
+        ("buffered, identity", dict(STREAM_PAGES=False, COMPRESSION=False), {}),
+        ("streamed, identity", dict(STREAM_PAGES=True, COMPRESSION=False), {}),
+        ("streamed, gzip", dict(STREAM_PAGES=True, COMPRESSION=True), {"Accept-Encoding": "gzip"}),
+    ]
+    print(f"pieces: {n}")
+    print(f"{'page':<28}{'setup':<22}{'TTFB ms':>9}{'total ms':>10}{'bytes':>10}")
+    for path in PAGES:
+        for name, config, headers in setups:
+            ttfb, total, size = measure(make_app(folder, n, **config), path, headers)
+            print(f"{path:<28}{name:<22}{ttfb * 1000:>9.1f}{total * 1000:>10.1f}{size:>10}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,58 @@
+# benchmarks/datagen.py
+# Seeded synthetic data for the benchmarks: the same seed always gives the same library,
+# so timings from different commits are measured on identical data.
+# - make_pieces: 1k..1M pieces over a few users, with durations and mixed readiness
+# - make_setlists: thousands of setlists of 5..20 pieces each
+# - write_dataset: both as the CSV files the app reads (data/piece_library.csv layout)
+
+import os
+import random
+
+from app import piece_logic as pl
+from app import setlist_logic as sl
+from app import storage
+from app.services import READINESS
+
+COMPOSERS = ["Bach", "Beethoven", "Brahms", "Chopin", "Debussy", "Dave Brubeck", "Ravel", "Liszt",
+             "Mozart", "Schubert", "Satie", "Scriabin", "Duke Ellington", "Thelonious Monk", "Gershwin"]
+GENRES = ["Classical", "Jazz", "Romantic", "Baroque", "Impressionist", "Film", "Pop", "Folk"]
+WORDS = ["sonata", "nocturne", "etude", "prelude", "waltz", "ballade", "suite", "fugue", "rhapsody",
+         "blue", "moon", "night", "river", "song", "dance", "variations", "impromptu", "scherzo",
+         "minor", "major", "in", "for", "the", "no"]
+SEED = 42
+
+
+def make_title(rnd: random.Random) -> str:
+    return " ".join(rnd.choice(WORDS).capitalize() for _ in range(rnd.randint(1, 4)))
+
+def make_pieces(n: int, seed: int = SEED, users: int = 1) -> list:
+    rnd = random.Random(seed)
+    return [pl.Piece(i, make_title(rnd), rnd.choice(COMPOSERS), rnd.choice(GENRES), rnd.choice(READINESS),
+                     i % users if users > 1 else 0, rnd.randint(90, 720))
+            for i in range(1, n + 1)]
+
+def make_library(n: int, seed: int = SEED, users: int = 1) -> pl.PieceLibrary:
+    lib = pl.PieceLibrary()
+    lib.pieces = make_pieces(n, seed, users)
+    return lib
+
+def make_setlists(n: int, n_pieces: int, seed: int = SEED, sizes=(5, 20)):
+    """n setlists drawing on piece ids 1..n_pieces -> (Performances, SetlistStore)."""
+    rnd = random.Random(seed + 1)
+    performances, items = sl.Performances(), sl.SetlistStore()
+    item_id = 0
+    for pid in range(1, n + 1):
+        performances[pid] = sl.Performance(pid, f"Recital {pid}", f"2026-{pid % 12 + 1:02}-01", "Hall", 0)
+        chosen = rnd.sample(range(1, n_pieces + 1), min(n_pieces, rnd.randint(*sizes)))
+        for order, piece_id in enumerate(chosen, start=1):
+            item_id += 1
+            items.append(sl.Setlist_Item(item_id, pid, piece_id, order))
+    return performances, items
+
+def write_dataset(folder: str, n_pieces: int, n_setlists: int, seed: int = SEED):
+    """Writes pieces + setlists CSV files into folder; returns (pieces_csv, setlists_csv)."""
+    pieces_csv = os.path.join(folder, "piece_library.csv")
+    setlists_csv = os.path.join(folder, "setlist_library.csv")
+    storage.save_pieces(make_pieces(n_pieces, seed), pieces_csv)
+    storage.save_setlists(*make_setlists(n_setlists, n_pieces, seed), setlists_csv)
+    return pieces_csv, setlists_csv
@@ -0,0 +1,341 @@
+# benchmarks/suite.py
+# The benchmark suite: storage, library and setlist operations and the listing pages,
+# each at several library sizes, on seeded synthetic data (datagen.py). Results are JSON
+# so two commits can be compared automatically.
+# Run from the root folder:
+#   python -m benchmarks.suite --out before.json                    (sizes 1k, 10k, 100k)
+#   python -m benchmarks.suite --sizes 1000000 --only storage,library
+#   python -m benchmarks.suite --out after.json --compare before.json   (exit 1 on a regression)
+#
+# Each case's setup (building the data it works on) is not timed; every repeat gets a fresh
+# setup, so mutating cases always start from the same state. The best of the repeats is the
+# number to compare (min_ms); the median is there to show the noise.
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, List, NamedTuple
+
+from app import piece_logic as pl
+from app import setlist_logic as sl
+from app import storage
+from app.piece_table import np
+from benchmarks import datagen
+from benchmarks.bench_search import QUERIES
+
+SIZES = [1_000, 10_000, 100_000]
+REPEAT = 5
+OPS = 1000              # operations per run for the per-operation cases
+THRESHOLD = 1.25        # --compare: slower than baseline by more than this factor = regression
+MIN_DIFF_MS = 0.5       # ... and by more than this, so sub-millisecond noise doesn't count
+
+
+def setlists_for(size: int) -> int:
+    """Number of setlists that goes with a library of `size` pieces."""
+    return max(1000, size // 20)
+
+
+class Fixture:
+    """Data shared by the cases of one size, built on first use."""
+    def __init__(self, size: int, seed: int):
+        self.size = size
+        self.seed = seed
+        self._folder = None
+        self._app = None
+
+    @property
+    def folder(self) -> str:
+        if self._folder is None:
+            self._folder = tempfile.mkdtemp(prefix="bench-")
+            datagen.write_dataset(self._folder, self.size, setlists_for(self.size), self.seed)
+        return self._folder
+
+    @property
+    def pieces_csv(self) -> str:
+        return os.path.join(self.folder, "piece_library.csv")
+
+    @property
+    def setlists_csv(self) -> str:
+        return os.path.join(self.folder, "setlist_library.csv")
+
+    @property
+    def app(self):
+        if self._app is None:
+            from web import create_app
+            self._app = create_app({"STORAGE_BACKEND": "csv", "PIECES_CSV": self.pieces_csv,
+                                    "SETLISTS_CSV": self.setlists_csv})
+        return self._app
+
+    def close(self) -> None:
+        if self._app is not None:
+            self._app.extensions["storage"].close()
+        if self._folder is not None:
+            shutil.rmtree(self._folder, ignore_errors=True)
+
+
+class Case(NamedTuple):
+    name: str
+    setup: Callable     # Fixture -> whatever run() works on
+    run: Callable       # that -> number of operations done
+
+
+# ----------- Storage ----------- #
+
+def _once(fn):
+    # a case that is a single call
+    def run(data):
+        fn(data)
+        return 1
+    return run
+
+def _loaded_pieces(fx):
+    return storage.load_pieces(fx.pieces_csv), os.path.join(fx.folder, "out_pieces.csv")
+
+def _loaded_setlists(fx):
+    performances, items = storage.load_setlists(fx.setlists_csv)
+    list(items)                 # build the deferred items, as a save after real use would find them
+    return performances, items, os.path.join(fx.folder, "out_setlists.csv")
+
+def _save_pieces(a):
+    pieces, path = a
+    storage.save_pieces(pieces, path)
+    return len(pieces)
+
+def _save_setlists(a):
+    storage.save_setlists(*a)
+    return len(a[0])
+
+def _snapshotted(fx):
+    storage.open_snapshot(fx.pieces_csv).close()       # built once, outside the timing
+    return fx.pieces_csv
+
+def _open_snapshot(path):
+    with storage.open_snapshot(path) as snap:
+        return len(snap)
+
+def _decode_snapshot(path):
+    with storage.open_snapshot(path) as snap:
+        return len(list(snap))
+
+CASES: List[Case] = [
+    Case("storage.load_pieces", lambda fx: fx.pieces_csv, lambda path: len(storage.load_pieces(path))),
+    Case("storage.save_pieces", _loaded_pieces, _save_pieces),
+    Case("storage.load_setlists", lambda fx: fx.setlists_csv, lambda path: len(storage.load_setlists(path)[0])),
+    Case("storage.save_setlists", _loaded_setlists, _save_setlists),
+    Case("storage.open_snapshot", _snapshotted, _open_snapshot),
+    Case("storage.decode_snapshot", _snapshotted, _decode_snapshot),
+]
+
+
+# ----------- Library ----------- #
+
+def _library(fx):
+    return datagen.make_library(fx.size, fx.seed), random.Random(fx.seed), fx.size
+
+def _add(a):
+    lib, rnd, _ = a
+    for _ in range(OPS):
+        lib.add_piece(pl.Piece(lib.next_id(), datagen.make_title(rnd), rnd.choice(datagen.COMPOSERS),
+                               rnd.choice(datagen.GENRES), "learning", 0, rnd.randint(90, 720)))
+    return OPS
+
+def _edit(a):
+    lib, rnd, size = a
+    for _ in range(OPS):
+        p = lib.get(rnd.randint(1, size))
+        lib.edit_piece(p.piece_id, datagen.make_title(rnd), p.composer, rnd.choice(datagen.GENRES), "rehearsing")
+    return OPS
+
+def _delete(a):
+    lib, rnd, size = a
+    doomed = rnd.sample(range(1, size + 1), min(OPS, size))
+    for piece_id in doomed:
+        lib.delete_piece(piece_id)
+    return len(doomed)
+
+def _searchable(fx):
+    lib = datagen.make_library(fx.size, fx.seed)
+    lib.search("warmup")        # builds the index
+    return lib
+
+def _search(lib):
+    for q in QUERIES:
+        lib.search(q, limit=50)
+    return len(QUERIES)
+
+
+CASES += [
+    Case("library.add", _library, _add),
+    Case("library.edit", _library, _edit),
+    Case("library.delete", _library, _delete),
+    Case("library.filter_readiness", lambda fx: datagen.make_library(fx.size, fx.seed),
+         _once(lambda lib: lib.with_readiness("performance-ready"))),
+    Case("library.filter_composer", lambda fx: datagen.make_library(fx.size, fx.seed),
+         _once(lambda lib: lib.matching("composer", "chopin"))),
+    Case("library.search", _searchable, _search),
+]
+
+
+# ----------- Setlists ----------- #
+
+def _setlists(fx):
+    performances, items = datagen.make_setlists(setlists_for(fx.size), fx.size, fx.seed)
+    return performances, items, random.Random(fx.seed)
+
+def _reorder(a):
+    performances, items, rnd = a
+    ids = list(performances)
+    for _ in range(OPS):
+        pid = rnd.choice(ids)
+        n = items.count(pid)
+        if rnd.random() < 0.5:
+            sl.move_up(items, pid, rnd.randint(2, n))
+        else:
+            sl.move_down(items, pid, rnd.randint(1, n - 1))
+    return OPS
+
+def _add_remove(a):
+    performances, items, rnd = a
+    ids = list(performances)
+    for _ in range(OPS // 2):
+        pid = rnd.choice(ids)
+        sl.add_piece_to_setlist(items, pid, rnd.randint(1, 1000))
+        sl.remove_piece_from_setlist(items, pid, rnd.randint(1, items.count(pid)))
+    return OPS // 2 * 2
+
+def _candidates(fx):
+    return [p for p in datagen.make_pieces(fx.size, fx.seed) if p.readiness_status == "performance-ready"]
+
+CASES += [
+    Case("setlists.reorder", _setlists, _reorder),
+    Case("setlists.add_remove_item", _setlists, _add_remove),
+    Case("setlists.build_45min", _candidates, _once(lambda pieces: sl.build_setlist(pieces, 45 * 60, 1, "bench"))),
+]
+
+
+# ----------- Web ----------- #
+
+def _client(fx, cold: bool):
+    app = fx.app
+    client = app.test_client()
+    client.get("/pieces/").close()      # loads the data into the repositories
+    client.get("/setlists/").close()
+    if cold:
+        app.extensions["fragments"].clear()     # measure rendering, not the fragment cache
+    return client
+
+def _get(path):
+    def run(client):
+        response = client.get(path)
+        response.get_data()
+        assert response.status_code == 200, (path, response.status_code)
+        return 1
+    return run
+
+CASES += [
+    Case("web.pieces_page", lambda fx: _client(fx, cold=True), _get("/pieces/")),
+    Case("web.pieces_page_cached", lambda fx: _client(fx, cold=False), _get("/pieces/")),
+    Case("web.pieces_search", lambda fx: _client(fx, cold=True), _get("/pieces/search?q=sonata")),
+    Case("web.setlists_page", lambda fx: _client(fx, cold=True), _get("/setlists/")),
+    Case("web.setlists_page_cached", lambda fx: _client(fx, cold=False), _get("/setlists/")),
+    Case("web.api_pieces", lambda fx: _client(fx, cold=True), _get("/api/v1/pieces?size=100")),
+]
+
+
+# ----------- Running ----------- #
+
+def measure(case: Case, fx: Fixture, repeat: int = REPEAT) -> dict:
+    runs, ops = [], 0
+    for _ in range(repeat):
+        data = case.setup(fx)
+        t0 = time.perf_counter()
+        ops = case.run(data)
+        runs.append(time.perf_counter() - t0)
+    best = min(runs)
+    return {"name": case.name, "size": fx.size, "repeat": repeat, "ops": ops,
+            "min_ms": round(best * 1000, 3), "median_ms": round(statistics.median(runs) * 1000, 3),
+            "us_per_op": round(best * 1e6 / ops, 3) if ops else None}
+
+def _commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+def run(sizes=SIZES, only=None, repeat: int = REPEAT, seed: int = datagen.SEED, log=None) -> dict:
+    """Runs the cases (those whose group is in `only`, e.g. {"storage", "web"}) -> results document."""
+    results = []
+    for size in sizes:
+        fx = Fixture(size, seed)
+        try:
+            for case in CASES:
+                if only and case.name.split(".")[0] not in only:
+                    continue
+                result = measure(case, fx, repeat)
+                results.append(result)
+                if log:
+                    log(f"{case.name:<28}{size:>9}{result['min_ms']:>12.2f}{result['median_ms']:>12.2f}"
+                        f"{result['us_per_op'] or 0:>12.2f}")
+        finally:
+            fx.close()
+    return {"meta": {"commit": _commit(), "python": platform.python_version(), "platform": platform.platform(),
+                     "numpy": np is not None, "seed": seed, "repeat": repeat, "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "results": results}
+
+def compare(current: dict, baseline: dict, threshold: float = THRESHOLD) -> List[dict]:
+    """The results that got slower than in `baseline` by more than `threshold` (and MIN_DIFF_MS)."""
+    before = {(r["name"], r["size"]): r for r in baseline.get("results", [])}
+    slower = []
+    for r in current["results"]:
+        old = before.get((r["name"], r["size"]))
+        if old is None or not old["min_ms"]:
+            continue
+        ratio = r["min_ms"] / old["min_ms"]
+        if ratio > threshold and r["min_ms"] - old["min_ms"] > MIN_DIFF_MS:
+            slower.append({"name": r["name"], "size": r["size"], "before_ms": old["min_ms"],
+                           "after_ms": r["min_ms"], "ratio": round(ratio, 2)})
+    return slower
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="RepertoireReady benchmark suite")
+    ap.add_argument("--sizes", default=",".join(map(str, SIZES)), help="library sizes, comma separated")
+    ap.add_argument("--only", help="groups to run, comma separated (storage, library, setlists, web)")
+    ap.add_argument("--repeat", type=int, default=REPEAT, help="runs per case (the best one counts)")
+    ap.add_argument("--seed", type=int, default=datagen.SEED)
+    ap.add_argument("--out", metavar="FILE", help="write the JSON results here (default: stdout)")
+    ap.add_argument("--compare", metavar="FILE", help="baseline JSON results; exit 1 if anything got slower")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD, help="slowdown factor that counts as a regression")
+    args = ap.parse_args(argv)
+
+    log = lambda line: print(line, file=sys.stderr)
+    log(f"{'case':<28}{'size':>9}{'min ms':>12}{'median ms':>12}{'us/op':>12}")
+    doc = run([int(s) for s in args.sizes.split(",")], set(args.only.split(",")) if args.only else None,
+              args.repeat, args.seed, log)
+
+    text = json.dumps(doc, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            slower = compare(doc, json.load(f), args.threshold)
+        for r in slower:
+            log(f"SLOWER {r['name']} @ {r['size']}: {r['before_ms']:.2f} -> {r['after_ms']:.2f} ms (x{r['ratio']})")
+        log(f"{len(slower)} regressions against {args.compare}")
+        return 1 if slower else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import json
+import pytest
+from web import create_app
+from app.backends import open_backend
+
+@pytest.fixture(params=["journal", "sqlite"])
+def app(request, tmp_path):
+    """An app on temporary storage (journal and SQLite backends)."""
+    return create_app({"TESTING": True, "STORAGE_BACKEND": request.param,
+                       "PIECES_CSV": str(tmp_path / "pieces.csv"),
+                       "SETLISTS_CSV": str(tmp_path / "setlists.csv"),
+                       "SQLITE_PATH": str(tmp_path / "repertoire.db")})
+
+@pytest.fixture
+def client(app):
+    with app.test_client() as client:
+        yield client
+
+def reopened(app):
+    """A fresh backend on the same files: what another process would read."""
+    return open_backend(app.config["STORAGE_BACKEND"], pieces_csv=app.config["PIECES_CSV"],
+                        setlists_csv=app.config["SETLISTS_CSV"], sqlite_path=app.config["SQLITE_PATH"])
+
+def test_piece_crud(client, app):
+    response = client.post("/api/v1/pieces", json={"title": "Clair de Lune", "composer": "Debussy",
+                                                    "readiness_status": "Performance ready"})
+    assert response.status_code == 201
+    piece = response.get_json()
+    assert piece["readiness_status"] == "performance-ready"
+
+    pid = piece["piece_id"]
+    assert client.get(f"/api/v1/pieces/{pid}").get_json()["title"] == "Clair de Lune"
+    response = client.patch(f"/api/v1/pieces/{pid}", json={"genre": "Impressionist"})
+    assert response.get_json()["genre"] == "Impressionist"
+    assert response.get_json()["composer"] == "Debussy"
+    assert [p.genre for p in reopened(app).load_pieces()] == ["Impressionist"]
+
+    assert client.delete(f"/api/v1/pieces/{pid}").status_code == 204
+    assert client.get(f"/api/v1/pieces/{pid}").status_code == 404
+    assert reopened(app).load_pieces() == []
+
+def test_piece_validation_errors_are_json(client):
+    response = client.post("/api/v1/pieces", json={"title": "X", "readiness_status": "someday"})
+    assert response.status_code == 400
+    assert "unknown readiness" in response.get_json()["error"]
+    response = client.post("/api/v1/pieces", json={"title": "X", "readiness_status": 5})
+    assert response.status_code == 400
+    assert "must be a string" in response.get_json()["error"]
+    assert client.post("/api/v1/pieces", data="nope").status_code == 400
+    assert "error" in client.delete("/api/v1/pieces/99").get_json()
+
+def test_bulk_pieces_apply_together(client, app):
+    created = client.post("/api/v1/pieces/bulk", json={
+        "create": [{"title": f"Etude {i}", "composer": "Chopin"} for i in range(1, 6)]}).get_json()["created"]
+    ids = [p["piece_id"] for p in created]
+    assert len(set(ids)) == 5
+
+    response = client.post("/api/v1/pieces/bulk", json={
+        "create": [{"title": "Nocturne", "composer": "Chopin"}],
+        "update": [{"piece_id": ids[0], "readiness_status": "rehearsing"}],
+        "delete": ids[3:]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (len(body["created"]), body["updated"], body["deleted"]) == (1, 1, 2)
+
+    stored = {p.piece_id: p for p in reopened(app).load_pieces()}
+    assert len(stored) == 4
+    assert stored[ids[0]].readiness_status == "rehearsing"
+    assert ids[3] not in stored
+
+def test_bulk_pieces_all_or_nothing(client, app):
+    pid = client.post("/api/v1/pieces", json={"title": "Keep"}).get_json()["piece_id"]
+    response = client.post("/api/v1/pieces/bulk", json={
+        "create": [{"title": "Fine"}, {"title": ""}],
+        "update": [{"piece_id": pid, "title": "Changed"}],
+        "delete": [404]})
+    assert response.status_code == 400
+    errors = response.get_json()["errors"]
+    assert [(e["op"], e["index"]) for e in errors] == [("create", 1), ("delete", 0)]
+    assert [p.title for p in reopened(app).load_pieces()] == ["Keep"]
+    assert [p["title"] for p in client.get("/api/v1/pieces").get_json()["items"]] == ["Keep"]
+
+    assert pid == 1     # JSON true is not piece 1
+    response = client.post("/api/v1/pieces/bulk", json={
+        "create": [{"title": "Odd", "readiness_status": ["learning"]}],
+        "update": [{"piece_id": True, "title": "Changed"}],
+        "delete": [True]})
+    assert response.status_code == 400
+    errors = response.get_json()["errors"]
+    assert [(e["op"], e["index"]) for e in errors] == [("create", 0), ("update", 0), ("delete", 0)]
+    assert [p.title for p in reopened(app).load_pieces()] == ["Keep"]
+
+def test_pieces_listing_pages_with_cursors(client):
+    client.post("/api/v1/pieces/bulk", json={"create": [{"title": f"P{i:02}"} for i in range(30)]})
+    first = client.get("/api/v1/pieces?sort=title&size=20").get_json()
+    second = client.get(f"/api/v1/pieces?sort=title&size=20&after={first['next']}").get_json()
+    titles = [p["title"] for p in first["items"] + second["items"]]
+    assert titles == [f"P{i:02}" for i in range(30)]
+    assert second["next"] is None
+    assert client.get("/api/v1/pieces?sort=nope").status_code == 400
+
+def test_export_streams_ndjson(client):
+    client.post("/api/v1/pieces/bulk", json={"create": [{"title": f"P{i}"} for i in range(1200)]})
+    response = client.get("/api/v1/pieces/export")
+    assert response.mimetype == "application/x-ndjson"
+    assert response.is_streamed
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == 1200
+    assert json.loads(lines[-1])["title"] == "P1199"
+
+def test_performances_and_items(client, app):
+    perf = client.post("/api/v1/performances", json={"title": "Spring Recital", "date": "2026-04-01"}).get_json()
+    perf_id = perf["performance_id"]
+    a, b, c = (client.post("/api/v1/pieces", json={"title": t}).get_json()["piece_id"] for t in "ABC")
+    for pid in (a, b, c):
+        assert client.post(f"/api/v1/performances/{perf_id}/items", json={"piece_id": pid}).status_code == 201
+    assert client.post(f"/api/v1/performances/{perf_id}/items", json={"piece_id": a}).status_code == 409
+    assert client.post(f"/api/v1/performances/{perf_id}/items", json={"piece_id": 999}).status_code == 400
+    assert client.post(f"/api/v1/performances/{perf_id}/items", json={"piece_id": True}).status_code == 400
+
+    response = client.put(f"/api/v1/performances/{perf_id}/items", json={"piece_ids": [c, a, b]})
+    assert [it["piece_id"] for it in response.get_json()["items"]] == [c, a, b]
+    assert client.put(f"/api/v1/performances/{perf_id}/items", json={"piece_ids": [c, a]}).status_code == 400
+    assert client.put(f"/api/v1/performances/{perf_id}/items", json={"piece_ids": [str(c), str(a), str(b)]}).status_code == 400
+    assert client.put(f"/api/v1/performances/{perf_id}/items", json={"piece_ids": [c, a, True]}).status_code == 400
+    assert client.delete(f"/api/v1/performances/{perf_id}/items/2").status_code == 204
+    response = client.patch(f"/api/v1/performances/{perf_id}/items/2", json={"position": 1})
+    assert [it["piece_id"] for it in response.get_json()["items"]] == [b, c]
+    assert client.patch(f"/api/v1/performances/{perf_id}/items/2", json={"position": 3}).status_code == 400
+    assert client.patch(f"/api/v1/performances/{perf_id}/items/5", json={"position": 1}).status_code == 404
+
+    performances, items = reopened(app).load_setlists()
+    assert performances[perf_id].title == "Spring Recital"
+    assert [it.piece_id for it in items.items_for(perf_id)] == [b, c]
+    assert [it["order_index"] for it in client.get(f"/api/v1/performances/{perf_id}").get_json()["items"]] == [1, 2]
+
+    assert client.delete(f"/api/v1/performances/{perf_id}").status_code == 204
+    assert client.get(f"/api/v1/performances/{perf_id}").status_code == 404
+    assert reopened(app).load_setlists()[0] == {}
+
+def test_bulk_performances(client, app):
+    created = client.post("/api/v1/performances/bulk", json={
+        "create": [{"title": "Gig 1"}, {"title": "Gig 2"}, {"title": "Gig 3"}]}).get_json()["created"]
+    first, second, third = (p["performance_id"] for p in created)
+    response = client.post("/api/v1/performances/bulk", json={
+        "update": [{"performance_id": first, "location": "Hall"}], "delete": [second]})
+    assert response.status_code == 200
+    assert client.post("/api/v1/performances/bulk", json={"create": [{}]}).status_code == 400
+
+    performances, _ = reopened(app).load_setlists()
+    assert sorted(performances) == [first, third]
+    assert performances[first].location == "Hall"
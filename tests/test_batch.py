@@ -0,0 +1,94 @@
+from argparse import Namespace
+
+import pytest
+
+from app import piece_logic as tpl
+from app import setlist_logic as sl
+from app.batch import parse_line, run_batch
+
+
+class FakeState:
+    """What run_batch needs from main.State, in memory."""
+    def __init__(self, user=None):
+        self.args = Namespace(user=user)
+        self.user_id = user or 0
+        self.library = tpl.PieceLibrary()
+        self.performances, self.items = sl.Performances({}), sl.SetlistStore()
+        self.saves = 0
+
+    def setlists(self):
+        return self.performances, self.items
+
+    def save(self):
+        self.saves += 1
+
+
+def test_parse_line():
+    assert parse_line('add_piece title="Take Five" duration=5:24') == ("add_piece", {"title": "Take Five",
+                                                                                    "duration": "5:24"})
+    assert parse_line('{"op": "delete_piece", "piece_id": 3}') == ("delete_piece", {"piece_id": 3})
+    for bad in ('add_piece Take', '{"op": ', '{"op": "add_piece"} x', 'add_piece title="open'):
+        with pytest.raises(ValueError):
+            parse_line(bad)
+
+def test_ops_use_the_menu_checks_and_save_once():
+    state = FakeState()
+    results = []
+    report = run_batch([
+        "# comment", "",
+        'add_piece title=Ondine composer=Ravel readiness_status="performance ready" duration=6:20',
+        '{"op": "add_piece", "title": "Take Five", "duration": 324, "readiness_status": "performance-ready"}',
+        "add_piece composer=Nobody",
+        "edit_piece piece_id=1 genre=Classical duration=",
+        "edit_piece piece_id=7 title=X",
+        "add_setlist title=Recital",
+        "add_piece_to_setlist performance_id=1 piece_id=2",
+        "add_piece_to_setlist performance_id=1 piece_id=2",
+        "add_piece_to_setlist performance_id=1 piece_id=1 extra=1",
+        "build_setlist title=Gig target=6:00",
+        "delete_piece piece_id=abc",
+    ], state, results.append)
+    assert (report.ops, report.ok, report.error_count) == (11, 6, 5)
+    assert state.saves == 1
+    assert [e.line for e in report.errors] == [5, 7, 10, 11, 13]
+    assert report.errors[0].message == "Title is required."
+    assert "unknown field 'extra'" in report.errors[3].message
+    assert results[0] == {"line": 3, "op": "add_piece", "ok": True, "piece_id": 1}
+
+    ondine = state.library.get(1)
+    assert (ondine.genre, ondine.readiness_status, ondine.duration) == ("Classical", "performance-ready", None)
+    assert [it.piece_id for it in state.items.items_for(1)] == [2]
+    assert results[-2]["pieces"] == 1 and results[-2]["runtime"] == 324
+
+def test_json_values_of_the_wrong_type_fail_their_op_only():
+    state = FakeState()
+    lines = [
+        '{"op": "add_piece", "title": "Take Five", "genre": "Jazz", "duration": 324.0, "readiness_status": "performance-ready"}',
+        '{"op": "add_piece", "title": "Ondine", "duration": 390.5}',
+        '{"op": "add_piece", "title": "Ondine", "duration": [390]}',
+        '{"op": "edit_piece", "piece_id": 1, "duration": true}',
+        '{"op": "build_setlist", "title": "Gig", "target": "6:00", "genre_mix": ["Jazz"]}',
+        '{"op": "build_setlist", "title": "Gig", "target": "6:00", "genre_mix": {"Jazz": "lots"}}',
+        '{"op": "build_setlist", "title": "Gig", "target": "6:00", "genre_mix": "Jazz:inf"}',
+        '{"op": "build_setlist", "title": "Gig", "target": 360.0, "genre_mix": {"Jazz": 2}}',
+    ]
+    report = run_batch(lines, state)
+    assert [e.line for e in report.errors] == [2, 3, 4, 5, 6, 7]
+    assert all("bad duration" in e.message for e in report.errors[:3])
+    assert all("weight" in e.message or "genre mix" in e.message for e in report.errors[3:])
+    assert state.library.get(1).duration == 324
+    assert [it.piece_id for it in state.items.items_for(1)] == [1]
+    assert state.saves == 1
+
+def test_build_rejects_an_oversized_slot():
+    state = FakeState()
+    report = run_batch(['{"op": "add_piece", "title": "Take Five", "duration": 324, "readiness_status": "performance-ready"}',
+                        "build_setlist title=Gig target=99999999999", "build_setlist title=Gig target=24:00:00"], state)
+    assert (report.ok, report.error_count) == (2, 1)
+    assert "at most 24:00:00" in report.errors[0].message
+
+def test_user_id_must_match_the_partition():
+    state = FakeState(user=3)
+    report = run_batch(["add_piece title=A", "add_piece title=B user_id=4"], state)
+    assert report.error_count == 1
+    assert state.library.get(1).user_id == 3
@@ -0,0 +1,32 @@
+import json
+
+from benchmarks import datagen, suite
+
+
+def test_generators_are_seeded():
+    a, b = datagen.make_pieces(50), datagen.make_pieces(50)
+    assert [(p.title, p.composer, p.duration) for p in a] == [(p.title, p.composer, p.duration) for p in b]
+    assert [p.title for p in datagen.make_pieces(50, seed=7)] != [p.title for p in a]
+
+    performances, items = datagen.make_setlists(30, 50)
+    assert len(performances) == 30
+    assert all(5 <= items.count(pid) <= 20 for pid in performances)
+    assert all(1 <= it.piece_id <= 50 for it in items)
+
+def test_suite_runs_every_case_and_emits_json():
+    doc = suite.run(sizes=[200], repeat=1)
+    assert [r["name"] for r in doc["results"]] == [c.name for c in suite.CASES]
+    assert all(r["size"] == 200 and r["ops"] >= 1 and r["min_ms"] >= 0 for r in doc["results"])
+    assert json.loads(json.dumps(doc))["meta"]["seed"] == datagen.SEED
+
+    only = suite.run(sizes=[200], only={"storage"}, repeat=1)
+    assert {r["name"].split(".")[0] for r in only["results"]} == {"storage"}
+
+def test_compare_flags_slowdowns_only():
+    before = {"results": [{"name": "a", "size": 1, "min_ms": 10.0}, {"name": "b", "size": 1, "min_ms": 0.1}]}
+    after = {"results": [{"name": "a", "size": 1, "min_ms": 20.0}, {"name": "b", "size": 1, "min_ms": 0.3},
+                         {"name": "c", "size": 1, "min_ms": 5.0}]}
+    slower = suite.compare(after, before)
+    # b tripled but by less than MIN_DIFF_MS; c has no baseline
+    assert [(r["name"], r["ratio"]) for r in slower] == [("a", 2.0)]
+    assert suite.compare(before, before) == []
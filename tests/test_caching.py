@@ -0,0 +1,62 @@
+import re
+import pytest
+from web import create_app
+from web.caching import STATIC_MAX_AGE
+
+@pytest.fixture
+def app(tmp_path):
+    return create_app({"TESTING": True, "PIECES_CSV": str(tmp_path / "pieces.csv"),
+                       "SETLISTS_CSV": str(tmp_path / "setlists.csv")})
+
+@pytest.fixture
+def client(app):
+    with app.test_client() as client:
+        yield client
+
+def test_pieces_page_revalidates_with_etag(client):
+    first = client.get("/pieces/")
+    assert first.status_code == 200
+    assert first.headers["ETag"].startswith('W/"')
+    assert "no-cache" in first.headers["Cache-Control"]
+    assert first.headers["Last-Modified"]
+
+    again = client.get("/pieces/", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.data == b""
+
+    client.post("/pieces/form", data={"title": "Nocturne", "composer": "Chopin", "genre": "Classical",
+                                      "readiness_status": "learning"})
+    changed = client.get("/pieces/", headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200
+    assert b"Nocturne" in changed.data
+    assert changed.headers["ETag"] != first.headers["ETag"]
+
+def test_if_modified_since(client):
+    first = client.get("/pieces/")
+    assert client.get("/pieces/", headers={"If-Modified-Since": first.headers["Last-Modified"]}).status_code == 304
+    assert client.get("/pieces/", headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}).status_code == 200
+    # If-None-Match takes precedence when both are sent
+    assert client.get("/pieces/", headers={"If-None-Match": 'W/"other"',
+                                           "If-Modified-Since": first.headers["Last-Modified"]}).status_code == 200
+
+def test_setlists_page_revalidates(client):
+    first = client.get("/setlists/")
+    assert first.status_code == 200
+    assert client.get("/setlists/", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+def test_static_urls_are_fingerprinted(client):
+    home = client.get("/").get_data(as_text=True)
+    css = re.search(r'href = "(/static/css/home\.css\?v=\w+)"', home).group(1)
+    assert re.search(r"/static/img/homepage_bg\.jpeg\?v=\w+", home)
+
+    response = client.get(css)
+    assert response.status_code == 200
+    assert response.cache_control.max_age == STATIC_MAX_AGE
+    assert response.cache_control.immutable
+    response.close()
+
+    for url in ("/static/css/home.css", "/static/css/home.css?v=stale"):
+        response = client.get(url)
+        assert response.cache_control.no_cache
+        assert not response.cache_control.immutable
+        response.close()
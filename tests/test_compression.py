@@ -0,0 +1,73 @@
+import gzip
+import os
+import shutil
+import pytest
+from web import create_app
+from web import compression
+
+@pytest.fixture
+def make_app(tmp_path):
+    def make(**config):
+        return create_app(dict({"TESTING": True, "PIECES_CSV": str(tmp_path / "pieces.csv"),
+                                "SETLISTS_CSV": str(tmp_path / "setlists.csv")}, **config))
+    return make
+
+@pytest.fixture
+def client(make_app):
+    app = make_app(COMPRESSION=True)
+    client = app.test_client()
+    client.post("/api/v1/pieces/bulk", json={"create": [{"title": f"Sonata {i}"} for i in range(60)]})
+    return client
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+def test_off_by_default(make_app):
+    response = make_app().test_client().get("/pieces/", headers=GZIP)
+    assert "Content-Encoding" not in response.headers
+
+def test_pages_are_gzipped(client):
+    plain = client.get("/pieces/")
+    packed = client.get("/pieces/", headers=GZIP)
+    assert "Content-Encoding" not in plain.headers
+    assert packed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in packed.headers["Vary"]
+    body = gzip.decompress(packed.data)
+    assert body == plain.data
+    assert len(packed.data) < len(body) / 3
+
+def test_streamed_page_is_compressed_in_chunks(client):
+    response = client.get("/pieces/search?q=sonata", headers=GZIP)
+    assert response.is_streamed
+    assert "Content-Length" not in response.headers
+    assert gzip.decompress(response.data).count(b"Sonata") == 60
+
+def test_small_and_already_encoded_responses_are_left_alone(client):
+    assert "Content-Encoding" not in client.get("/api/v1/pieces/1", headers=GZIP).headers
+    assert "Content-Encoding" not in client.get("/static/img/homepage_bg.jpeg", headers=GZIP).headers
+
+def test_precompressed_static_files(make_app, tmp_path):
+    static = tmp_path / "static"
+    shutil.copytree(os.path.join(os.path.dirname(compression.__file__), "static", "css"), static / "css")
+    written = compression.precompress(str(static))
+    assert str(static / "css" / "home.css.gz") in written
+
+    app = make_app(COMPRESSION=True)
+    app.static_folder = str(static)
+    client = app.test_client()
+    response = client.get("/static/css/home.css", headers=GZIP)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.mimetype == "text/css"
+    assert gzip.decompress(response.data) == (static / "css" / "home.css").read_bytes()
+    response.close()
+
+    # a stale copy (older than the file) is not used
+    os.utime(static / "css" / "home.css.gz", (1, 1))
+    response = client.get("/static/css/home.css", headers=GZIP)
+    assert "Content-Encoding" not in response.headers
+    response.close()
+
+def test_brotli_when_installed(client):
+    brotli = pytest.importorskip("brotli")
+    response = client.get("/pieces/", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert b"Sonata 59" in brotli.decompress(response.data)
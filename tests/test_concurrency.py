@@ -0,0 +1,75 @@
+# Multi-process stress test: several "web workers" hammer the same data files at once.
+# Scale it up with REPERTOIRE_STRESS_OPS (adds per worker, default 250).
+
+import multiprocessing as mp
+import os
+
+import pytest
+
+from web import create_app
+from app.backends import open_backend
+from app.repository import get_piece_repository
+
+WORKERS = 4
+OPS = int(os.environ.get("REPERTOIRE_STRESS_OPS", "250"))
+
+
+def _config(backend_name, data_dir):
+    return {
+        "TESTING": True,
+        "STORAGE_BACKEND": backend_name,
+        "PIECES_CSV": os.path.join(data_dir, "piece_library.csv"),
+        "SETLISTS_CSV": os.path.join(data_dir, "setlist_library.csv"),
+        "SQLITE_PATH": os.path.join(data_dir, "repertoire.db"),
+    }
+
+def _worker(backend_name, data_dir, worker_no, results):
+    app = create_app(_config(backend_name, data_dir))
+    client = app.test_client()
+    repo = get_piece_repository(app.extensions["storage"])
+    added, deleted = [], []
+
+    for i in range(OPS):
+        title = f"w{worker_no}-{i}"
+        r = client.post("/pieces/form", data={"title": title, "composer": "Stress",
+                                              "genre": "Test", "readiness_status": "learning"})
+        assert r.status_code == 302
+        added.append(title)
+
+        # every third piece gets deleted again right away
+        if i % 3 == 2:
+            piece_id = next(p.piece_id for p in repo.get().pieces if p.title == title)
+            assert client.post(f"/pieces/delete/{piece_id}").status_code == 302
+            deleted.append(title)
+
+    app.extensions["storage"].close()
+    results.put((added, deleted))
+
+
+@pytest.mark.parametrize("backend_name", ["journal", "csv", "sqlite"])
+def test_concurrent_adds_and_deletes_lose_nothing(tmp_path, backend_name):
+    ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(backend_name, str(tmp_path), n, results)) for n in range(WORKERS)]
+    for p in procs:
+        p.start()
+    outcomes = [results.get(timeout=300) for _ in procs]
+    for p in procs:
+        p.join(timeout=60)
+        assert p.exitcode == 0
+
+    added = {t for a, _ in outcomes for t in a}
+    deleted = {t for _, d in outcomes for t in d}
+
+    backend = open_backend(backend_name, **{k: v for k, v in zip(
+        ("pieces_csv", "setlists_csv", "sqlite_path"),
+        (_config(backend_name, str(tmp_path))[k] for k in ("PIECES_CSV", "SETLISTS_CSV", "SQLITE_PATH")))})
+    pieces = backend.load_pieces()
+    backend.close()
+
+    ids = [p.piece_id for p in pieces]
+    titles = [p.title for p in pieces]
+    assert len(ids) == len(set(ids)), "duplicate piece ids"
+    assert len(titles) == len(set(titles)), "a piece was written twice"
+    assert set(titles) == added - deleted, "lost or resurrected updates"
+    assert len(added) == WORKERS * OPS
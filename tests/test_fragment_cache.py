@@ -0,0 +1,94 @@
+import pytest
+from web import create_app
+from web.fragment_cache import FragmentCache
+from app.repository import get_piece_repository
+
+def test_hit_and_stale_entry():
+    cache = FragmentCache()
+    calls = []
+    render = lambda: calls.append(1) or "<li>a</li>"
+    assert cache.fetch("row", ("a",), render) == "<li>a</li>"
+    assert cache.fetch("row", ("a",), render) == "<li>a</li>"
+    assert len(calls) == 1
+    cache.fetch("row", ("b",), render)          # data changed: rendered again
+    assert len(calls) == 2
+    assert (cache.hits, cache.misses, cache.stale, len(cache)) == (1, 2, 1, 1)
+
+def test_deps_keep_an_entry_across_versions():
+    cache = FragmentCache()
+    cache.put("table", "v1", "<ul></ul>", deps=[1, 2])
+    assert cache.get("table", "v2", deps=lambda: [1, 2]) == "<ul></ul>"
+    assert cache.get("table", "v2") == "<ul></ul>"      # re-stamped with the new version
+    assert cache.get("table", "v3", deps=lambda: [1, 3]) is None
+
+def test_lru_bounds_and_byte_accounting():
+    probe = FragmentCache()
+    probe.put("probe", 0, "y" * 100)
+    size = probe.bytes
+    cache = FragmentCache(max_bytes=size * 3)
+    for key in "abc":
+        cache.put(key, 0, "y" * 100)
+    cache.get("a", 0)                   # a is now the most recently used
+    cache.put("d", 0, "y" * 100)
+    assert cache.get("b", 0) is None
+    assert cache.get("a", 0) is not None
+    assert (len(cache), cache.bytes, cache.evictions) == (3, size * 3, 1)
+    cache.discard("a")
+    assert cache.bytes == size * 2
+
+    cache = FragmentCache(max_entries=2)
+    for key in "abc":
+        cache.put(key, 0, "z")
+    assert len(cache) == 2
+
+@pytest.fixture
+def app(tmp_path):
+    return create_app({"TESTING": True, "PIECES_CSV": str(tmp_path / "pieces.csv"),
+                       "SETLISTS_CSV": str(tmp_path / "setlists.csv")})
+
+def test_editing_a_piece_rerenders_only_its_row(app):
+    client = app.test_client()
+    client.post("/api/v1/pieces/bulk", json={"create": [{"title": f"Piece {i}"} for i in range(10)]})
+    client.get("/pieces/").get_data()       # pages render as their body is read
+    cache = app.extensions["fragments"]
+    assert cache.misses == 11           # the table + its 10 rows
+
+    client.patch("/api/v1/pieces/3", json={"title": "Renamed"})
+    page = client.get("/pieces/").get_data(as_text=True)
+    assert "Renamed" in page
+    assert cache.misses == 13           # the table + the one changed row
+    assert cache.stale == 2
+
+    client.get("/pieces/?size=5").get_data()        # other query parameters: another table entry
+    client.get("/pieces/").get_data()
+    assert cache.hits == 9 + 5 + 1
+
+def test_unrelated_change_keeps_the_table(app):
+    client = app.test_client()
+    client.post("/api/v1/pieces/bulk", json={"create": [{"title": f"P{i}"} for i in range(8)]})
+    client.get("/pieces/?size=5").get_data()
+    client.patch("/api/v1/pieces/8", json={"title": "Off the page"})
+    misses = app.extensions["fragments"].misses
+    client.get("/pieces/?size=5").get_data()
+    assert app.extensions["fragments"].misses == misses
+
+def test_admin_metrics(app):
+    client = app.test_client()
+    for title in ("Spring Concert", "Anime Club Night", "Jazz Showcase"):
+        client.post("/api/v1/performances", json={"title": title})
+    client.get("/setlists/")
+    client.get("/setlists/")
+    metrics = client.get("/admin/metrics").get_json()
+    assert metrics["fragments"]["hits"] == 1
+    assert metrics["fragments"]["entries"] == 4        # table + 3 rows
+    assert metrics["fragments"]["bytes"] > 0
+    assert metrics["fragments"]["hit_ratio"] == 0.2
+    assert metrics["pieces_repository"] == get_piece_repository(app.extensions["storage"]).stats()
+
+def test_fragments_are_escaped_once(app):
+    client = app.test_client()
+    client.post("/api/v1/pieces", json={"title": "<b>Bold</b> & Co"})
+    for url in ("/pieces/", "/pieces/search?q=bold"):
+        page = client.get(url).get_data(as_text=True)
+        assert "&lt;b&gt;Bold&lt;/b&gt; &amp; Co" in page
+        assert "&lt;li&gt;" not in page
@@ -0,0 +1,121 @@
+import io
+
+import pytest
+
+from app import storage
+from app import piece_logic as tpl
+from app.backends import open_backend
+from app import importer
+from app.importer import import_file, import_pieces, iter_rows, parse_row, shard_ranges
+from app.repository import PieceRepository
+
+CATALOGUE = """title,composer,genre,readiness_status
+Nocturne,Chopin,Classical,Performance ready
+Take Five,Brubeck,Jazz,rehearsing
+,Nobody,Jazz,learning
+Clair de Lune,Debussy,Classical,bogus
+nocturne,CHOPIN,Classical,learning
+Spain,Corea,Jazz,
+Spain,Corea,Jazz,learning
+"""
+
+def _repo(tmp_path, name="csv"):
+    backend = open_backend(name, str(tmp_path / "pieces.csv"), str(tmp_path / "setlists.csv"),
+                           str(tmp_path / "repertoire.db"))
+    return PieceRepository(backend)
+
+@pytest.mark.parametrize("backend_name", ["journal", "csv", "sqlite"])
+def test_import_validates_dedupes_and_persists(tmp_path, backend_name):
+    repo = _repo(tmp_path, backend_name)
+    report = import_pieces(io.StringIO(CATALOGUE), repo, batch_size=2)
+
+    assert (report.rows, report.imported, report.duplicates, report.error_count) == (7, 3, 2, 2)
+    assert [e.line for e in report.errors] == [4, 5]
+    assert "unknown readiness 'bogus'" in report.errors[1].message
+    assert report.batches == 4
+    assert report.rows_per_sec > 0
+
+    stored = {p.title: p for p in repo.backend.load_pieces()}
+    repo.backend.close()
+    assert sorted(stored) == ["Nocturne", "Spain", "Take Five"]
+    assert stored["Nocturne"].readiness_status == "performance-ready"
+    assert stored["Spain"].readiness_status == "learning"
+    assert sorted(p.piece_id for p in stored.values()) == [1, 2, 3]
+
+def test_import_skips_pieces_already_in_library(tmp_path):
+    storage.save_pieces([tpl.Piece(7, "Take Five", "Brubeck", "Jazz", "learning", 0)], str(tmp_path / "pieces.csv"))
+    repo = _repo(tmp_path)
+    report = import_pieces(io.StringIO(CATALOGUE), repo)
+
+    assert report.duplicates == 3
+    assert sorted(p.piece_id for p in repo.get().pieces) == [7, 8, 9]
+
+def test_pieces_added_between_batches_are_duplicates(tmp_path, monkeypatch):
+    repo = _repo(tmp_path)
+    other = PieceRepository(repo.backend)
+    store = importer._store_batch
+
+    def store_then_other_writer(*args):
+        seen = store(*args)
+        with other.writing() as library:
+            if library.get(100) is None:
+                library.add_piece(tpl.Piece(100, "Spain", "Corea", "Jazz", "learning", 0))
+                other.save()
+        return seen
+
+    monkeypatch.setattr(importer, "_store_batch", store_then_other_writer)
+    report = import_pieces(io.StringIO(CATALOGUE), repo, batch_size=2)
+
+    assert (report.imported, report.duplicates) == (2, 3)
+    assert sorted(p.title for p in repo.get().pieces) == ["Nocturne", "Spain", "Take Five"]
+
+def test_batch_size_must_be_positive():
+    with pytest.raises(ValueError, match="at least 1"):
+        importer.batched([1, 2], 0)
+    with pytest.raises(ValueError):
+        import_pieces(io.StringIO(CATALOGUE), None, batch_size=-1)
+
+def test_rows_stream_with_semicolons_and_line_numbers():
+    text = "title;composer;genre\nA;B;C\n\n\"Multi\nline\";D;E\nX;Y;Z;extra\n"
+    rows = list(iter_rows(io.StringIO(text)))
+
+    assert [line for line, _ in rows] == [2, 5, 6]
+    assert rows[1][1]["title"] == "Multi\nline"
+    with pytest.raises(ValueError, match="expected 3 fields"):
+        parse_row(rows[2][1])
+
+def test_parallel_import_matches_serial(tmp_path, monkeypatch):
+    lines = ["title,composer,genre,readiness_status"]
+    for i in range(300):
+        readiness = ["learning", "Rehearsing", "performance ready", "bogus"][i % 4]
+        lines.append(f"Etude {i % 250},  Chopin ,Classical,{readiness}")
+    path = tmp_path / "catalogue.csv"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    serial_dir, parallel_dir = tmp_path / "serial", tmp_path / "parallel"
+    serial_dir.mkdir(); parallel_dir.mkdir()
+    serial = import_file(str(path), _repo(serial_dir), workers=1, batch_size=64)
+    monkeypatch.setattr(importer, "SHARDS_PER_WORKER", 5)
+    parallel = import_file(str(path), _repo(parallel_dir), workers=2, batch_size=64)
+
+    assert serial.as_dict()["error_rows"] == parallel.as_dict()["error_rows"]
+    assert (parallel.rows, parallel.imported, parallel.duplicates, parallel.error_count) == \
+           (serial.rows, serial.imported, serial.duplicates, serial.error_count) == (300, 200, 25, 75)
+    as_rows = lambda d: [(p.piece_id, p.title, p.composer, p.readiness_status)
+                         for p in storage.load_pieces(str(d / "pieces.csv"))]
+    assert as_rows(parallel_dir) == as_rows(serial_dir)
+    assert as_rows(serial_dir)[0] == (1, "Etude 0", "Chopin", "learning")
+
+def test_shards_end_on_line_boundaries(tmp_path):
+    path = tmp_path / "rows.csv"
+    path.write_bytes(b"header\n" + b"".join(b"row %d\n" % i for i in range(100)))
+    ranges = shard_ranges(str(path), 7, start=7)
+
+    assert ranges[0][0] == 7 and ranges[-1][1] == path.stat().st_size
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    data = path.read_bytes()
+    assert all(data[end - 1:end] == b"\n" for _, end in ranges)
+
+def test_titles_are_unicode_and_whitespace_normalized():
+    piece = parse_row({"title": "  Für   Elise ", "composer": "Beethoven"})
+    assert piece.title == "Für Elise"
@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+
+from app import iostats
+from benchmarks import datagen
+from web import create_app
+from web.instrumentation import Sampler, write_profile
+
+
+def _app(tmp_path, **config):
+    pieces_csv, setlists_csv = datagen.write_dataset(str(tmp_path), 300, 20)
+    return create_app(dict({"TESTING": True, "STORAGE_BACKEND": "csv", "PIECES_CSV": pieces_csv,
+                            "SETLISTS_CSV": setlists_csv}, **config))
+
+def _metrics(client) -> dict:
+    values = {}
+    for line in client.get("/metrics").get_data(as_text=True).splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            values[name] = float(value)
+    return values
+
+def test_off_by_default(tmp_path):
+    assert _app(tmp_path).test_client().get("/metrics").status_code == 404
+
+def test_phases_and_storage_counters_per_endpoint(tmp_path):
+    client = _app(tmp_path, INSTRUMENTATION=True).test_client()
+    size = os.path.getsize(tmp_path / "piece_library.csv")
+    with client.get("/pieces/") as response:          # timed until the response is closed
+        assert response.status_code == 200
+    with client.get("/pieces/"):
+        pass
+    with client.post("/api/v1/pieces", json={"title": "Ondine"}):
+        pass
+
+    response = client.get("/metrics")
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    m = _metrics(client)
+    home = 'endpoint="pieces.pieces_home"'
+    assert m[f"repertoire_request_seconds_count{{{home}}}"] == 2
+    assert m[f'repertoire_request_seconds_bucket{{{home},le="+Inf"}}'] == 2
+    # the first request parsed the file, the second was served from memory
+    assert m[f"repertoire_storage_rows_parsed_total{{{home}}}"] == 300
+    assert m[f"repertoire_storage_bytes_read_total{{{home}}}"] == size
+    assert m[f'repertoire_request_phase_seconds_total{{{home},phase="storage"}}'] > 0
+    assert m[f'repertoire_request_phase_seconds_total{{{home},phase="render"}}'] > 0
+    create = 'endpoint="api.create_piece"'
+    assert m[f"repertoire_storage_saves_total{{{create}}}"] == 1
+    assert m[f"repertoire_storage_bytes_written_total{{{create}}}"] > 0
+    assert "repertoire_fragment_cache_misses_total" in m
+
+def test_counters_only_inside_a_record():
+    iostats.read(10, 1)                 # nobody is counting: ignored
+    stats = iostats.start()
+    iostats.read(100, 2)
+    with iostats.timed(save=True):
+        with iostats.timed():
+            iostats.wrote(7)
+    assert iostats.stop() is stats
+    assert (stats.rows, stats.bytes_read, stats.bytes_written, stats.saves) == (2, 100, 7, 1)
+    assert iostats.current() is None
+
+def test_sampler_collects_folded_stacks(tmp_path):
+    stop = threading.Event()
+
+    def busy_loop():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_loop)
+    worker.start()
+    sampler = Sampler(interval=0.001)
+    sampler.watch(worker.ident)
+    time.sleep(0.05)
+    samples = sampler.unwatch(worker.ident)
+    stop.set()
+    worker.join()
+    assert samples and all("test_instrumentation.py:busy_loop" in stack for stack in samples)
+
+    path = write_profile(str(tmp_path), "pieces.pieces_home", 0.25, samples)
+    assert path.endswith("-pieces_pieces_home-250ms.folded")
+    stack, count = open(path).readline().rsplit(" ", 1)
+    assert ";" in stack and int(count) >= 1
@@ -0,0 +1,209 @@
+import os
+
+from app import storage
+from app import piece_logic as tpl
+from app import setlist_logic as sl
+from app.backends import write_through
+from app.journal import JournalBackend, read_records
+from app.repository import PieceRepository, SetlistRepository
+
+
+def _backend(tmp_path, **kw):
+    return JournalBackend(str(tmp_path / "pieces.csv"), str(tmp_path / "setlists.csv"), **kw)
+
+def _open_state(backend):
+    lib = tpl.PieceLibrary()
+    lib.pieces = backend.load_pieces()
+    loaded, items = backend.load_setlists()
+    performances = sl.Performances(loaded)
+    write_through(backend, lib, performances, items)
+    return lib, performances, items
+
+def test_changes_are_appended_not_rewritten(tmp_path):
+    backend = _backend(tmp_path)
+    lib, performances, items = _open_state(backend)
+    snapshot = os.stat(backend.pieces_path)
+
+    lib.add_piece(tpl.Piece(1, "Nocturne", "Chopin", "Classical", "learning", 0))
+    lib.add_piece(tpl.Piece(2, "Take Five", "Brubeck", "Jazz", "learning", 0))
+    lib.edit_piece(1, "Nocturne", "Chopin", "Classical", "performance-ready")
+    lib.delete_piece(2)
+    backend.close()
+
+    # the snapshot was not touched; the journal has one line per change
+    assert os.stat(backend.pieces_path).st_mtime_ns == snapshot.st_mtime_ns
+    assert [r["op"] for r in read_records(backend.journal_path)] == ["add_piece", "add_piece", "edit_piece", "delete_piece"]
+
+    reloaded = _backend(tmp_path).load_pieces()
+    assert [(p.piece_id, p.readiness_status) for p in reloaded] == [(1, "performance-ready")]
+
+def test_duration_edits_replay(tmp_path):
+    backend = _backend(tmp_path)
+    lib, _, _ = _open_state(backend)
+    lib.add_piece(tpl.Piece(1, "Ondine", "Ravel", "Classical", "learning", 0, 390))
+    lib.edit_piece(1, "Ondine", "Ravel", "Classical", "learning", 400)
+    lib.edit_piece(1, "Ondine", "Ravel", "Classical", "rehearsing")     # duration kept
+    backend.close()
+    assert _backend(tmp_path).load_pieces()[0].duration == 400
+
+def test_setlist_changes_replay_in_order(tmp_path):
+    backend = _backend(tmp_path)
+    lib, performances, items = _open_state(backend)
+
+    performances[1] = sl.Performance(1, "Recital", "2026-05-01", "Hall", 0)
+    for piece_id in (101, 202, 303, 404):
+        sl.add_piece_to_setlist(items, 1, piece_id)
+    sl.remove_piece_from_setlist(items, 1, order_index=2)
+    sl.move_up(items, 1, order_index=3)
+    performances[2] = sl.Performance(2, "Gone", "2026-06-01", "Club", 0)
+    del performances[2]
+    backend.close()
+
+    perfs, reloaded = _backend(tmp_path).load_setlists()
+    assert list(perfs) == [1]
+    assert [(it.order_index, it.piece_id) for it in reloaded.items_for(1)] == [(1, 101), (2, 404), (3, 303)]
+
+def test_move_is_one_record_and_survives_compaction(tmp_path):
+    backend = _backend(tmp_path)
+    _, performances, items = _open_state(backend)
+    performances[1] = sl.Performance(1, "Recital", "2026-05-01", "Hall", 0)
+    for piece_id in (101, 202, 303, 404):
+        sl.add_piece_to_setlist(items, 1, piece_id)
+    backend.compact()       # the items are now in the snapshot, ranks spread out afresh on load
+    sl.move_item(items, 1, order_index=4, to_index=2)
+    sl.move_item(items, 1, order_index=1, to_index=4)
+    backend.close()
+
+    assert [r["op"] for r in read_records(backend.journal_path)] == ["move_item", "move_item"]
+    _, reloaded = _backend(tmp_path).load_setlists()
+    assert [it.piece_id for it in reloaded.items_for(1)] == [404, 202, 303, 101]
+
+def test_torn_last_line_is_ignored(tmp_path):
+    backend = _backend(tmp_path)
+    backend.insert_piece(tpl.Piece(1, "Ondine", "Ravel", "Classical", "learning", 0))
+    backend.close()
+    with open(backend.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"op":"delete_piece","piece_')    # crash mid-write
+
+    assert [p.title for p in _backend(tmp_path).load_pieces()] == ["Ondine"]
+
+def test_compaction_folds_journal_into_snapshot(tmp_path):
+    backend = _backend(tmp_path, compact_at=2_000)
+    for i in range(1, 41):
+        backend.insert_piece(tpl.Piece(i, f"Etude {i}", "Chopin", "Classical", "learning", 0))
+    backend.wait_for_compaction()
+    backend.close()
+
+    assert backend.compactions >= 1
+    assert len(storage.load_pieces(backend.pieces_path)) > 0            # snapshot caught up
+    assert len(list(read_records(backend.journal_path))) < 40            # journal started over
+    assert [p.piece_id for p in _backend(tmp_path).load_pieces()] == list(range(1, 41))
+
+def test_crash_during_compaction_is_safe(tmp_path):
+    backend = _backend(tmp_path)
+    lib, performances, items = _open_state(backend)
+    performances[1] = sl.Performance(1, "Recital", "2026-05-01", "Hall", 0)
+    sl.add_piece_to_setlist(items, 1, 101)
+    sl.add_piece_to_setlist(items, 1, 202)
+    backend.close()
+
+    # simulate: journal rotated and snapshot written, but the old journal never deleted
+    backend.journal.rotate(backend.compacting_path)
+    backend._write_snapshot(setlists=backend.load_setlists())
+
+    perfs, reloaded = _backend(tmp_path).load_setlists()
+    assert [it.piece_id for it in reloaded.items_for(1)] == [101, 202]   # not doubled
+
+def test_full_save_keeps_other_kind_of_records(tmp_path):
+    backend = _backend(tmp_path)
+    backend.insert_piece(tpl.Piece(1, "Ondine", "Ravel", "Classical", "learning", 0))
+    backend.insert_performance(sl.Performance(1, "Recital", "2026-05-01", "Hall", 0))
+
+    backend.save_pieces(backend.load_pieces())
+    backend.close()
+
+    assert [r["op"] for r in read_records(backend.journal_path)] == ["put_performance"]
+    fresh = _backend(tmp_path)
+    assert [p.title for p in fresh.load_pieces()] == ["Ondine"]
+    assert list(fresh.load_setlists()[0]) == [1]
+
+def test_each_stamp_only_follows_its_own_records(tmp_path):
+    backend = _backend(tmp_path)
+    backend.load_pieces(), backend.load_setlists()
+    backend.insert_piece(tpl.Piece(1, "Ondine", "Ravel", "Classical", "learning", 0))
+    pieces, setlists = backend.pieces_stamp(), backend.setlists_stamp()
+    repo = PieceRepository(backend)
+    repo.get()
+
+    backend.insert_performance(sl.Performance(1, "Recital", "2026-05-01", "Hall", 0))
+    backend.insert_setlist_item(sl.Setlist_Item(1, 1, 1, 1))
+    assert backend.pieces_stamp() == pieces         # cached libraries don't reload for a setlist change
+    repo.get()
+    assert repo.misses == 1
+    assert backend.setlists_stamp() != setlists
+
+    setlists = backend.setlists_stamp()
+    backend.update_piece(tpl.Piece(1, "Ondine", "Ravel", "Classical", "performance-ready", 0))
+    assert backend.setlists_stamp() == setlists
+    assert backend.pieces_stamp() != pieces
+    assert _backend(tmp_path).pieces_stamp() == backend.pieces_stamp()     # same in every process
+    backend.close()
+
+def test_own_compaction_keeps_the_stamp(tmp_path):
+    backend = _backend(tmp_path)
+    backend.load_pieces(), backend.load_setlists()     # creates the snapshot files, like a first read does
+    backend.insert_pieces([tpl.Piece(i, f"Etude {i}", "Chopin", "Classical", "learning", 0) for i in range(1, 21)])
+    stamp = backend.pieces_stamp()
+
+    backend.compact()
+
+    assert backend.compactions == 1
+    assert backend.pieces_stamp() == stamp        # same data, so caches need not reload
+    backend.insert_piece(tpl.Piece(21, "Etude 21", "Chopin", "Classical", "learning", 0))
+    assert backend.pieces_stamp() != stamp
+
+def test_item_ids_survive_reload_and_compaction(tmp_path):
+    backend = _backend(tmp_path)
+    repo = SetlistRepository(backend)
+    with repo.writing() as (performances, items):
+        for pid in (1, 2):
+            performances[pid] = sl.Performance(pid, f"Setlist {pid}", "", "", 0)
+            repo.insert_performance(performances[pid])
+        for pid, piece_ids in ((1, (1, 2, 3)), (2, (1,))):
+            for piece_id in piece_ids:
+                repo.insert_item(sl.add_piece_to_setlist(items, pid, piece_id))
+        first = items.items_for(1)[0]
+        sl.remove_piece_from_setlist(items, 1, 1)
+        repo.delete_item(first)
+
+    def ids(store):
+        return [[(it.setlist_item_id, it.piece_id) for it in store.items_for(pid)] for pid in (1, 2)]
+
+    expected = [[(2, 2), (3, 3)], [(4, 1)]]
+    assert ids(items) == expected
+    assert ids(_backend(tmp_path).load_setlists()[1]) == expected      # journal replay
+    backend.compact()
+    assert ids(_backend(tmp_path).load_setlists()[1]) == expected      # CSV snapshot
+    backend.close()
+
+def test_compaction_redoes_a_merge_that_went_stale(tmp_path):
+    a, b = _backend(tmp_path), _backend(tmp_path)      # two processes on the same files
+    a.load_pieces(), a.load_setlists()
+    a.insert_piece(tpl.Piece(1, "Ondine", "Ravel", "Classical", "learning", 0))
+    merge, raced = a._merge_compacting, []
+
+    def racing():
+        merged = merge()
+        if not raced:
+            raced.append(1)
+            # meanwhile the other process finishes this compaction and rotates a new journal
+            b.compact()
+            b.insert_piece(tpl.Piece(2, "Etude", "Chopin", "Classical", "learning", 0))
+            b.journal.rotate(b.compacting_path)
+        return merged
+
+    a._merge_compacting = racing
+    a.compact()
+
+    assert [p.piece_id for p in _backend(tmp_path).load_pieces()] == [1, 2]
+    a.close(), b.close()
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+from app import piece_logic as tpl
+from app import setlist_logic as sl
+from app.storage import load_pieces, load_setlists, save_pieces, save_setlists
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "main.py")
+
+
+def _run(cwd, keys, *args):
+    return subprocess.run([sys.executable, MAIN, "--backend", "csv", *args], cwd=cwd, input="\n".join(keys) + "\n",
+                          capture_output=True, text=True, timeout=60)
+
+def _seed(tmp_path):
+    os.makedirs(tmp_path / "data")
+    pieces_csv, setlists_csv = str(tmp_path / "data" / "piece_library.csv"), str(tmp_path / "data" / "setlist_library.csv")
+    save_pieces([tpl.Piece(1, "Ondine", "Ravel", "Classical", "learning", 0)], pieces_csv)
+    save_setlists({1: sl.Performance(1, "Recital", "", "", 0)}, [sl.Setlist_Item(1, 1, 1, 1)], setlists_csv)
+    return pieces_csv, setlists_csv
+
+def test_quit_loads_nothing(tmp_path):
+    _seed(tmp_path)
+    result = _run(tmp_path, ["4"], "--profile-startup")
+    assert result.returncode == 0, result.stderr
+    assert "[startup] imports:" in result.stderr
+    assert "load pieces" not in result.stderr and "open backend" not in result.stderr
+
+def test_only_the_menu_used_is_loaded_and_saved(tmp_path):
+    pieces_csv, setlists_csv = _seed(tmp_path)
+    # list setlists, then quit: the pieces are never read
+    result = _run(tmp_path, ["2", "1", "8", "4"], "--profile-startup")
+    assert "Recital" in result.stdout
+    assert "load setlists" in result.stderr and "load pieces" not in result.stderr
+
+    # adding a piece saves the pieces and leaves the setlists file as it was
+    before = open(setlists_csv).read()
+    _run(tmp_path, ["1", "2", "Take Five", "Brubeck", "Jazz", "learning", "", "8", "4"])
+    assert [p.title for p in load_pieces(pieces_csv)] == ["Ondine", "Take Five"]
+    assert open(setlists_csv).read() == before
+    _, items = load_setlists(setlists_csv)
+    assert [it.piece_id for it in items.items_for(1)] == [1]
+
+def test_batch_applies_ops_with_one_write(tmp_path):
+    pieces_csv, _ = _seed(tmp_path)
+    ops = tmp_path / "ops.txt"
+    ops.write_text('add_piece title="Take Five" composer=Brubeck\n'
+                   '{"op": "edit_piece", "piece_id": 1, "readiness_status": "rehearsing"}\n'
+                   'add_piece_to_setlist performance_id=1 piece_id=2\n'
+                   'delete_piece piece_id=9\n')
+    result = subprocess.run([sys.executable, MAIN, "--backend", "journal", "--batch", str(ops)], cwd=tmp_path,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 1                       # one op failed
+    assert "line 4: delete_piece failed: Piece 9 not found." in result.stdout
+    assert "4 ops: 3 ok, 1 errors" in result.stdout
+    # the piece changes went into the journal as one append, the setlists into the snapshot
+    journal = (tmp_path / "data" / "changes.journal").read_text().splitlines()
+    assert len(journal) == 2
+    _, items = load_setlists(str(tmp_path / "data" / "setlist_library.csv"))
+    assert [it.piece_id for it in items.items_for(1)] == [1, 2]
@@ -0,0 +1,61 @@
+import pytest
+
+from app import piece_logic as tpl
+from app.paging import decode_cursor, encode_cursor, paginate
+
+COMPOSERS = ["Chopin", "Bach", "Ravel", "Satie"]
+READINESS = ["learning", "rehearsing", "performance-ready"]
+
+@pytest.fixture
+def library():
+    lib = tpl.PieceLibrary()
+    lib.pieces = [tpl.Piece(i, f"Piece {i:03d}", COMPOSERS[i % 4], "Classical" if i % 20 else "Jazz",
+                            READINESS[i % 3], 0) for i in range(1, 201)]
+    return lib
+
+def _walk(library, **kw):
+    seen, page = [], paginate(library, size=7, **kw)
+    while True:
+        seen.extend(p.piece_id for p in page.items)
+        if not page.next_cursor:
+            return seen
+        page = paginate(library, size=7, after=page.next_cursor, **kw)
+
+@pytest.mark.parametrize("sort", ["id", "title", "composer", "readiness"])
+def test_pages_cover_every_piece_once_in_order(library, sort):
+    expected = [p.piece_id for p in sorted(library.pieces, key=tpl.SORTS[sort])]
+    assert _walk(library, sort=sort) == expected
+
+@pytest.mark.parametrize("filters", [{"readiness": "Rehearsing"},              # large bucket: walked
+                                     {"genre": "jazz"},                         # small bucket: sorted
+                                     {"genre": "jazz", "composer": "ravel"}])
+def test_filters_match_a_scan(library, filters):
+    def ok(p):
+        return all(tpl._norm(getattr(p, "readiness_status" if a == "readiness" else a)) == v.lower()
+                   for a, v in filters.items())
+    expected = [p.piece_id for p in sorted(library.pieces, key=tpl.SORTS["composer"]) if ok(p)]
+    assert _walk(library, sort="composer", filters=filters) == expected
+
+def test_previous_page_and_edits(library):
+    first = paginate(library, sort="title", size=5)
+    second = paginate(library, sort="title", size=5, after=first.next_cursor)
+    assert first.prev_cursor is None
+    back = paginate(library, sort="title", size=5, before=second.prev_cursor)
+    assert [p.piece_id for p in back.items] == [p.piece_id for p in first.items]
+    assert back.prev_cursor is None
+
+    # the sorted keys follow edits/deletes without a rebuild
+    library.edit_piece(1, "AAA first", "Chopin", "Classical", "learning")
+    library.delete_piece(2)
+    assert [p.piece_id for p in paginate(library, sort="title", size=3).items] == [1, 3, 4]
+
+def test_bad_input_is_rejected(library):
+    with pytest.raises(ValueError):
+        paginate(library, sort="color")
+    with pytest.raises(ValueError):
+        paginate(library, filters={"user": "1"})
+    with pytest.raises(ValueError):
+        paginate(library, after="not-a-cursor!")
+    with pytest.raises(ValueError):
+        paginate(library, sort="id", after=encode_cursor(("piece", 3)))
+    assert decode_cursor(encode_cursor(("Für Elise", 9))) == ("Für Elise", 9)
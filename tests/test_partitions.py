@@ -0,0 +1,111 @@
+import os
+import pytest
+
+from app import piece_logic as tpl
+from app import setlist_logic as sl
+from app.backends import CsvBackend, open_backend
+from app.partitions import PIECE_BYTES, Partitions, split_by_user
+from web import create_app
+
+
+@pytest.fixture(params=["journal", "sqlite"])
+def backend(request, tmp_path):
+    b = open_backend(request.param, pieces_csv=str(tmp_path / "pieces.csv"),
+                     setlists_csv=str(tmp_path / "setlists.csv"), sqlite_path=str(tmp_path / "repertoire.db"))
+    yield b
+    b.close()
+
+def _add(repo, title, user_id):
+    with repo.writing() as library:
+        piece = tpl.Piece(library.next_id(), title, "", "", "learning", user_id)
+        library.add_piece(piece)
+        repo.insert(piece)
+    return piece
+
+def test_each_user_has_own_files_and_id_sequence(backend, tmp_path):
+    partitions = Partitions(backend)
+    a = _add(partitions.get(1).pieces, "Ondine", 1)
+    b = _add(partitions.get(2).pieces, "Take Five", 2)
+    assert a.piece_id == b.piece_id == 1
+    assert [p.title for p in partitions.get(1).pieces.get().pieces] == ["Ondine"]
+    assert os.path.isdir(tmp_path / "users" / "1") and os.path.isdir(tmp_path / "users" / "2")
+    # nothing was written to the shared dataset
+    assert backend.load_pieces() == []
+    partitions.close()
+
+def test_lru_drops_least_recently_used_over_the_memory_cap(tmp_path):
+    backend = CsvBackend(str(tmp_path / "pieces.csv"), str(tmp_path / "setlists.csv"))
+    partitions = Partitions(backend, max_bytes=PIECE_BYTES * 4)
+    for user_id in (1, 2):
+        repo = partitions.get(user_id).pieces
+        for i in range(2):
+            _add(repo, f"P{i}", user_id)
+    partitions.get(1)                   # 1 is now the most recently used
+    _add(partitions.get(3).pieces, "P", 3)
+    assert partitions.stats()["open"] == 3
+    partitions.get(3)                   # 5 pieces loaded > 4: user 2 goes
+    assert sorted(partitions._open) == [1, 3]
+    assert partitions.evictions == 1
+    # an evicted user is simply reloaded from storage
+    assert len(partitions.get(2).pieces.get()) == 2
+
+    partitions = Partitions(backend, max_partitions=2)
+    for user_id in (1, 2, 3):
+        partitions.get(user_id)
+    assert sorted(partitions._open) == [2, 3]
+
+def test_shared_mode_uses_one_dataset(backend):
+    partitions = Partitions(backend, per_user=False)
+    assert partitions.get(1) is partitions.get(2)
+    assert partitions.get(1).backend is backend
+
+def test_split_by_user(backend):
+    backend.save_pieces([tpl.Piece(1, "Ondine", "Ravel", "", "learning", 1),
+                         tpl.Piece(2, "Take Five", "Brubeck", "", "learning", 2),
+                         tpl.Piece(3, "Nocturne", "Chopin", "", "learning", 1)])
+    backend.save_setlists({5: sl.Performance(5, "Recital", "", "", 1)},
+                          [sl.Setlist_Item(1, 5, 3, 1), sl.Setlist_Item(2, 5, 1, 2)])
+    assert split_by_user(backend) == {1: 2, 2: 1}
+
+    partitions = Partitions(backend)
+    one = partitions.get(1)
+    assert [p.piece_id for p in one.pieces.get().pieces] == [1, 3]
+    assert one.pieces.get().next_id() == 4
+    performances, items = one.setlists.get()
+    assert list(performances) == [5]
+    assert [it.piece_id for it in items.items_for(5)] == [3, 1]
+    assert partitions.get(2).setlists.get()[0] == {}
+    partitions.close()
+
+@pytest.fixture
+def client(tmp_path):
+    app = create_app({"TESTING": True, "PARTITION_BY_USER": True, "PIECES_CSV": str(tmp_path / "pieces.csv"),
+                      "SETLISTS_CSV": str(tmp_path / "setlists.csv")})
+    return app.test_client()
+
+def test_web_requests_see_only_their_users_data(client):
+    as_1, as_2 = {"X-User-Id": "1"}, {"X-User-Id": "2"}
+    assert client.post("/api/v1/pieces", json={"title": "Ondine"}, headers=as_1).get_json()["piece_id"] == 1
+    created = client.post("/api/v1/pieces", json={"title": "Take Five"}, headers=as_2).get_json()
+    assert (created["piece_id"], created["user_id"]) == (1, 2)
+
+    page = client.get("/pieces/", headers=as_2)
+    assert b"Take Five" in page.data and b"Ondine" not in page.data
+    assert "X-User-Id" in page.headers["Vary"]
+    assert client.get("/pieces/", headers=as_1).headers["ETag"] != page.headers["ETag"]
+
+    # a record can't be written into another user's partition
+    response = client.post("/api/v1/pieces", json={"title": "Spy", "user_id": 1}, headers=as_2)
+    assert response.status_code == 400
+
+    # the session picks the user when no header is sent
+    client.post("/user", data={"user_id": 2})
+    assert b"Take Five" in client.get("/pieces/").data
+    assert client.get("/admin/metrics").get_json()["partitions"]["open"] == 2
+
+def test_bad_user_header(client):
+    assert client.get("/pieces/", headers={"X-User-Id": "me"}).status_code == 400
+
+def test_negative_user_is_not_stored_in_the_session(client):
+    assert client.post("/user", data={"user_id": -1}).status_code == 400
+    assert client.get("/pieces/").status_code == 200
@@ -95,4 +95,43 @@ def test_delete_piece_and_return_if_not_found():
     # Trying to delete a non-existent piece
     result_nonexistent = library.delete_piece(piece_id=3)
     assert result_nonexistent is False
-    assert len(library.pieces) == 1 # library unchanged
\ No newline at end of file
+    assert len(library.pieces) == 1 # library unchanged
+
+
+def test_indexes_follow_add_edit_delete():
+    library = pl.PieceLibrary()
+    library.add_piece(pl.Piece(1, "Ondine", "Ravel", "Classical", "learning", 0))
+    library.add_piece(pl.Piece(7, "Take Five", "Dave Brubeck", "Jazz", "rehearsing", 0))
+
+    # O(1) id lookup and running max id
+    assert library.get(7).title == "Take Five"
+    assert library.get(3) is None
+    assert library.next_id() == 8
+
+    # readiness bucket moves with the edit
+    library.edit_piece(1, "Ondine", "Ravel", "Classical", "Performance-Ready")
+    assert library.with_readiness("learning") == []
+    assert [p.piece_id for p in library.with_readiness("performance-ready")] == [1]
+
+    # composer/genre lookups are case-insensitive substring matches
+    assert [p.piece_id for p in library.matching("composer", "brubeck")] == [7]
+    assert [p.piece_id for p in library.matching("genre", "CLASS")] == [1]
+
+    # delete clears every index, and ids are not reused
+    assert library.delete_piece(7) is True
+    assert library.matching("genre", "jazz") == []
+    assert library.with_readiness("rehearsing") == []
+    assert library.next_id() == 8
+
+
+
+def test_assigning_pieces_rebuilds_indexes():
+    library = pl.PieceLibrary()
+    library.pieces = [
+        pl.Piece(2, "Fur Elise", "Beethoven", "Classical", "performance-ready", 0),
+        pl.Piece(5, "Clair de Lune", "Debussy", "Classical", "learning", 0),
+    ]
+
+    assert len(library) == 2
+    assert library.next_id() == 6
+    assert [p.title for p in library.matching("genre", "classical")] == ["Fur Elise", "Clair de Lune"]
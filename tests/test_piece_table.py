@@ -0,0 +1,53 @@
+import pytest
+
+from app import piece_table
+from app import piece_logic as tpl
+from app.piece_table import PieceTable
+
+
+@pytest.fixture(params=["numpy", "array"])
+def table(request, monkeypatch):
+    if request.param == "array":
+        monkeypatch.setattr(piece_table, "np", None)
+    elif piece_table.np is None:
+        pytest.skip("NumPy not installed")
+    readiness = ["learning", "rehearsing", "performance-ready", "Shelved"]
+    return PieceTable(tpl.Piece(i, f"Etude {i}", "Chopin", "Classical", readiness[i % 4], i % 3)
+                      for i in range(1, 41))
+
+def test_rows_come_back_as_pieces(table):
+    p = table.get(7)
+    assert (p.piece_id, p.title, p.composer, p.readiness_status, p.user_id) == (7, "Etude 7", "Chopin", "Shelved", 1)
+    assert table.get(99) is None
+    assert [q.piece_id for q in table][:3] == [1, 2, 3]
+
+def test_mask_filters_match_a_scan(table):
+    pieces = list(table)
+    for readiness, user in (("rehearsing", None), (None, 2), ("performance-ready", 0), ("shelved", None)):
+        expected = [p.piece_id for p in pieces
+                    if (readiness is None or tpl._norm(p.readiness_status) == readiness)
+                    and (user is None or p.user_id == user)]
+        assert [p.piece_id for p in table.filter(readiness, user)] == expected
+        assert table.count(readiness, user) == len(expected)
+
+def test_update_and_delete(table):
+    p = table.get(1)
+    p.readiness_status = "performance-ready"
+    assert table.update(p)
+    assert 1 in [q.piece_id for q in table.filter("performance-ready")]
+
+    for pid in range(1, 31):
+        assert table.delete(pid)
+    assert not table.delete(1)
+    assert len(table) == 10
+    assert len(table.ids) < 40                      # tombstones were swept
+    assert [p.piece_id for p in table.filter(user_id=1)] == [31, 34, 37, 40]
+
+def test_strings_are_interned():
+    a = PieceTable([tpl.Piece(1, "A", "".join(["Cho", "pin"]), "Classical", "learning", 0),
+                    tpl.Piece(2, "B", "".join(["Ch", "opin"]), "Classical", "learning", 0)])
+    assert a.composers[0] is a.composers[1]
+
+def test_pieces_are_slotted():
+    with pytest.raises(AttributeError):
+        tpl.Piece(1, "A", "B", "C", "learning", 0).extra = 1
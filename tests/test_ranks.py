@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from app import ranks
+
+
+def test_between_sorts_between_its_bounds():
+    assert "" < ranks.between()
+    assert "A" < ranks.between("A", "B") < "B"
+    assert "A" < ranks.between("A", "A1") < "A1"        # neighbouring keys still have room
+    assert "z" < ranks.between("z")
+    with pytest.raises(ValueError):
+        ranks.between("B", "A")
+
+def test_random_inserts_keep_order_and_stay_short():
+    rnd = random.Random(7)
+    keys = ranks.spread(20)
+    for _ in range(5000):
+        i = rnd.randint(0, len(keys))
+        key = ranks.between(keys[i - 1] if i else "", keys[i] if i < len(keys) else None)
+        assert not key.endswith("0")
+        keys.insert(i, key)
+    assert keys == sorted(keys) and len(set(keys)) == len(keys)
+    assert max(map(len, keys)) <= 6
+
+def test_after_and_spread():
+    key, keys = "", []
+    for _ in range(200):
+        key = ranks.after(key)
+        keys.append(key)
+    assert keys == sorted(keys) and len(keys[-1]) <= 7
+
+    for n in (0, 1, 61, 62, 5000):
+        spread = ranks.spread(n)
+        assert spread == sorted(spread) and len(set(spread)) == n
+        assert all(k and not k.endswith("0") for k in spread)
+    assert max(map(len, ranks.spread(1000))) == 2
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from app import storage
+from app import piece_logic as tpl
+from app.backends import CsvBackend
+from app.journal import JournalBackend
+from app.locking import StaleWriteError
+from app.repository import PieceRepository, get_piece_repository
+
+
+def _bump_mtime(path):
+    # make sure an outside write is visible even on coarse mtime filesystems
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+def test_reads_are_served_from_memory(tmp_path):
+    path = str(tmp_path / "pieces.csv")
+    storage.save_pieces([tpl.Piece(1, "Nocturne", "Chopin", "Classical", "learning", 0)], path)
+    repo = PieceRepository(CsvBackend(path))
+
+    first = repo.get()
+    second = repo.get()
+
+    assert first is second
+    assert [p.title for p in second.pieces] == ["Nocturne"]
+    assert repo.misses == 1
+    assert repo.hits == 1
+
+def test_outside_write_invalidates_cache(tmp_path):
+    path = str(tmp_path / "pieces.csv")
+    storage.save_pieces([tpl.Piece(1, "Nocturne", "Chopin", "Classical", "learning", 0)], path)
+    repo = PieceRepository(CsvBackend(path))
+    repo.get()
+    gen = repo.generation
+
+    # another process rewrites the file
+    storage.save_pieces([tpl.Piece(1, "Nocturne", "Chopin", "Classical", "learning", 0),
+                         tpl.Piece(2, "Take Five", "Brubeck", "Jazz", "rehearsing", 0)], path)
+    _bump_mtime(path)
+
+    lib = repo.get()
+    assert [p.piece_id for p in lib.pieces] == [1, 2]
+    assert repo.misses == 2
+    assert repo.generation > gen
+
+def test_own_save_does_not_force_reload(tmp_path):
+    path = str(tmp_path / "pieces.csv")
+    repo = PieceRepository(CsvBackend(path))
+    with repo.lock:
+        repo.get().add_piece(tpl.Piece(1, "Ondine", "Ravel", "Classical", "learning", 0))
+        repo.save()
+
+    repo.get()
+    assert repo.misses == 1
+    assert repo.hits == 1
+    assert [p.title for p in storage.load_pieces(path)] == ["Ondine"]
+
+def test_registry_shares_one_repository_per_file(tmp_path):
+    path = str(tmp_path / "pieces.csv")
+    assert get_piece_repository(path) is get_piece_repository(os.path.join(str(tmp_path), ".", "pieces.csv"))
+
+def test_stale_version_rejects_write(tmp_path):
+    path = str(tmp_path / "pieces.csv")
+    storage.save_pieces([tpl.Piece(1, "Nocturne", "Chopin", "Classical", "learning", 0)], path)
+    repo = PieceRepository(CsvBackend(path))
+    repo.get()
+    seen = repo.version
+
+    # another process writes in between
+    storage.save_pieces([tpl.Piece(1, "Nocturne", "Chopin", "Classical", "performance-ready", 0)], path)
+    _bump_mtime(path)
+
+    with pytest.raises(StaleWriteError):
+        with repo.writing(expected_version=seen):
+            pass
+    with repo.writing(expected_version=repo.version) as lib:
+        assert lib.get(1).readiness_status == "performance-ready"
+
+def test_row_writes_do_not_copy_the_library(tmp_path, monkeypatch):
+    backend = JournalBackend(str(tmp_path / "pieces.csv"), str(tmp_path / "setlists.csv"))
+    repo = PieceRepository(backend)
+    copies = []
+    pieces = tpl.PieceLibrary.pieces
+    monkeypatch.setattr(tpl.PieceLibrary, "pieces",
+                        property(lambda lib: copies.append(1) or pieces.fget(lib), pieces.fset))
+
+    with repo.writing() as library:
+        library.add_piece(tpl.Piece(library.next_id(), "Nocturne", "Chopin", "Classical", "learning", 0))
+        repo.insert(library.get(1))
+        library.edit_piece(1, "Nocturne", "Chopin", "Classical", "performance-ready")
+        repo.update(library.get(1))
+        repo.apply([("delete", 1)])
+
+    assert copies == []             # the journal appends rows; only CSV rewrites read .pieces
+    backend.close()
@@ -0,0 +1,49 @@
+from app import piece_logic as pl
+from app.search import SearchIndex, tokenize
+
+
+def _library():
+    library = pl.PieceLibrary()
+    library.add_piece(pl.Piece(1, "Für Elise", "Beethoven", "Classical", "learning", 0))
+    library.add_piece(pl.Piece(2, "Moonlight Sonata", "Beethoven", "Classical", "rehearsing", 0))
+    library.add_piece(pl.Piece(3, "Take Five", "Dave Brubeck", "Jazz", "performance-ready", 0))
+    library.add_piece(pl.Piece(4, "Sonatine", "Ravel", "Classical", "learning", 0))
+    return library
+
+def test_tokenize_folds_case_and_accents():
+    assert tokenize("Für  ELISE, Op.59") == ["fur", "elise", "op", "59"]
+
+def test_multi_term_and_across_fields():
+    library = _library()
+    assert [p.piece_id for p in library.search("beethoven sonata")] == [2]
+    assert library.search("beethoven jazz") == []
+
+def test_prefix_matching_and_ranking():
+    library = _library()
+    # "sonat" is a prefix of both "sonata" and "sonatine"
+    assert {p.piece_id for p in library.search("sonat")} == {2, 4}
+    # a whole-word title hit ranks above a prefix hit
+    assert [p.piece_id for p in library.search("sonata")][0] == 2
+    # title hits outrank genre hits
+    library.add_piece(pl.Piece(5, "Jazz Suite", "Shostakovich", "Orchestral", "learning", 0))
+    assert [p.piece_id for p in library.search("jazz")] == [5, 3]
+
+def test_index_is_updated_incrementally():
+    library = _library()
+    assert [p.piece_id for p in library.search("elise")] == [1]   # builds the index
+
+    library.edit_piece(1, "Bagatelle", "Beethoven", "Classical", "learning")
+    library.add_piece(pl.Piece(6, "Elise Variations", "Anon", "Classical", "learning", 0))
+    library.delete_piece(3)
+
+    assert [p.piece_id for p in library.search("elise")] == [6]
+    assert [p.piece_id for p in library.search("bagatelle")] == [1]
+    assert library.search("brubeck") == []
+
+def test_removed_tokens_leave_the_vocabulary():
+    index = SearchIndex()
+    index.add(pl.Piece(1, "Ondine", "Ravel", "Classical", "learning", 0))
+    index.remove(1)
+    assert len(index) == 0
+    assert index.search("ondine") == []
+    assert index._vocab == []
@@ -0,0 +1,101 @@
+import json
+
+from app import piece_logic as tpl
+from app import sequences
+from app import setlist_logic as sl
+from app import storage
+from app.backends import CsvBackend
+from app.repository import PieceRepository, SetlistRepository
+from app.sqlite_storage import SqliteBackend
+
+
+class CountingBackend(CsvBackend):
+    def __init__(self, path):
+        super().__init__(path)
+        self.reservations = 0
+
+    def reserve_ids(self, name, n, floor=0):
+        self.reservations += 1
+        return super().reserve_ids(name, n, floor)
+
+
+def _piece(pid, title="Nocturne"):
+    return tpl.Piece(pid, title, "Chopin", "Classical", "learning", 0)
+
+def test_ids_come_from_blocks_and_are_persisted(tmp_path):
+    backend = CountingBackend(str(tmp_path / "pieces.csv"))
+    seq = sequences.Sequence("piece", backend, block=10)
+
+    ids = [seq.next() for _ in range(25)]
+
+    assert ids == list(range(1, 26))
+    assert backend.reservations == 3        # once per block, not once per id
+    assert json.loads((tmp_path / "sequences.json").read_text()) == {"piece": 30}
+    assert list(seq.reserve(50)) == list(range(26, 76))
+
+    seq.release()       # nobody reserved after us: the unused ids go back
+    assert json.loads((tmp_path / "sequences.json").read_text()) == {"piece": 75}
+
+def test_two_processes_never_share_an_id(tmp_path):
+    path = str(tmp_path / "pieces.csv")
+    a = sequences.Sequence("piece", CsvBackend(path), block=4)
+    b = sequences.Sequence("piece", CsvBackend(path), block=4)
+
+    taken = [a.next(), b.next(), a.next(), b.next()] + list(a.reserve(6)) + list(b.reserve(3))
+
+    assert len(set(taken)) == len(taken)
+    a.release()     # b reserved after a's block: a's leftovers stay skipped
+    assert b.next() not in taken
+
+def test_ids_stay_above_existing_data(tmp_path):
+    backend = CsvBackend(str(tmp_path / "pieces.csv"))
+    seq = sequences.Sequence("piece", backend)
+
+    assert seq.next(floor=40) == 41
+    assert seq.next(floor=100) == 101      # data written by someone else meanwhile
+
+def test_deleted_piece_id_is_not_reused(tmp_path):
+    path = str(tmp_path / "pieces.csv")
+    storage.save_pieces([_piece(1), _piece(2, "Etude")], path)
+    backend = CsvBackend(path)
+    repo = PieceRepository(backend)
+    with repo.writing() as library:
+        library.add_piece(_piece(library.next_id(), "Ballade"))
+        repo.insert(library.get(3))
+    with repo.writing() as library:
+        library.delete_piece(3)
+        repo.remove(3)
+    backend.close()
+
+    fresh = PieceRepository(CsvBackend(path))
+    assert fresh.get().max_id == 2
+    assert fresh.get().next_id() == 4
+
+def test_setlist_ids_and_item_ids(tmp_path):
+    backend = SqliteBackend(str(tmp_path / "repertoire.db"))
+    repo = SetlistRepository(backend)
+    with repo.writing() as (performances, items):
+        pid = performances.next_id()
+        performances[pid] = sl.Performance(pid, "Recital", "", "", 0)
+        repo.insert_performance(performances[pid])
+        for piece_id in (5, 6, 7):
+            repo.insert_item(sl.add_piece_to_setlist(items, pid, piece_id))
+        first = items.items_for(pid)[0]
+        sl.remove_piece_from_setlist(items, pid, 1)
+        repo.delete_item(first)
+        repo.insert_item(sl.add_piece_to_setlist(items, pid, 8))
+
+    ids = [it.setlist_item_id for it in items.items_for(pid)]
+    assert ids == [2, 3, 4]                 # not len + 1 (= 3 again) after the removal
+    assert list(performances.reserve_ids(2)) == [2, 3]
+    backend.close()
+
+    db = SqliteBackend(str(tmp_path / "repertoire.db"))
+    assert db.reserve_ids("setlist_item", 1) == 5
+    assert db.reserve_ids("performance", 1) == 4    # closing gave back 4..32 after the reserved 2, 3
+
+def test_plain_containers_use_max_plus_one():
+    items = [sl.Setlist_Item(1, 1, 10, 1), sl.Setlist_Item(3, 1, 11, 2)]
+    assert sl.add_piece_to_setlist(items, 1, 12).setlist_item_id == 4
+    assert sl.next_performance_id({2: None, 7: None}) == 8
+    assert tpl.PieceLibrary().next_id() == 1
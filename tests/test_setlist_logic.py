@@ -5,11 +5,21 @@ from io import StringIO
 from contextlib import redirect_stdout
 
 from app.setlist_logic import (
+    SetlistStore,
+    Setlist_Item,
     create_setlist,
     add_piece_to_setlist,
     remove_piece_from_setlist,
     view_setlist,
+    move_up,
+    move_down,
+    move_item,
+    drop_setlist,
+    SetlistTotals,
+    build_setlist,
+    count_items,
 )
+from app.piece_logic import Piece, PieceLibrary
 
 class TestSetlistLogic(unittest.TestCase):
     def test_add_piece_order(self):
@@ -60,5 +70,188 @@ class TestSetlistLogic(unittest.TestCase):
         output = buf.getvalue()
         self.assertIn("(no pieces yet)", output)
 
+    def test_store_keeps_setlists_apart(self):
+        store = SetlistStore()
+        for piece_id in (101, 202, 303):
+            add_piece_to_setlist(store, 1, piece_id)
+        add_piece_to_setlist(store, 2, 999)
+
+        self.assertEqual(store.count(1), 3)
+        self.assertEqual(store.count(2), 1)
+        self.assertEqual(len(store), 4)
+        self.assertEqual([it.piece_id for it in store.items_for(1)], [101, 202, 303])
+
+        remove_piece_from_setlist(store, 1, order_index=1)
+        self.assertEqual([(it.order_index, it.piece_id) for it in store.items_for(1)], [(1, 202), (2, 303)])
+        self.assertEqual(store.items_for(2)[0].order_index, 1)
+
+        drop_setlist(store, 1)
+        self.assertEqual(store.count(1), 0)
+        self.assertEqual([it.piece_id for it in store], [999])
+
+    def test_deferred_setlists_build_on_first_use(self):
+        store = SetlistStore()
+        seen = []
+        store.listeners.append(lambda op, value: seen.append(op))
+        self.assertEqual(store.defer(1, "101;202;303", 1), 3)
+        store.defer(2, "", 4)
+        self.assertEqual((len(store), store.count(1), count_items(store, 1)), (3, 3, 3))
+        self.assertEqual(store._by_perf, {})        # nothing built yet
+        self.assertEqual([(it.setlist_item_id, it.piece_id, it.order_index) for it in store.items_for(1)],
+                         [(1, 101, 1), (2, 202, 2), (3, 303, 3)])
+        self.assertEqual(len(store), 3)
+        self.assertEqual(seen, [])                  # loading isn't a change
+        self.assertEqual(count_items([Setlist_Item(1, 1, 101, 1), Setlist_Item(2, 2, 5, 1)], 1), 1)
+
+    def test_store_sorts_unordered_rows(self):
+        store = SetlistStore([Setlist_Item(2, 1, 202, 2), Setlist_Item(1, 1, 101, 1), Setlist_Item(3, 1, 303, 3)])
+        self.assertEqual([it.piece_id for it in store.items_for(1)], [101, 202, 303])
+
+    def test_move_up_and_down_on_store_and_flat_list(self):
+        for setlist_items in (SetlistStore(), []):
+            for piece_id in (101, 202, 303):
+                add_piece_to_setlist(setlist_items, 1, piece_id)
+
+            self.assertTrue(move_up(setlist_items, 1, order_index=3))
+            self.assertTrue(move_down(setlist_items, 1, order_index=1))
+            self.assertFalse(move_up(setlist_items, 1, order_index=1))
+
+            items = sorted(setlist_items, key=lambda it: it.order_index)
+            self.assertEqual([it.piece_id for it in items], [303, 101, 202])
+            self.assertEqual([it.order_index for it in items], [1, 2, 3])
+
+    def test_move_to_any_position_changes_one_rank(self):
+        store, seen = SetlistStore(), []
+        for piece_id in (101, 202, 303, 404, 505):
+            add_piece_to_setlist(store, 1, piece_id)
+        store.listeners.append(lambda op, value: seen.append(op))
+        ranks_before = {it.piece_id: it.rank for it in store.items_for(1)}
+
+        self.assertTrue(move_item(store, 1, order_index=5, to_index=2))
+        self.assertFalse(move_item(store, 1, order_index=1, to_index=9))
+
+        items = store.items_for(1)
+        self.assertEqual([it.piece_id for it in items], [101, 505, 202, 303, 404])
+        self.assertEqual([it.order_index for it in items], [1, 2, 3, 4, 5])
+        self.assertEqual([it.rank for it in items], sorted(it.rank for it in items))
+        self.assertEqual({it.piece_id for it in items if it.rank != ranks_before[it.piece_id]}, {505})
+        self.assertEqual(seen, ["move_item"])
+
+        remove_piece_from_setlist(store, 1, order_index=2)
+        self.assertEqual([(it.order_index, it.piece_id) for it in store.items_for(1)],
+                         [(1, 101), (2, 202), (3, 303), (4, 404)])
+
+    def test_long_ranks_are_rebalanced_lazily(self):
+        store, seen = SetlistStore(), []
+        for piece_id in (101, 202, 303):
+            add_piece_to_setlist(store, 1, piece_id)
+        store.listeners.append(lambda op, value: seen.append(op))
+        # keep squeezing the last item in between the first two
+        while "reorder" not in seen:
+            move_item(store, 1, order_index=3, to_index=2)
+        self.assertGreater(seen.count("move_item"), 20)
+        self.assertTrue(all(len(it.rank) == 1 for it in store.items_for(1)))
+        self.assertEqual([it.order_index for it in store.items_for(1)], [1, 2, 3])
+
+    def test_totals_follow_item_and_duration_changes(self):
+        lib = PieceLibrary()
+        lib.add_piece(Piece(101, "Ondine", "Ravel", "Classical", "learning", 1, 390))
+        lib.add_piece(Piece(202, "Take Five", "Brubeck", "Jazz", "learning", 1, 324))
+        lib.add_piece(Piece(303, "Untimed", "Anon", "Folk", "learning", 1))
+        store = SetlistStore()
+        add_piece_to_setlist(store, 1, 101)
+        totals = SetlistTotals(store, lib)
+        self.assertEqual((totals.count(1), totals.runtime(1)), (1, 390))
+
+        for piece_id in (202, 303):
+            add_piece_to_setlist(store, 1, piece_id)
+        add_piece_to_setlist(store, 2, 202)
+        add_piece_to_setlist(store, 2, 202)
+        self.assertEqual((totals.count(1), totals.runtime(1)), (3, 714))
+        self.assertEqual((totals.count(2), totals.runtime(2)), (2, 648))
+
+        move_up(store, 1, order_index=3)
+        self.assertEqual(totals.runtime(1), 714)
+
+        # one edit adjusts every setlist that uses the piece, once per use
+        lib.edit_piece(202, "Take Five", "Brubeck", "Jazz", "learning", 300)
+        self.assertEqual((totals.runtime(1), totals.runtime(2)), (690, 600))
+        lib.edit_piece(303, "Untimed", "Anon", "Folk", "learning", 60)
+        self.assertEqual(totals.runtime(1), 750)
+
+        remove_piece_from_setlist(store, 1, order_index=1)
+        self.assertEqual((totals.count(1), totals.runtime(1)), (2, 360))
+        lib.delete_piece(202)
+        self.assertEqual((totals.runtime(1), totals.runtime(2)), (60, 0))
+        lib.add_piece(Piece(202, "Take Five", "Brubeck", "Jazz", "learning", 1, 300))
+        self.assertEqual((totals.runtime(1), totals.runtime(2)), (360, 600))
+
+        drop_setlist(store, 2)
+        self.assertEqual((totals.count(2), totals.runtime(2)), (0, 0))
+        lib.edit_piece(202, "Take Five", "Brubeck", "Jazz", "learning", 100)
+        self.assertEqual((totals.runtime(1), totals.runtime(2)), (160, 0))
+
+        # the running sums always match a recount
+        fresh = SetlistTotals(store, lib)
+        self.assertEqual([(fresh.count(p), fresh.runtime(p)) for p in (1, 2)],
+                         [(totals.count(p), totals.runtime(p)) for p in (1, 2)])
+
+        totals.detach()
+        add_piece_to_setlist(store, 1, 202)
+        self.assertEqual(totals.count(1), 2)
+
+    def test_totals_recount_after_library_reload(self):
+        lib = PieceLibrary()
+        lib.add_piece(Piece(1, "Ondine", "Ravel", "Classical", "learning", 1, 100))
+        store = SetlistStore()
+        add_piece_to_setlist(store, 1, 1)
+        totals = SetlistTotals(store, lib)
+        lib.pieces = [Piece(1, "Ondine", "Ravel", "Classical", "learning", 1, 250)]
+        self.assertEqual(totals.runtime(1), 250)
+
+    def _builder_library(self):
+        return [
+            Piece(1, "Take Five", "Brubeck", "Jazz", "performance-ready", 1, 324),
+            Piece(2, "Blue Rondo", "Brubeck", "Jazz", "performance-ready", 1, 400),
+            Piece(3, "Round Midnight", "Monk", "Jazz", "performance-ready", 1, 360),
+            Piece(4, "Ondine", "Ravel", "Classical", "performance-ready", 1, 390),
+            Piece(5, "Nocturne", "Chopin", "Classical", "rehearsing", 1, 300),
+            Piece(6, "Untimed", "Satie", "Classical", "performance-ready", 1),
+            Piece(7, "Gnossienne", "Satie", "Classical", "performance-ready", 1, 200),
+        ]
+
+    def test_build_fills_the_slot_from_ready_pieces(self):
+        pieces = self._builder_library()
+        duration = {p.piece_id: p.duration for p in pieces}
+        perf, items = build_setlist(pieces, 1090, 7, "Gig", first_item_id=40)
+        self.assertEqual((perf.performance_id, perf.title), (7, "Gig"))
+        # best fill <= 1090 from the ready, timed pieces: 324 + 400 + 360 = 1084
+        self.assertEqual(sum(duration[it.piece_id] for it in items), 1084)
+        self.assertEqual([it.order_index for it in items], [1, 2, 3])
+        self.assertEqual([it.setlist_item_id for it in items], [40, 41, 42])
+        self.assertTrue(all(it.performance_id == 7 for it in items))
+        # the two Brubeck pieces are kept apart
+        self.assertEqual(items[1].piece_id, 3)
+
+        _, items = build_setlist(pieces, 300, 1, "Gig")
+        self.assertEqual([it.piece_id for it in items], [7])
+        _, items = build_setlist(pieces, 300, 1, "Gig", readiness=None)
+        self.assertEqual([it.piece_id for it in items], [5])
+        self.assertEqual(build_setlist(pieces, 100, 1, "Gig")[1], [])
+
+    def test_build_follows_the_genre_mix(self):
+        pieces = self._builder_library()
+        by_id = {p.piece_id: p for p in pieces}
+        # 500s per genre (390 + 400), then the 210s left over are filled from either (200)
+        _, items = build_setlist(pieces, 1000, 1, "Gig", genre_mix={"classical": 1, "JAZZ": 1})
+        self.assertEqual(sorted(it.piece_id for it in items), [2, 4, 7])
+        _, items = build_setlist(pieces, 5000, 1, "Gig", genre_mix={"Classical": 1})
+        self.assertEqual({it.piece_id for it in items}, {4, 7})
+
+    def test_build_with_a_huge_slot_takes_every_candidate(self):
+        # the DP is sized by the candidates' total runtime, not by the target
+        _, items = build_setlist(self._builder_library(), 99999999999, 1, "Gig")
+        self.assertEqual(sorted(it.piece_id for it in items), [1, 2, 3, 4, 7])
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
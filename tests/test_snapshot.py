@@ -0,0 +1,96 @@
+import os
+
+from app import piece_logic as tpl
+from app import snapshot
+from app import storage
+from app.backends import CsvBackend, open_backend, write_through
+from app.journal import JournalBackend
+from app.repository import PieceRepository
+
+
+def _pieces():
+    a = tpl.Piece(3, "Nocturne", "Chopin", "Classical", "learning", 1, 272)
+    a.created = "2024-01-02"
+    b = tpl.Piece(1, "Étude", "Chopin", "Classical", "performance-ready", 1)
+    b.created, b.updated = "2024-01-01", "2024-02-01"
+    c = tpl.Piece(7, "Take Five", "Brubeck", "Jazz", "learning", 2, 324)
+    return [a, b, c]
+
+def _fields(p):
+    return tuple(getattr(p, name) for name in tpl.Piece.__slots__)
+
+def test_round_trip_and_lookups(tmp_path):
+    path = str(tmp_path / "pieces.csv")
+    storage.save_pieces(_pieces(), path)
+    assert storage.save_snapshot(_pieces(), path)
+
+    with snapshot.open_snapshot(storage.snapshot_path(path), snapshot.stamp(path)) as snap:
+        assert len(snap) == 3 and snap.max_id == 7
+        assert [_fields(p) for p in snap] == [_fields(p) for p in _pieces()]     # file order
+        assert _fields(snap.get(1)) == _fields(_pieces()[1])
+        assert snap.get(1).duration is None and snap.get(7).updated is None
+        assert snap.get(2) is None and snap.get(99) is None
+        assert snap[2].title == "Take Five"
+
+def test_outdated_snapshot_is_rebuilt(tmp_path):
+    path = str(tmp_path / "pieces.csv")
+    storage.save_pieces(_pieces(), path)
+    storage.save_snapshot(_pieces(), path)
+    storage.save_pieces(_pieces()[:1], path)        # the CSV changed without the snapshot
+
+    assert snapshot.open_snapshot(storage.snapshot_path(path), snapshot.stamp(path)) is None
+    with storage.open_snapshot(path) as snap:
+        assert [p.piece_id for p in snap] == [3]
+    assert snapshot.open_snapshot(str(tmp_path / "pieces.csv")) is None      # not a snapshot
+
+def test_library_is_built_on_first_need(tmp_path):
+    backend = CsvBackend(str(tmp_path / "pieces.csv"), str(tmp_path / "setlists.csv"), snapshot=True)
+    backend.save_pieces(_pieces())
+    lib = tpl.PieceLibrary()
+    backend.load_library(lib)
+
+    etude = lib.get(1)
+    assert lib._deferred is not None        # looked up in the mapped file, nothing built
+    assert len(lib) == 3 and lib.next_id() == 8 and lib.get(1) is etude
+
+    assert [p.piece_id for p in lib.with_readiness("learning")] == [3, 7]
+    assert lib._deferred is None
+    assert lib.get(1) is etude              # the piece handed out is the one in the library
+    lib.add_piece(tpl.Piece(lib.next_id(), "Blue in Green", "Evans", "Jazz", "learning", 2))
+    assert len(lib) == 4
+
+def test_journal_changes_are_replayed_on_the_snapshot(tmp_path):
+    backend = JournalBackend(str(tmp_path / "pieces.csv"), str(tmp_path / "setlists.csv"), snapshot=True)
+    backend.save_pieces(_pieces())
+    lib = tpl.PieceLibrary()
+    backend.load_library(lib)
+    write_through(backend, lib)
+    lib.edit_piece(3, "Nocturne in E-flat", "Chopin", "Classical", "learning")
+    lib.delete_piece(7)
+
+    reloaded = tpl.PieceLibrary()
+    backend.load_library(reloaded)
+    assert reloaded._deferred is None       # journal records on top: decoded and replayed
+    assert sorted((p.piece_id, p.title) for p in reloaded.pieces) == [(1, "Étude"), (3, "Nocturne in E-flat")]
+
+    backend.compact()                       # folded into a new CSV file and snapshot
+    compacted = tpl.PieceLibrary()
+    backend.load_library(compacted)
+    assert compacted._deferred is not None
+    assert compacted.get(3).title == "Nocturne in E-flat" and compacted.get(7) is None
+    backend.close()
+
+def test_repository_and_partitions_use_the_snapshot(tmp_path):
+    backend = open_backend("csv", str(tmp_path / "pieces.csv"), str(tmp_path / "setlists.csv"), snapshot=True)
+    backend.save_pieces(_pieces())
+    repo = PieceRepository(backend)
+    assert repo.get().get(7).composer == "Brubeck"
+    with repo.writing() as library:
+        library.add_piece(tpl.Piece(library.next_id(), "Blue in Green", "Evans", "Jazz", "learning", 2))
+        repo.save()
+    assert os.path.exists(storage.snapshot_path(backend.pieces_path))
+    assert len(PieceRepository(backend).get()) == 4
+
+    part = backend.partition(2)
+    assert part.snapshot
+    assert not os.path.exists(storage.snapshot_path(part.pieces_path))
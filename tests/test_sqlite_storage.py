@@ -0,0 +1,162 @@
+import pytest
+
+from app import storage
+from app import piece_logic as tpl
+from app import setlist_logic as sl
+from app.backends import CsvBackend, open_backend
+from app.repository import PieceRepository
+from app.journal import JournalBackend
+from app.sqlite_storage import SqliteBackend, migrate_csv_to_sqlite
+
+
+@pytest.fixture
+def backend(tmp_path):
+    b = SqliteBackend(str(tmp_path / "repertoire.db"))
+    yield b
+    b.close()
+
+def test_uses_wal_and_indexes(backend):
+    db = backend._conn()
+    assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    indexes = {r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_pieces_user_readiness", "idx_setlist_items_order"} <= indexes
+
+def test_row_level_piece_writes(backend):
+    p1 = tpl.Piece(1, "Nocturne", "Chopin", "Classical", "learning", 0)
+    p2 = tpl.Piece(2, "Take Five", "Brubeck", "Jazz", "rehearsing", 0)
+    backend.insert_piece(p1)
+    backend.insert_piece(p2)
+
+    p1.readiness_status = "performance-ready"
+    backend.update_piece(p1)
+    backend.delete_piece(2)
+
+    loaded = backend.load_pieces()
+    assert [(p.piece_id, p.readiness_status) for p in loaded] == [(1, "performance-ready")]
+
+def test_duration_round_trip_and_old_schema(tmp_path, backend):
+    backend.insert_piece(tpl.Piece(1, "Ondine", "Ravel", "Classical", "learning", 0, 390))
+    p = backend.load_pieces()[0]
+    assert p.duration == 390
+    p.duration = None
+    backend.update_piece(p)
+    assert backend.load_pieces()[0].duration is None
+
+    # a database from before the duration column is migrated on open
+    import sqlite3
+    path = str(tmp_path / "old.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE pieces (piece_id INTEGER PRIMARY KEY, title TEXT NOT NULL, composer TEXT, "
+               "genre TEXT, readiness_status TEXT, user_id INTEGER, created TEXT, updated TEXT)")
+    db.execute("INSERT INTO pieces VALUES (1, 'Nocturne', 'Chopin', 'Classical', 'learning', 0, NULL, NULL)")
+    db.commit()
+    db.close()
+    old = SqliteBackend(path)
+    assert old.load_pieces()[0].duration is None
+    old.close()
+
+def test_generation_changes_on_every_write(backend):
+    before = backend.pieces_stamp()
+    backend.insert_piece(tpl.Piece(1, "Ondine", "Ravel", "Classical", "learning", 0))
+    assert backend.pieces_stamp() != before
+    assert backend.setlists_stamp() == 0
+
+def test_setlist_rows_keep_order(backend):
+    perf = sl.Performance(10, "Recital", "2026-05-01", "Hall", 0)
+    backend.insert_performance(perf)
+    a = sl.Setlist_Item(None, 10, 101, 1)
+    b = sl.Setlist_Item(None, 10, 102, 2)
+    backend.insert_setlist_item(a)
+    backend.insert_setlist_item(b)
+    assert a.setlist_item_id != b.setlist_item_id
+
+    a.order_index, b.order_index = 2, 1
+    backend.reorder_setlist(10, items=[a, b])
+
+    perfs, items = backend.load_setlists()
+    assert 10 in perfs
+    assert [it.piece_id for it in items] == [102, 101]
+
+    # deleting the performance cascades to its items
+    backend.delete_performance(10)
+    perfs, items = backend.load_setlists()
+    assert perfs == {} and len(items) == 0
+
+def test_move_updates_one_row(backend):
+    backend.insert_performance(sl.Performance(1, "Recital", "", "", 0))
+    store = sl.SetlistStore()
+    for piece_id in (101, 202, 303, 404):
+        backend.insert_setlist_item(sl.add_piece_to_setlist(store, 1, piece_id))
+    db = backend._conn()
+    before = dict(db.execute("SELECT setlist_item_id, rank FROM setlist_items"))
+
+    moved = store.items_for(1)[3]
+    assert store.move(moved, 1) is False
+    backend.move_setlist_item(moved)
+
+    after = dict(db.execute("SELECT setlist_item_id, rank FROM setlist_items"))
+    assert {i for i in before if before[i] != after[i]} == {moved.setlist_item_id}
+    _, items = backend.load_setlists()
+    assert [(it.order_index, it.piece_id) for it in items.items_for(1)] == [(1, 404), (2, 101), (3, 202), (4, 303)]
+
+def test_old_setlist_items_get_ranks(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "old.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE performances (performance_id INTEGER PRIMARY KEY, title TEXT NOT NULL DEFAULT '', "
+               "date TEXT NOT NULL DEFAULT '', location TEXT NOT NULL DEFAULT '', user_id INTEGER NOT NULL DEFAULT 0)")
+    db.execute("CREATE TABLE setlist_items (setlist_item_id INTEGER PRIMARY KEY, performance_id INTEGER NOT NULL, "
+               "piece_id INTEGER NOT NULL, order_index INTEGER NOT NULL)")
+    db.execute("INSERT INTO performances VALUES (1, 'Recital', '', '', 0)")
+    db.executemany("INSERT INTO setlist_items VALUES (?, 1, ?, ?)", [(1, 303, 3), (2, 101, 1), (3, 202, 2)])
+    db.commit()
+    db.close()
+
+    old = SqliteBackend(path)
+    _, items = old.load_setlists()
+    assert [(it.order_index, it.piece_id) for it in items.items_for(1)] == [(1, 101), (2, 202), (3, 303)]
+    assert all(it.rank for it in items.items_for(1))
+    old.close()
+
+def test_migration_from_csv(tmp_path):
+    p_csv, s_csv = str(tmp_path / "pieces.csv"), str(tmp_path / "setlists.csv")
+    db_path = str(tmp_path / "repertoire.db")
+    storage.save_pieces([tpl.Piece(1, "Fur Elise", "Beethoven", "Classical", "learning", 0)], p_csv)
+    storage.save_setlists({1: sl.Performance(1, "Recital", "2026-02-15", "Hall", 0)},
+                          [sl.Setlist_Item(1, 1, 1, 1)], s_csv)
+
+    assert migrate_csv_to_sqlite(db_path, p_csv, s_csv) == (1, 1)
+    with pytest.raises(RuntimeError):
+        migrate_csv_to_sqlite(db_path, p_csv, s_csv)   # one-shot
+
+    backend = open_backend("sqlite", sqlite_path=db_path)
+    assert [p.title for p in backend.load_pieces()] == ["Fur Elise"]
+    perfs, items = backend.load_setlists()
+    assert perfs[1].title == "Recital" and [it.piece_id for it in items] == [1]
+    backend.close()
+
+def test_migration_includes_the_journal_and_sequences(tmp_path):
+    p_csv, s_csv = str(tmp_path / "pieces.csv"), str(tmp_path / "setlists.csv")
+    db_path = str(tmp_path / "repertoire.db")
+    storage.save_pieces([tpl.Piece(1, "Fur Elise", "Beethoven", "Classical", "learning", 0)], p_csv)
+    journal = JournalBackend(p_csv, s_csv)
+    journal.sequence("piece").reserve(40, floor=1)          # ids 2..41 handed out (sequence at 41+)
+    journal.insert_piece(tpl.Piece(2, "Ondine", "Ravel", "Classical", "learning", 0))
+    journal.close()
+
+    assert migrate_csv_to_sqlite(db_path, p_csv, s_csv) == (2, 0)
+    backend = SqliteBackend(db_path)
+    assert [p.title for p in backend.load_pieces()] == ["Fur Elise", "Ondine"]
+    assert backend.reserve_ids("piece", 1) > 41             # no id handed out before is reused
+    backend.close()
+
+def test_repository_works_on_either_backend(tmp_path, backend):
+    for b in (CsvBackend(str(tmp_path / "pieces.csv")), backend):
+        repo = PieceRepository(b)
+        with repo.lock:
+            piece = tpl.Piece(1, "Ondine", "Ravel", "Classical", "learning", 0)
+            repo.get().add_piece(piece)
+            repo.insert(piece)
+        repo.get()
+        assert repo.hits == 1 and repo.misses == 1
+        assert [p.title for p in b.load_pieces()] == ["Ondine"]
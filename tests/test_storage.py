@@ -32,6 +32,20 @@ def test_pieces_save_load_persistence(temp_files):
     assert isinstance(loaded_pieces[0].created, str)
     assert loaded_pieces[0].created == str(date.today())
 
+def test_piece_duration_round_trip(temp_files):
+    p_path, _ = temp_files
+    storage.save_pieces([tpl.Piece(1, "Ondine", "Ravel", "Classical", "learning", 0, 390),
+                         tpl.Piece(2, "Untimed", "Anon", "Folk", "learning", 0)], path=p_path)
+    assert [p.duration for p in storage.load_pieces(path=p_path)] == [390, None]
+
+def test_append_upgrades_a_file_without_duration(temp_files):
+    p_path, _ = temp_files
+    with open(p_path, "w", newline="") as f:
+        f.write("piece_id,title,composer,genre,readiness_status,user_id,created,updated\n"
+                "1,Nocturne,Chopin,Classical,learning,0,,\n")
+    storage.append_pieces([tpl.Piece(2, "Ondine", "Ravel", "Classical", "learning", 0, 390)], path=p_path)
+    assert [(p.piece_id, p.duration) for p in storage.load_pieces(path=p_path)] == [(1, None), (2, 390)]
+
 def test_setlist_ordering_and_reconstruction(temp_files):
     _, s_path = temp_files
     # 1. Arrange
@@ -68,3 +82,22 @@ def test_storage_creates_file_if_missing(tmp_path):
     with open(missing_path, 'r') as f:
         header = f.readline()
         assert "piece_id" in header
+
+def test_setlist_item_ids_are_kept(temp_files):
+    _, s_path = temp_files
+    performances = {1: sl.Performance(1, "Recital", "", "", 0), 2: sl.Performance(2, "Gig", "", "", 0)}
+    items = sl.SetlistStore([sl.Setlist_Item(7, 1, 10, 1), sl.Setlist_Item(3, 1, 11, 2), sl.Setlist_Item(9, 2, 12, 1)])
+
+    storage.save_setlists(performances, items, path=s_path)
+    _, loaded = storage.load_setlists(path=s_path)
+
+    assert [(it.setlist_item_id, it.piece_id) for it in loaded.items_for(1)] == [(7, 10), (3, 11)]
+    assert [it.setlist_item_id for it in loaded.items_for(2)] == [9]
+    assert loaded.max_id == 9
+
+def test_setlists_without_item_ids_are_numbered_in_file_order(temp_files):
+    _, s_path = temp_files
+    with open(s_path, "w", newline="", encoding="utf-8") as f:
+        f.write("id,title,date,location,user_id,piece_ids\n1,Recital,,,0,10;11\n2,Gig,,,0,12\n")
+    _, loaded = storage.load_setlists(path=s_path)
+    assert [it.setlist_item_id for it in loaded] == [1, 2, 3]
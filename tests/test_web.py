@@ -1,16 +1,27 @@
+import io
 import pytest
 from web import create_app
-from app.piece_logic import library, Piece
+from app.piece_logic import Piece
+from app.repository import get_piece_repository
 
 @pytest.fixture
-def client():
+def pieces_path(tmp_path):
+    """Temporary piece CSV so the tests never touch data/."""
+    return str(tmp_path / "piece_library.csv")
+
+@pytest.fixture
+def app(pieces_path, tmp_path):
+    return create_app({"TESTING": True, "PIECES_CSV": pieces_path,
+                       "SETLISTS_CSV": str(tmp_path / "setlist_library.csv")})
+
+@pytest.fixture
+def library(app):
+    """The shared in-memory library the routes read from and write to."""
+    return get_piece_repository(app.extensions["storage"]).get()
+
+@pytest.fixture
+def client(app):
     """Provides a fresh, isolated test client for every test case."""
-    app = create_app()
-    app.config.update({"TESTING": True})
-    
-    # Clear the shared library state to ensure test independence
-    library.pieces = [] 
-    
     with app.test_client() as client:
         yield client
 
@@ -21,7 +32,7 @@ def test_branding_and_navigation(client):
     assert b"RepertoireReady" in response.data
     assert b"Pieces" in response.data
 
-def test_add_piece_functional_flow(client):
+def test_add_piece_functional_flow(client, library):
     """Verify that submitting the web form adds data to the backend logic."""
     # Data keys match Parker's request.form.get keys in pieces_routes.py
     form_payload = {
@@ -39,7 +50,7 @@ def test_add_piece_functional_flow(client):
     assert len(library.pieces) == 1
     assert library.pieces[0].composer == "Mozart"
 
-def test_delete_piece_functional_flow(client):
+def test_delete_piece_functional_flow(client, library):
     """Verify that the delete action removes the piece from the UI and Library."""
     # Arrange: Add a piece to delete
     library.add_piece(Piece(1, "Delete Me", "N/A", "N/A", "learning", 1))
@@ -52,7 +63,84 @@ def test_delete_piece_functional_flow(client):
     assert len(library.pieces) == 0
 
 def test_setlist_data_persistence(client):
-    """Verify the setlists page displays the performance data."""
+    """Verify the setlists page lists the stored setlists with their piece count and runtime."""
+    client.post("/api/v1/pieces", json={"title": "Ondine", "duration": "6:30"})
+    client.post("/api/v1/pieces", json={"title": "Take Five", "duration": 324})
+    client.post("/api/v1/performances", json={"title": "Spring Concert", "date": "2026-03-10"})
+    client.post("/api/v1/performances", json={"title": "Jazz Showcase", "date": "2026-04-05"})
+    for pid in (1, 2):
+        client.post("/api/v1/performances/1/items", json={"piece_id": pid})
+
     response = client.get("/setlists/")
     assert b"Spring Concert" in response.data
     assert b"Jazz Showcase" in response.data
+    assert b"2 / 11:54" in response.data
+    assert b"0 / 0:00" in response.data
+
+    # a duration edit moves the runtime of every setlist using the piece
+    client.patch("/api/v1/pieces/2", json={"duration": "1:00"})
+    assert b"2 / 7:30" in client.get("/setlists/").data
+
+def test_build_setlist_form(client):
+    """The builder form saves a setlist that fits the time slot, and rejects bad input."""
+    for title, composer, seconds in (("Ondine", "Ravel", 390), ("Take Five", "Brubeck", 324),
+                                     ("Blue Rondo", "Brubeck", 400)):
+        client.post("/api/v1/pieces", json={"title": title, "composer": composer, "duration": seconds,
+                                            "readiness_status": "performance-ready"})
+    assert client.get("/setlists/build").status_code == 200
+
+    response = client.post("/setlists/build", data={"title": "Lunch Gig", "target": "12:00",
+                                                     "readiness": "performance-ready"})
+    assert response.status_code == 302
+    built = client.get("/api/v1/performances/1").get_json()
+    assert built["title"] == "Lunch Gig"
+    assert sorted(it["piece_id"] for it in built["items"]) == [1, 2]
+    assert b"2 / 11:54" in client.get("/setlists/").data
+
+    response = client.post("/setlists/build", data={"title": "Gig", "target": "soon"})
+    assert response.status_code == 400
+    assert b"bad duration" in response.data
+    response = client.post("/setlists/build", data={"title": "Gig", "target": "99999999999"})
+    assert response.status_code == 400
+    assert b"at most 24:00:00" in response.data
+
+def test_search_route_ranks_matches(client, library):
+    """Verify /pieces/search runs a full-text query across title/composer/genre."""
+    library.add_piece(Piece(1, "Take Five", "Dave Brubeck", "Jazz", "learning", 1))
+    library.add_piece(Piece(2, "Blue Rondo", "Dave Brubeck", "Jazz", "learning", 1))
+    library.add_piece(Piece(3, "Ondine", "Ravel", "Classical", "learning", 1))
+
+    response = client.get("/pieces/search?q=brubeck+ron")
+
+    assert response.status_code == 200
+    assert b"Blue Rondo" in response.data
+    assert b"Take Five" not in response.data
+    assert b"Ondine" not in response.data
+
+def test_import_route_streams_upload(client, library):
+    """Bulk import accepts a multipart upload or a raw CSV body and reports per-row errors."""
+    body = b"title,composer,genre,readiness_status\nOndine,Ravel,Classical,learning\nBad,Nobody,Pop,unknown\n"
+    response = client.post("/pieces/import", data={"file": (io.BytesIO(body), "catalogue.csv")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 200
+    assert response.get_json()["imported"] == 1
+    assert response.get_json()["error_rows"][0]["line"] == 3
+
+    response = client.post("/pieces/import", data=b"title,composer\nSpain,Corea\nOndine,Ravel\n",
+                           content_type="text/csv")
+    report = response.get_json()
+    assert (report["imported"], report["duplicates"]) == (1, 1)
+    assert {"Ondine", "Spain"} <= {p.title for p in library.pieces}
+
+def test_pieces_listing_is_paged(client, library):
+    """The listing renders one page and links to the next one, keeping the filters."""
+    for i in range(1, 61):
+        library.add_piece(Piece(i, f"Etude {i:02d}", "Chopin" if i % 2 else "Liszt", "Classical", "learning", 1))
+
+    response = client.get("/pieces/?composer=liszt&sort=title&size=20")
+    assert response.status_code == 200
+    assert b"Etude 02" in response.data and b"Etude 40" in response.data
+    assert b"Etude 42" not in response.data and b"Etude 01" not in response.data
+    assert b"composer=liszt" in response.data and b"after=" in response.data
+
+    assert client.get("/pieces/?sort=nope").status_code == 400
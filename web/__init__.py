@@ -1,17 +1,63 @@
 from flask import Flask, render_template
+from app import storage
+from app.backends import DEFAULT_BACKEND, open_backend
+from app.partitions import MAX_BYTES as PARTITION_BYTES, Partitions
+from . import caching, compression, instrumentation, users
+from .fragment_cache import MAX_BYTES, FragmentCache
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config["SECRET_KEY"] = "dev"
 
+    # storage: "journal" (CSV snapshot + change journal, default), "csv" or "sqlite"
+    app.config["STORAGE_BACKEND"] = DEFAULT_BACKEND
+    app.config["PIECES_CSV"] = storage.PIECES_CSV
+    app.config["SETLISTS_CSV"] = storage.SETLISTS_CSV
+    app.config["SQLITE_PATH"] = None
+    app.config["PIECES_SNAPSHOT"] = False      # opt in: memory-mapped binary snapshot of the pieces (see app/snapshot.py)
+    app.config["FRAGMENT_CACHE_BYTES"] = MAX_BYTES
+    app.config["STREAM_PAGES"] = True          # large listings are sent while they render
+    app.config["COMPRESSION"] = False          # opt in: gzip/Brotli responses (see web/compression.py)
+    app.config["PARTITION_BY_USER"] = False    # opt in: each user's data in its own files (see app/partitions.py)
+    app.config["PARTITION_CACHE_BYTES"] = PARTITION_BYTES
+    app.config["INSTRUMENTATION"] = False      # opt in: per-request timings at /metrics (see web/instrumentation.py)
+    app.config["PROFILE_SLOW_MS"] = None       # opt in: sample stacks of requests slower than this
+    if config:
+        app.config.update(config)
+
+    app.extensions["storage"] = open_backend(
+        app.config["STORAGE_BACKEND"],
+        pieces_csv=app.config["PIECES_CSV"],
+        setlists_csv=app.config["SETLISTS_CSV"],
+        sqlite_path=app.config["SQLITE_PATH"],
+        snapshot=app.config["PIECES_SNAPSHOT"],
+    )
+
+    # the active user's data: their own partition, or the shared dataset
+    app.extensions["partitions"] = Partitions(app.extensions["storage"], per_user=app.config["PARTITION_BY_USER"],
+                                              max_bytes=app.config["PARTITION_CACHE_BYTES"])
+
+    # rendered table rows/tables, reused until their data changes (see web/fragment_cache.py)
+    app.extensions["fragments"] = FragmentCache(app.config["FRAGMENT_CACHE_BYTES"])
+
+    # fingerprinted static URLs + cache headers (see web/caching.py)
+    caching.init_app(app)
+    compression.init_app(app)
+    users.init_app(app)
+    instrumentation.init_app(app)
+
     from .routes.pieces_routes import pieces_bp
     from .routes.setlists_routes import setlists_bp
+    from .routes.api_routes import api_bp
+    from .routes.admin_routes import admin_bp
 
     app.register_blueprint(pieces_bp)
     app.register_blueprint(setlists_bp)
+    app.register_blueprint(api_bp)
+    app.register_blueprint(admin_bp)
 
     @app.get("/")
     def home():
         return render_template("index.html")
 
-    return app
\ No newline at end of file
+    return app
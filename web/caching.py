@@ -0,0 +1,114 @@
+# web/caching.py
+# HTTP caching for the web UI.
+# - listing pages send a weak ETag (data version + static asset version) and Last-Modified;
+#   a client whose copy is current gets 304 before any template is rendered
+# - static files are fingerprinted: url_for("static", ...) adds ?v=<content hash>, and a
+#   request carrying the current hash is cached for a year as immutable. Without it (or
+#   with an old hash) the file is revalidated instead, through send_file's own ETag.
+
+import hashlib
+import os
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from flask import current_app, request
+
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+# filename -> ((mtime_ns, size), hash); recomputed only when the file changes
+_fingerprints: Dict[Tuple[str, str], Tuple[tuple, str]] = {}
+
+
+def fingerprint(filename: str, app=None) -> Optional[str]:
+    """Short content hash of a file in the static folder (None if it doesn't exist)."""
+    app = app or current_app
+    path = os.path.join(app.static_folder, filename)
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    key, stat = (app.static_folder, filename), (st.st_mtime_ns, st.st_size)
+    cached = _fingerprints.get(key)
+    if cached is None or cached[0] != stat:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+        cached = _fingerprints[key] = (stat, h.hexdigest()[:12])
+    return cached[1]
+
+def asset_version(app=None) -> str:
+    """One hash over every static file: pages embedding their URLs change with it."""
+    app = app or current_app
+    h = hashlib.sha1()
+    for root, _, files in sorted(os.walk(app.static_folder)):
+        for name in sorted(files):
+            filename = os.path.relpath(os.path.join(root, name), app.static_folder).replace(os.sep, "/")
+            h.update(f"{filename}={fingerprint(filename, app)};".encode())
+    return h.hexdigest()[:12]
+
+
+def _current_asset_version() -> str:
+    # computed once per process; a dev server (debug) rechecks, as files change under it
+    version = current_app.extensions.get("asset_version")
+    if version is None or current_app.debug:
+        version = current_app.extensions["asset_version"] = asset_version()
+    return version
+
+
+# ----------- Conditional GET for pages ----------- #
+
+class Validators:
+    """
+    ETag + Last-Modified of one page. Check not_modified() before rendering, then
+    apply() them to the rendered response.
+    """
+    def __init__(self, version: str, modified: Optional[float] = None):
+        self.etag = f"{version}-{_current_asset_version()}"
+        # HTTP dates have whole seconds
+        self.modified = (datetime.fromtimestamp(int(modified), timezone.utc)
+                         if modified is not None else None)
+
+    def not_modified(self) -> bool:
+        # If-None-Match wins when both are sent (RFC 9110 13.2.2)
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(self.etag)
+        since = request.if_modified_since
+        return since is not None and self.modified is not None and self.modified <= since
+
+    def apply(self, response):
+        response.set_etag(self.etag, weak=True)
+        if self.modified is not None:
+            response.last_modified = self.modified
+        # may be stored, but must be revalidated: a poll costs a 304 until the data changes
+        response.cache_control.no_cache = True
+        return response
+
+    def response_304(self):
+        return self.apply(current_app.response_class(status=304))
+
+
+# ----------- Static files ----------- #
+
+def _add_fingerprint(endpoint, values):
+    if endpoint == "static" and "v" not in values:
+        version = fingerprint(values.get("filename", ""))
+        if version:
+            values["v"] = version
+
+def _static_cache_headers(response):
+    if request.endpoint == "static" and response.status_code in (200, 304):
+        version = request.args.get("v")
+        if version and version == fingerprint(request.view_args.get("filename", "")):
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+        else:
+            response.cache_control.max_age = None
+            response.cache_control.no_cache = True
+    return response
+
+def init_app(app) -> None:
+    app.url_defaults(_add_fingerprint)
+    app.after_request(_static_cache_headers)
@@ -0,0 +1,158 @@
+# web/compression.py
+# Opt-in response compression (app.config["COMPRESSION"] = True).
+# - text responses (HTML, CSS, JSON, NDJSON, ...) of at least COMPRESSION_MIN_SIZE bytes are
+#   sent gzip- or Brotli-encoded, whichever the client accepts (Brotli only when the optional
+#   `brotli` package is installed)
+# - streamed responses are compressed as they go (the first chunk is flushed at once,
+#   then every FLUSH_EVERY bytes), so the first bytes still leave early
+# - static files are served from precompressed copies (file.css.gz / file.css.br) when
+#   they are up to date; build them with: python -m web.compression
+
+import gzip
+import mimetypes
+import os
+import sys
+import zlib
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:     # optional: gzip only
+    brotli = None
+
+MIN_SIZE = 500
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5          # on the fly; precompressed files use the maximum
+FLUSH_EVERY = 16 * 1024     # streamed responses: input bytes per flushed block
+COMPRESSIBLE = {"text/html", "text/css", "text/plain", "text/csv", "text/javascript",
+                "application/javascript", "application/json", "application/x-ndjson", "image/svg+xml"}
+PRECOMPRESS = (".css", ".js", ".svg", ".html", ".txt", ".json")
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def choose_encoding() -> str:
+    """"br", "gzip" or "" for the current request's Accept-Encoding."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return ""
+
+
+# ----------- Compressors ----------- #
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+def compress_stream(chunks, encoding: str, flush_every: int = FLUSH_EVERY):
+    """
+    Compresses an iterable of chunks. The first chunk is flushed right away, later ones
+    once flush_every input bytes have piled up: flushing every small chunk would send
+    a stream of tiny packets.
+    """
+    if encoding == "br":
+        c = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, flush, finish = c.process, c.flush, c.finish
+    else:
+        c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)     # 31: gzip container
+        process, flush, finish = c.compress, lambda: c.flush(zlib.Z_SYNC_FLUSH), c.flush
+    pending = None      # None until the first flush
+    for chunk in chunks:
+        data = chunk if isinstance(chunk, bytes) else chunk.encode()
+        out = process(data)
+        pending = len(data) if pending is None else pending + len(data)
+        if pending >= flush_every or pending == len(data):
+            out += flush()
+            pending = 0
+        if out:
+            yield out
+    yield finish()
+
+
+# ----------- Dynamic responses ----------- #
+
+def _compress_response(response, min_size: int):
+    if (response.status_code != 200 or request.method == "HEAD"
+            or response.mimetype not in COMPRESSIBLE
+            or "Content-Encoding" in response.headers
+            or response.direct_passthrough):       # send_file: static files are handled below
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding()
+    if not encoding:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    if response.headers.get("ETag", "").startswith('"'):
+        # a strong ETag names exact bytes; the compressed body is a different representation
+        response.headers["ETag"] = f'"{response.headers["ETag"][1:-1]}-{encoding}"'
+    return response
+
+
+# ----------- Static files ----------- #
+
+def _static_with_precompressed(app, static_view):
+    def static(filename):
+        encoding = choose_encoding()
+        original = safe_join(app.static_folder, filename)
+        if encoding and original and os.path.isfile(original):
+            for enc in (encoding, "gzip") if encoding == "br" else (encoding,):
+                packed = original + SUFFIXES[enc]
+                if os.path.isfile(packed) and os.path.getmtime(packed) >= os.path.getmtime(original):
+                    response = send_from_directory(app.static_folder, filename + SUFFIXES[enc],
+                                                   mimetype=mimetypes.guess_type(filename)[0])
+                    response.headers["Content-Encoding"] = enc
+                    response.vary.add("Accept-Encoding")
+                    return response
+        response = static_view(filename=filename)
+        if filename.endswith(PRECOMPRESS):
+            response.vary.add("Accept-Encoding")
+        return response
+    return static
+
+def precompress(folder: str) -> list:
+    """Writes .gz (and .br, with brotli installed) next to every compressible file in `folder`."""
+    written = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if not name.endswith(PRECOMPRESS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            out = {".gz": gzip.compress(data, 9, mtime=0)}
+            if brotli is not None:
+                out[".br"] = brotli.compress(data, quality=11)
+            for suffix, packed in out.items():
+                with open(path + suffix, "wb") as f:
+                    f.write(packed)
+                written.append(path + suffix)
+    return written
+
+
+def init_app(app) -> None:
+    app.config.setdefault("COMPRESSION", False)
+    app.config.setdefault("COMPRESSION_MIN_SIZE", MIN_SIZE)
+    if not app.config["COMPRESSION"]:
+        return
+    app.after_request(lambda response: _compress_response(response, app.config["COMPRESSION_MIN_SIZE"]))
+    app.view_functions["static"] = _static_with_precompressed(app, app.view_functions["static"])
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "static")
+    for path in precompress(folder):
+        print(f"wrote {path} ({os.path.getsize(path)} bytes)")
@@ -0,0 +1,176 @@
+# web/fragment_cache.py
+# Cache of rendered HTML fragments (table rows, whole tables) for the listing pages.
+# - each entry is stored under a key (e.g. ("piece_row", 12)) with a check value: the data
+#   it was rendered from (a row's fields, the data version for a table). A lookup with a
+#   different check value is a miss and replaces the entry, so a change to one piece
+#   re-renders that piece's row and nothing else
+# - table entries can also keep their dependencies (the rows they contain): when the data
+#   version moves on but those rows did not change, the entry is kept and re-stamped
+# - bounded by total bytes and entry count, least recently used entries go first
+# - stream_fragment()/stream_page() render lazily, for pages streamed to the client:
+#   a missing table goes out row by row while it is rendered, and is cached at the end
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterator, Optional
+
+from flask import current_app, render_template
+from flask.globals import request_ctx
+from markupsafe import Markup
+
+MAX_BYTES = 8 * 1024 * 1024
+MAX_ENTRIES = 20_000
+STREAM_BUFFER = 128      # template output events per streamed chunk
+
+
+def render_fragment(template: str, **context) -> Markup:
+    """
+    Renders a partial template straight from the app's Jinja environment: without
+    render_template's signals and context processors, which cost more than a table row.
+    """
+    return Markup(current_app.jinja_env.get_template(template).render(**context))
+
+
+def generate_fragment(template: str, **context) -> Iterator[Markup]:
+    for part in current_app.jinja_env.get_template(template).generate(**context):
+        yield Markup(part)
+
+def stream_page(template: str, **context):
+    """
+    The page as a streamed response (STREAM_BUFFER template events per chunk), or a
+    plain render_template() when the app sets STREAM_PAGES = False.
+    """
+    if not current_app.config.get("STREAM_PAGES", True):
+        return render_template(template, **context)
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    # like stream_template, but the request context is only entered while a chunk renders,
+    # never across a yield: a response read late, partly or not at all leaves nothing pushed
+    ctx = request_ctx.copy()
+
+    def generate():
+        with ctx:
+            stream = app.jinja_env.get_template(template).stream(context)
+            stream.enable_buffering(STREAM_BUFFER)
+        while True:
+            with ctx:
+                chunk = next(stream, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    return app.response_class(generate(), mimetype="text/html")
+
+
+class _Entry:
+    __slots__ = ("check", "deps", "html", "size")
+
+    def __init__(self, check, deps, html: Markup):
+        self.check = check
+        self.deps = deps
+        self.html = html
+        self.size = sys.getsizeof(str(html))
+
+
+class FragmentCache:
+    def __init__(self, max_bytes: int = MAX_BYTES, max_entries: int = MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0          # misses because the data behind an entry changed
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, check, deps: Optional[Callable[[], object]] = None) -> Optional[Markup]:
+        """
+        The cached fragment if it was rendered from the same data, else None.
+        deps() is only called when `check` changed, to see whether the entry still holds.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.check != check:
+                if entry.deps is not None and deps is not None and entry.deps == deps():
+                    entry.check = check
+                else:
+                    self._drop(key)
+                    self.stale += 1
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.html
+
+    def put(self, key: Hashable, check, html, deps=None) -> Markup:
+        html = Markup(html)
+        entry = _Entry(check, deps, html)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if entry.size > self.max_bytes:
+                return html         # bigger than the whole cache: don't keep it
+            self._entries[key] = entry
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return html
+
+    def fetch(self, key: Hashable, check, render: Callable[[], str],
+              deps: Optional[Callable[[], object]] = None) -> Markup:
+        """get(), or render() and put() on a miss."""
+        html = self.get(key, check, deps)
+        if html is None:
+            html = self.put(key, check, render(), deps() if deps is not None else None)
+        return html
+
+    def stream_fragment(self, key: Hashable, check, template: str,
+                        deps: Optional[Callable[[], object]] = None, **context) -> Iterator[Markup]:
+        """
+        Like fetch(), for a page that is being streamed: a cached fragment is yielded in
+        one piece, a missing one as the template renders it (and cached once complete).
+        """
+        html = self.get(key, check, deps)
+        if html is not None:
+            yield html
+            return
+        parts = []
+        for part in generate_fragment(template, **context):
+            parts.append(part)
+            yield part
+        self.put(key, check, "".join(parts), deps() if deps is not None else None)
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _drop(self, key) -> None:
+        self.bytes -= self._entries.pop(key).size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
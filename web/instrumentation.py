@@ -0,0 +1,278 @@
+# web/instrumentation.py
+# Opt-in request instrumentation (app.config["INSTRUMENTATION"] = True).
+# - every request's time is split into storage (repository loads and saves, see
+#   app/iostats.py), render (Jinja templates, streamed pages included) and logic (the rest)
+# - storage counters per request: rows parsed, bytes read/written, saves
+# - all of it per endpoint, as Prometheus text at GET /metrics
+# - optional sampling profiler (PROFILE_SLOW_MS = <ms>): a background thread samples the
+#   stacks of the threads serving requests; a request slower than the threshold gets its
+#   stacks written to PROFILE_DIR as a .folded file (one "frame;frame;frame count" line per
+#   stack - the input of flamegraph.pl, speedscope, inferno)
+#
+# A request ends when its response is closed, so streamed pages are timed to the last byte.
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from flask import Response, current_app, g, request
+from jinja2 import Template
+
+from app import iostats
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)   # seconds
+PHASES = ("storage", "logic", "render")
+PROFILE_INTERVAL = 0.005      # seconds between stack samples
+PROFILE_DIR = "profiles"
+
+_local = threading.local()
+
+
+# ----------- Render timing ----------- #
+
+class TimedTemplate(Template):
+    """Counts the time spent rendering into the current request; nested renders count once."""
+    def render(self, *args, **kwargs):
+        with _rendering():
+            return super().render(*args, **kwargs)
+
+    def generate(self, *args, **kwargs):
+        # streamed: only the time spent producing each chunk, not the time it waits to be sent
+        chunks = super().generate(*args, **kwargs)
+        while True:
+            with _rendering():
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+class _rendering:
+    __slots__ = ("start",)
+
+    def __enter__(self):
+        depth = getattr(_local, "depth", 0)
+        _local.depth = depth + 1
+        self.start = time.perf_counter() if depth == 0 else None
+
+    def __exit__(self, *exc):
+        _local.depth -= 1
+        if self.start is not None and getattr(_local, "render", None) is not None:
+            _local.render += time.perf_counter() - self.start
+
+
+# ----------- Metrics ----------- #
+
+class EndpointStats:
+    __slots__ = ("requests", "seconds", "buckets", "phases", "rows", "bytes_read", "bytes_written", "saves")
+
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.saves = 0
+
+
+class Metrics:
+    """Per-endpoint request timings and storage counters, shared by all threads."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.profiles_written = 0
+
+    def record(self, endpoint: str, seconds: float, render: float, io: iostats.IOStats) -> None:
+        storage = io.seconds if io else 0.0
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.requests += 1
+            stats.seconds += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stats.buckets[i] += 1
+            stats.phases["storage"] += storage
+            stats.phases["render"] += render
+            stats.phases["logic"] += max(0.0, seconds - storage - render)
+            if io:
+                stats.rows += io.rows
+                stats.bytes_read += io.bytes_read
+                stats.bytes_written += io.bytes_written
+                stats.saves += io.saves
+
+    def prometheus(self, app) -> str:
+        """Everything in the Prometheus text exposition format."""
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            out = [
+                "# HELP repertoire_request_seconds Request latency, to the last byte sent.",
+                "# TYPE repertoire_request_seconds histogram",
+            ]
+            for name, s in endpoints:
+                label = f'endpoint="{_escape(name)}"'
+                for bound, count in zip(BUCKETS, s.buckets):
+                    out.append(f'repertoire_request_seconds_bucket{{{label},le="{bound}"}} {count}')
+                out.append(f'repertoire_request_seconds_bucket{{{label},le="+Inf"}} {s.requests}')
+                out.append(f"repertoire_request_seconds_sum{{{label}}} {s.seconds:.6f}")
+                out.append(f"repertoire_request_seconds_count{{{label}}} {s.requests}")
+
+            out += ["# HELP repertoire_request_phase_seconds_total Request time by phase: storage, logic, render.",
+                    "# TYPE repertoire_request_phase_seconds_total counter"]
+            for name, s in endpoints:
+                for phase in PHASES:
+                    out.append(f'repertoire_request_phase_seconds_total{{endpoint="{_escape(name)}",phase="{phase}"}} '
+                               f"{s.phases[phase]:.6f}")
+
+            for metric, attr, help_text in (
+                    ("repertoire_storage_rows_parsed_total", "rows", "Rows parsed from storage."),
+                    ("repertoire_storage_bytes_read_total", "bytes_read", "Bytes read from storage files."),
+                    ("repertoire_storage_bytes_written_total", "bytes_written", "Bytes written to storage files."),
+                    ("repertoire_storage_saves_total", "saves", "Storage writes (one per save or row write).")):
+                out += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+                for name, s in endpoints:
+                    out.append(f'{metric}{{endpoint="{_escape(name)}"}} {getattr(s, attr)}')
+            profiles_written = self.profiles_written
+
+        fragments = app.extensions["fragments"].stats()
+        partitions = app.extensions["partitions"].stats()
+        out += [
+            "# HELP repertoire_fragment_cache_hits_total Rendered fragments served from the cache.",
+            "# TYPE repertoire_fragment_cache_hits_total counter",
+            f"repertoire_fragment_cache_hits_total {fragments['hits']}",
+            "# HELP repertoire_fragment_cache_misses_total Fragments that had to be rendered.",
+            "# TYPE repertoire_fragment_cache_misses_total counter",
+            f"repertoire_fragment_cache_misses_total {fragments['misses']}",
+            "# HELP repertoire_fragment_cache_bytes Memory held by the fragment cache.",
+            "# TYPE repertoire_fragment_cache_bytes gauge",
+            f"repertoire_fragment_cache_bytes {fragments['bytes']}",
+            "# HELP repertoire_partitions_open User partitions loaded in memory.",
+            "# TYPE repertoire_partitions_open gauge",
+            f"repertoire_partitions_open {partitions['open']}",
+            "# HELP repertoire_profiles_written_total Slow-request profiles written.",
+            "# TYPE repertoire_profiles_written_total counter",
+            f"repertoire_profiles_written_total {profiles_written}",
+        ]
+        return "\n".join(out) + "\n"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# ----------- Sampling profiler ----------- #
+
+class Sampler:
+    """
+    One background thread sampling the stacks of the watched threads every `interval`
+    seconds. It runs only while at least one thread is watched.
+    """
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self._watched: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, thread_id: int) -> Counter:
+        samples = Counter()
+        with self._lock:
+            self._watched[thread_id] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-sampler", daemon=True)
+                self._thread.start()
+        return samples
+
+    def unwatch(self, thread_id: int) -> Counter:
+        with self._lock:
+            return self._watched.pop(thread_id, Counter())
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._watched:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, samples in self._watched.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_stack(frame)] += 1
+            time.sleep(self.interval)
+
+def _stack(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+def write_profile(folder: str, endpoint: str, seconds: float, samples: Counter) -> str:
+    """Writes the samples as a .folded file; returns its path."""
+    os.makedirs(folder, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint.replace('.', '_')}-{seconds * 1000:.0f}ms.folded"
+    path = os.path.join(folder, name)
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+# ----------- Hooks ----------- #
+
+def _start_request():
+    _local.render, _local.depth = 0.0, 0
+    iostats.start()
+    g._instrumented = time.perf_counter()
+    sampler = current_app.extensions.get("sampler")
+    if sampler is not None:
+        sampler.watch(threading.get_ident())
+
+def _end_request(response):
+    start = g.pop("_instrumented", None)
+    if start is None:
+        return response
+    app = current_app._get_current_object()
+    endpoint = request.endpoint or "unmatched"
+    thread_id = threading.get_ident()
+
+    def finish():
+        seconds = time.perf_counter() - start
+        render, _local.render = getattr(_local, "render", 0.0) or 0.0, None
+        io = iostats.stop()
+        app.extensions["metrics"].record(endpoint, seconds, render, io)
+        sampler = app.extensions.get("sampler")
+        if sampler is not None:
+            samples = sampler.unwatch(thread_id)
+            if samples and seconds * 1000 >= app.config["PROFILE_SLOW_MS"]:
+                write_profile(app.config["PROFILE_DIR"], endpoint, seconds, samples)
+                with app.extensions["metrics"].lock:
+                    app.extensions["metrics"].profiles_written += 1
+
+    response.call_on_close(finish)
+    return response
+
+def metrics_page():
+    return Response(current_app.extensions["metrics"].prometheus(current_app), headers={"Cache-Control": "no-store"},
+                    content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def init_app(app) -> None:
+    app.config.setdefault("INSTRUMENTATION", False)
+    app.config.setdefault("PROFILE_SLOW_MS", None)      # a number turns the sampling profiler on
+    app.config.setdefault("PROFILE_DIR", PROFILE_DIR)
+    app.config.setdefault("PROFILE_INTERVAL", PROFILE_INTERVAL)
+    profiling = app.config["PROFILE_SLOW_MS"] is not None
+    if not (app.config["INSTRUMENTATION"] or profiling):
+        return
+    app.extensions["metrics"] = Metrics()
+    if profiling:
+        app.extensions["sampler"] = Sampler(app.config["PROFILE_INTERVAL"])
+    app.jinja_env.template_class = TimedTemplate
+    app.before_request(_start_request)
+    app.after_request(_end_request)
+    app.add_url_rule("/metrics", "metrics", metrics_page)
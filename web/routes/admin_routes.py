@@ -0,0 +1,17 @@
+from flask import Blueprint, current_app, jsonify
+from web.users import current_partition
+
+admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
+
+
+# Cache metrics: fragment cache hit ratio + memory, repository reload counters
+# (of the active user's partition) and the open partitions
+@admin_bp.get("/metrics")
+def metrics():
+    part = current_partition()
+    return jsonify({
+        "fragments": current_app.extensions["fragments"].stats(),
+        "pieces_repository": part.pieces.stats(),
+        "setlists_repository": {"generation": part.setlists.generation},
+        "partitions": current_app.extensions["partitions"].stats(),
+    })
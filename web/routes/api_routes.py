@@ -0,0 +1,441 @@
+# web/routes/api_routes.py
+# JSON API for integration scripts: /api/v1
+# - CRUD for pieces, performances and setlist items
+# - bulk endpoints: N operations validated together, then applied in one storage write
+#   (all or nothing - nothing is applied if any operation is invalid)
+# - /pieces/export streams every piece as NDJSON (one JSON object per line)
+
+import json
+from datetime import date
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context
+from werkzeug.exceptions import HTTPException
+
+from app import setlist_logic as sl
+from app.paging import FILTERS, PAGE_SIZE, paginate
+from app.piece_logic import Piece
+from app.services import READINESS, normalize_readiness, parse_duration
+from web.users import current_partition, current_user_id
+
+api_bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+EXPORT_CHUNK = 500      # NDJSON lines per streamed chunk
+
+
+def _pieces():
+    return current_partition().pieces
+
+def _setlists():
+    return current_partition().setlists
+
+def _user_id(data, current) -> int:
+    """The record's owner: the active user unless given; a partition only holds its own user's."""
+    try:
+        user_id = int(data.get("user_id", current.user_id if current else current_user_id()))
+    except (TypeError, ValueError):
+        raise ValueError("user_id must be an integer")
+    if current_app.config["PARTITION_BY_USER"] and user_id != current_user_id():
+        raise ValueError("user_id must be the current user's")
+    return user_id
+
+@api_bp.errorhandler(HTTPException)
+def _json_error(e):
+    return jsonify({"error": e.description}), e.code
+
+
+# ----------- JSON <-> objects ----------- #
+
+def piece_json(p: Piece) -> dict:
+    return {"piece_id": p.piece_id, "title": p.title, "composer": p.composer, "genre": p.genre,
+            "readiness_status": p.readiness_status, "user_id": p.user_id, "duration": p.duration,
+            "created": str(p.created) if p.created else None, "updated": str(p.updated) if p.updated else None}
+
+def performance_json(perf: sl.Performance, items=None) -> dict:
+    out = {"performance_id": perf.performance_id, "title": perf.title, "date": perf.date,
+           "location": perf.location, "user_id": perf.user_id}
+    if items is not None:
+        out["items"] = [item_json(it) for it in items]
+    return out
+
+def item_json(it: sl.Setlist_Item) -> dict:
+    return {"setlist_item_id": it.setlist_item_id, "performance_id": it.performance_id,
+            "piece_id": it.piece_id, "order_index": it.order_index}
+
+def _body():
+    data = request.get_json(silent=True)
+    if data is None:
+        abort(400, "expected a JSON body")
+    return data
+
+def _is_int(value) -> bool:
+    # JSON true/false arrive as bool, which is an int subclass
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _piece_fields(data, current: Piece = None) -> dict:
+    """
+    Validated piece fields from a JSON object; missing fields keep `current`'s values.
+    Raises ValueError with a message for the client.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("expected an object")
+    title = str(data.get("title", current.title if current else "") or "").strip()
+    if not title:
+        raise ValueError("title is required")
+    raw = data.get("readiness_status", current.readiness_status if current else "learning")
+    if not isinstance(raw, str):
+        raise ValueError(f"readiness_status must be a string (options: {', '.join(READINESS)})")
+    readiness = normalize_readiness(raw)
+    if readiness is None:
+        raise ValueError(f"unknown readiness '{raw}' (options: {', '.join(READINESS)})")
+    user_id = _user_id(data, current)
+    # seconds, or a "m:ss" / "h:mm:ss" string; null clears it
+    duration = data.get("duration", current.duration if current else None)
+    if isinstance(duration, bool) or not isinstance(duration, (int, str, type(None))):
+        raise ValueError("duration must be seconds or a 'm:ss' string")
+    return {"title": title,
+            "composer": str(data.get("composer", current.composer if current else "") or "").strip(),
+            "genre": str(data.get("genre", current.genre if current else "") or "").strip(),
+            "readiness_status": readiness, "user_id": user_id, "duration": parse_duration(duration)}
+
+def _performance_fields(data, current: sl.Performance = None) -> dict:
+    if not isinstance(data, dict):
+        raise ValueError("expected an object")
+    title = str(data.get("title", current.title if current else "") or "").strip()
+    if not title:
+        raise ValueError("title is required")
+    user_id = _user_id(data, current)
+    return {"title": title,
+            "date": str(data.get("date", current.date if current else "") or "").strip(),
+            "location": str(data.get("location", current.location if current else "") or "").strip(),
+            "user_id": user_id}
+
+
+# ----------- Pieces ----------- #
+
+@api_bp.get("/pieces")
+def list_pieces():
+    filters = {attr: request.args.get(attr, "").strip() for attr in FILTERS}
+    try:
+        page = paginate(_pieces().get(), request.args.get("sort", "id"), filters,
+                        after=request.args.get("after"), before=request.args.get("before"),
+                        size=request.args.get("size", PAGE_SIZE, type=int))
+    except ValueError as e:
+        abort(400, str(e))
+    return jsonify({"items": [piece_json(p) for p in page.items],
+                    "next": page.next_cursor, "prev": page.prev_cursor})
+
+@api_bp.get("/pieces/<int:piece_id>")
+def get_piece(piece_id):
+    piece = _pieces().get().get(piece_id)
+    if piece is None:
+        abort(404, f"piece {piece_id} not found")
+    return jsonify(piece_json(piece))
+
+@api_bp.post("/pieces")
+def create_piece():
+    try:
+        fields = _piece_fields(_body())
+    except ValueError as e:
+        abort(400, str(e))
+    repo = _pieces()
+    with repo.writing() as library:
+        piece = Piece(library.next_id(), fields["title"], fields["composer"], fields["genre"],
+                      fields["readiness_status"], fields["user_id"], fields["duration"])
+        library.add_piece(piece)
+        repo.insert(piece)
+    return jsonify(piece_json(piece)), 201
+
+@api_bp.route("/pieces/<int:piece_id>", methods=["PUT", "PATCH"])
+def update_piece(piece_id):
+    data = _body()
+    repo = _pieces()
+    with repo.writing() as library:
+        piece = library.get(piece_id)
+        if piece is None:
+            abort(404, f"piece {piece_id} not found")
+        try:
+            fields = _piece_fields(data, piece)
+        except ValueError as e:
+            abort(400, str(e))
+        _edit(library, piece, fields)
+        repo.update(piece)
+    return jsonify(piece_json(piece))
+
+def _edit(library, piece, fields):
+    library.edit_piece(piece.piece_id, fields["title"], fields["composer"], fields["genre"],
+                       fields["readiness_status"], fields["duration"])
+    piece.user_id = fields["user_id"]
+
+@api_bp.delete("/pieces/<int:piece_id>")
+def delete_piece(piece_id):
+    repo = _pieces()
+    with repo.writing() as library:
+        if not library.delete_piece(piece_id):
+            abort(404, f"piece {piece_id} not found")
+        repo.remove(piece_id)
+    return "", 204
+
+@api_bp.post("/pieces/bulk")
+def bulk_pieces():
+    """
+    {"create": [{...}], "update": [{"piece_id": 1, ...}], "delete": [3, 4]}
+    Everything is checked first; if anything is invalid nothing is applied (400 + errors).
+    """
+    data = _body()
+    if not isinstance(data, dict):
+        abort(400, "expected an object with create/update/delete lists")
+    creates, updates, deletes = (data.get(k) or [] for k in ("create", "update", "delete"))
+    if not all(isinstance(v, list) for v in (creates, updates, deletes)):
+        abort(400, "create, update and delete must be lists")
+
+    repo = _pieces()
+    with repo.writing() as library:
+        errors, created, edits = [], [], []
+        for i, item in enumerate(creates):
+            try:
+                created.append(_piece_fields(item))
+            except ValueError as e:
+                errors.append({"op": "create", "index": i, "error": str(e)})
+        touched = set()
+        for i, item in enumerate(updates):
+            pid = item.get("piece_id") if isinstance(item, dict) else None
+            piece = library.get(pid) if _is_int(pid) else None
+            if piece is None:
+                errors.append({"op": "update", "index": i, "error": f"piece {pid} not found"})
+                continue
+            try:
+                edits.append((piece, _piece_fields(item, piece)))
+                touched.add(pid)
+            except ValueError as e:
+                errors.append({"op": "update", "index": i, "error": str(e)})
+        for i, pid in enumerate(deletes):
+            if not _is_int(pid) or library.get(pid) is None:
+                errors.append({"op": "delete", "index": i, "error": f"piece {pid} not found"})
+            elif pid in touched:
+                errors.append({"op": "delete", "index": i, "error": f"piece {pid} is also updated"})
+        if errors:
+            return jsonify({"error": "nothing was applied", "errors": errors}), 400
+
+        ops, new = [], []
+        for fields, piece_id in zip(created, library.reserve_ids(len(created))):
+            piece = Piece(piece_id, fields["title"], fields["composer"], fields["genre"],
+                          fields["readiness_status"], fields["user_id"], fields["duration"])
+            library.add_piece(piece)
+            new.append(piece)
+            ops.append(("add", piece))
+        for piece, fields in edits:
+            _edit(library, piece, fields)
+            ops.append(("edit", piece))
+        for pid in dict.fromkeys(deletes):
+            library.delete_piece(pid)
+            ops.append(("delete", pid))
+        try:
+            repo.apply(ops)
+        except Exception:
+            repo.invalidate()    # the cached copy is ahead of storage: reload it next time
+            raise
+    return jsonify({"created": [piece_json(p) for p in new], "updated": len(edits),
+                    "deleted": len(set(deletes))})
+
+@api_bp.get("/pieces/export")
+def export_pieces():
+    """Every piece as NDJSON, streamed in chunks instead of built as one big document."""
+    pieces = _pieces().get().pieces     # snapshot: later writes don't affect this export
+
+    def lines():
+        for start in range(0, len(pieces), EXPORT_CHUNK):
+            yield "".join(json.dumps(piece_json(p)) + "\n" for p in pieces[start:start + EXPORT_CHUNK])
+
+    return Response(stream_with_context(lines()), mimetype="application/x-ndjson",
+                    headers={"Content-Disposition": f"attachment; filename=pieces-{date.today()}.ndjson"})
+
+
+# ----------- Performances ----------- #
+
+@api_bp.get("/performances")
+def list_performances():
+    performances, _ = _setlists().get()
+    return jsonify({"items": [performance_json(p) for p in performances.values()]})
+
+@api_bp.get("/performances/<int:performance_id>")
+def get_performance(performance_id):
+    performances, items = _setlists().get()
+    perf = performances.get(performance_id)
+    if perf is None:
+        abort(404, f"performance {performance_id} not found")
+    return jsonify(performance_json(perf, items.items_for(performance_id)))
+
+@api_bp.post("/performances")
+def create_performance():
+    try:
+        fields = _performance_fields(_body())
+    except ValueError as e:
+        abort(400, str(e))
+    repo = _setlists()
+    with repo.writing() as (performances, items):
+        perf = sl.Performance(performances.next_id(), fields["title"], fields["date"],
+                              fields["location"], fields["user_id"])
+        performances[perf.performance_id] = perf
+        repo.insert_performance(perf)
+    return jsonify(performance_json(perf, [])), 201
+
+@api_bp.route("/performances/<int:performance_id>", methods=["PUT", "PATCH"])
+def update_performance(performance_id):
+    data = _body()
+    repo = _setlists()
+    with repo.writing() as (performances, items):
+        perf = performances.get(performance_id)
+        if perf is None:
+            abort(404, f"performance {performance_id} not found")
+        try:
+            fields = _performance_fields(data, perf)
+        except ValueError as e:
+            abort(400, str(e))
+        perf.title, perf.date, perf.location, perf.user_id = (
+            fields["title"], fields["date"], fields["location"], fields["user_id"])
+        repo.update_performance(perf)
+    return jsonify(performance_json(perf))
+
+@api_bp.delete("/performances/<int:performance_id>")
+def delete_performance(performance_id):
+    repo = _setlists()
+    with repo.writing() as (performances, items):
+        if performance_id not in performances:
+            abort(404, f"performance {performance_id} not found")
+        items.drop(performance_id)
+        del performances[performance_id]
+        repo.delete_performance(performance_id)
+    return "", 204
+
+@api_bp.post("/performances/bulk")
+def bulk_performances():
+    """
+    {"create": [{...}], "update": [{"performance_id": 1, ...}], "delete": [3]}
+    All or nothing, persisted in one write.
+    """
+    data = _body()
+    if not isinstance(data, dict):
+        abort(400, "expected an object with create/update/delete lists")
+    creates, updates, deletes = (data.get(k) or [] for k in ("create", "update", "delete"))
+    if not all(isinstance(v, list) for v in (creates, updates, deletes)):
+        abort(400, "create, update and delete must be lists")
+
+    repo = _setlists()
+    with repo.writing() as (performances, items):
+        errors, created, edits = [], [], []
+        for i, item in enumerate(creates):
+            try:
+                created.append(_performance_fields(item))
+            except ValueError as e:
+                errors.append({"op": "create", "index": i, "error": str(e)})
+        for i, item in enumerate(updates):
+            pid = item.get("performance_id") if isinstance(item, dict) else None
+            perf = performances.get(pid) if _is_int(pid) else None
+            if perf is None:
+                errors.append({"op": "update", "index": i, "error": f"performance {pid} not found"})
+                continue
+            try:
+                edits.append((perf, _performance_fields(item, perf)))
+            except ValueError as e:
+                errors.append({"op": "update", "index": i, "error": str(e)})
+        for i, pid in enumerate(deletes):
+            if not _is_int(pid) or pid not in performances:
+                errors.append({"op": "delete", "index": i, "error": f"performance {pid} not found"})
+        if errors:
+            return jsonify({"error": "nothing was applied", "errors": errors}), 400
+
+        new = []
+        for fields, pid in zip(created, performances.reserve_ids(len(created))):
+            perf = sl.Performance(pid, fields["title"], fields["date"], fields["location"], fields["user_id"])
+            performances[pid] = perf
+            new.append(perf)
+        for perf, f in edits:
+            perf.title, perf.date, perf.location, perf.user_id = f["title"], f["date"], f["location"], f["user_id"]
+        for pid in dict.fromkeys(deletes):
+            items.drop(pid)
+            del performances[pid]
+        try:
+            repo.save()     # one write for the whole batch
+        except Exception:
+            repo.invalidate()
+            raise
+    return jsonify({"created": [performance_json(p) for p in new], "updated": len(edits),
+                    "deleted": len(set(deletes))})
+
+
+# ----------- Setlist items ----------- #
+
+def _performance_or_404(performances, performance_id):
+    if performance_id not in performances:
+        abort(404, f"performance {performance_id} not found")
+
+@api_bp.get("/performances/<int:performance_id>/items")
+def list_items(performance_id):
+    performances, items = _setlists().get()
+    _performance_or_404(performances, performance_id)
+    return jsonify({"items": [item_json(it) for it in items.items_for(performance_id)]})
+
+@api_bp.post("/performances/<int:performance_id>/items")
+def add_item(performance_id):
+    data = _body()
+    piece_id = data.get("piece_id") if isinstance(data, dict) else None
+    if not _is_int(piece_id) or _pieces().get().get(piece_id) is None:
+        abort(400, f"piece {piece_id} not found")
+    repo = _setlists()
+    with repo.writing() as (performances, items):
+        _performance_or_404(performances, performance_id)
+        if any(it.piece_id == piece_id for it in items.items_for(performance_id)):
+            abort(409, f"piece {piece_id} is already in this setlist")
+        item = sl.add_piece_to_setlist(items, performance_id, piece_id)
+        repo.insert_item(item)
+    return jsonify(item_json(item)), 201
+
+@api_bp.put("/performances/<int:performance_id>/items")
+def set_order(performance_id):
+    """{"piece_ids": [...]}: the setlist's pieces in their new order (same pieces, reordered)."""
+    data = _body()
+    order = data.get("piece_ids") if isinstance(data, dict) else None
+    repo = _setlists()
+    with repo.writing() as (performances, items):
+        _performance_or_404(performances, performance_id)
+        current = items.items_for(performance_id)
+        if (not isinstance(order, list) or any(not _is_int(pid) for pid in order)
+                or sorted(order) != sorted(it.piece_id for it in current)):
+            abort(400, "piece_ids must list the setlist's pieces exactly once each")
+        by_piece = {it.piece_id: it for it in current}
+        current[:] = [by_piece[pid] for pid in order]
+        items.reordered(performance_id)     # fresh positions and ranks
+        repo.reorder(performance_id)
+    return jsonify({"items": [item_json(it) for it in current]})
+
+@api_bp.patch("/performances/<int:performance_id>/items/<int:order_index>")
+def move_item(performance_id, order_index):
+    """{"position": n}: moves one item to position n; only that item is rewritten."""
+    data = _body()
+    position = data.get("position") if isinstance(data, dict) else None
+    repo = _setlists()
+    with repo.writing() as (performances, items):
+        _performance_or_404(performances, performance_id)
+        current = items.items_for(performance_id)
+        if not 1 <= order_index <= len(current):
+            abort(404, f"no item at position {order_index}")
+        if not _is_int(position) or not 1 <= position <= len(current):
+            abort(400, f"position must be a number from 1 to {len(current)}")
+        item = current[order_index - 1]
+        if items.move(item, position):
+            repo.reorder(performance_id)    # the setlist was rebalanced: every item has a new rank
+        elif position != order_index:
+            repo.move_item(item)
+    return jsonify({"items": [item_json(it) for it in current]})
+
+@api_bp.delete("/performances/<int:performance_id>/items/<int:order_index>")
+def remove_item(performance_id, order_index):
+    repo = _setlists()
+    with repo.writing() as (performances, items):
+        _performance_or_404(performances, performance_id)
+        item = next((it for it in items.items_for(performance_id) if it.order_index == order_index), None)
+        if item is None:
+            abort(404, f"no item at position {order_index}")
+        sl.remove_piece_from_setlist(items, performance_id, order_index)
+        repo.delete_item(item)
+    return "", 204
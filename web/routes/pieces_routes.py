@@ -1,16 +1,74 @@
-from flask import Blueprint, render_template, request, redirect, url_for
+from flask import Blueprint, render_template, request, redirect, url_for, current_app, jsonify, abort, make_response
 from app.piece_logic import Piece
-from app.storage import load_pieces, save_pieces
-from datetime import date
+from app import importer
+from app.paging import FILTERS, PAGE_SIZE, paginate
+from app.piece_logic import SORTS
+from app.services import READINESS, parse_duration
+from web.caching import Validators
+from web.fragment_cache import generate_fragment, render_fragment, stream_page
+from web.users import current_partition, current_user_id
 
 pieces_bp = Blueprint("pieces", __name__, url_prefix="/pieces")
 
 
-# load piece from data
+def _repo():
+    return current_partition().pieces
+
+
+# ----------- Cached fragments ----------- #
+# rows are re-rendered only when their piece changes, whole tables only when a row in them does;
+# tables are generated lazily, so a streamed page sends its rows as they are rendered;
+# keys carry the partition's user, since piece ids are numbered per user
+
+def _row_data(piece):
+    return (piece.title, piece.composer, piece.genre, piece.readiness_status)
+
+def _row(piece, user_id):
+    return current_app.extensions["fragments"].fetch(
+        ("piece_row", user_id, piece.piece_id), _row_data(piece),
+        lambda: render_fragment("_piece_row.html", piece = piece))
+
+def _table(pieces, user_id):
+    return generate_fragment("_pieces_table.html", rows = (_row(p, user_id) for p in pieces))
+
+
+# load piece from data (served from the in-memory repository), one page at a time:
+# /pieces/?readiness=&composer=&genre=&sort=title&after=<cursor> (or before=<cursor>)
+# Conditional GET: polling clients get 304 until the pieces change.
 @pieces_bp.get("/")
 def pieces_home():
-    pieces = load_pieces()
-    return render_template("pieces_list.html", pieces = pieces)
+    part = current_partition()
+    repo = part.pieces
+    library = repo.get()
+    validators = Validators(repo.version, repo.modified)
+    if validators.not_modified():
+        return validators.response_304()
+
+    filters = {attr: request.args.get(attr, "").strip() for attr in FILTERS}
+    sort = request.args.get("sort", "id")
+    try:
+        page = paginate(library, sort, filters,
+                        after=request.args.get("after"), before=request.args.get("before"),
+                        size=request.args.get("size", PAGE_SIZE, type=int))
+    except ValueError as e:
+        abort(400, str(e))
+    links = dict({k: v for k, v in filters.items() if v}, sort=sort)    # kept on prev/next links
+    table = current_app.extensions["fragments"].stream_fragment(
+        ("pieces_table", part.user_id, tuple(sorted(request.args.items(multi=True)))), repo.version,
+        "_pieces_table.html", deps=lambda: [(p.piece_id,) + _row_data(p) for p in page.items],
+        rows = (_row(p, part.user_id) for p in page.items))
+    return validators.apply(make_response(stream_page(
+        "pieces_list.html", pieces = page.items, page = page, links = links, table = table,
+        filters = filters, sort = sort, sorts = list(SORTS), readiness_options = READINESS)))
+
+
+# Full-text search: /pieces/search?q=...
+@pieces_bp.get("/search")
+def search_pieces():
+    q = request.args.get("q", "").strip()
+    part = current_partition()
+    pieces = part.pieces.get().search(q) if q else []
+    return stream_page("pieces_list.html", pieces = pieces, query = q, table = _table(pieces, part.user_id))
 
 
 # Show form
@@ -26,27 +84,33 @@ def add_piece():
     composer = request.form.get("composer")
     genre = request.form.get("genre")
     readiness_status = request.form.get("readiness_status")
+    try:
+        duration = parse_duration(request.form.get("duration"))
+    except ValueError as e:
+        abort(400, str(e))
+
+    user_id = current_user_id()
 
-    #Auto generate piece_id
-    pieces = load_pieces()
-    piece_id = max([p.piece_id for p in pieces], default = 0) + 1
+    repo = _repo()
+    # storage lock held: no other worker can take the same id meanwhile
+    with repo.writing() as library:
 
-    # Temporary user_id
-    user_id = 1
+        #Auto generate piece_id
+        piece_id = library.next_id()
 
-    new_piece = Piece(
-        piece_id,
-        title,
-        composer,
-        genre,
-        readiness_status,
-        user_id
-    )
+        new_piece = Piece(
+            piece_id,
+            title,
+            composer,
+            genre,
+            readiness_status,
+            user_id,
+            duration
+        )
 
-    # timestamp piece and add to list
-    new_piece.created = date.today()
-    pieces.append(new_piece)
-    save_pieces(pieces)
+        # timestamp piece and add to list
+        library.add_piece(new_piece)
+        repo.insert(new_piece)
 
     return redirect(url_for("pieces.pieces_home"))
 
@@ -54,7 +118,31 @@ def add_piece():
 # Delete route
 @pieces_bp.post("/delete/<int:piece_id>")
 def delete_piece(piece_id):
-    pieces = load_pieces()
-    pieces = [p for p in pieces if p.piece_id != piece_id]
-    save_pieces(pieces)
-    return redirect(url_for("pieces.pieces_home"))
\ No newline at end of file
+    repo = _repo()
+    with repo.writing() as library:
+        if library.delete_piece(piece_id):
+            repo.remove(piece_id)
+    return redirect(url_for("pieces.pieces_home"))
+
+
+# Bulk CSV import. Send the file as a multipart "file" field or as the raw request body
+# (Content-Type: text/csv). Either way rows are parsed as they are read: a raw body
+# streams straight from the socket, and Werkzeug spools large multipart files to disk.
+@pieces_bp.post("/import")
+def import_pieces():
+    if request.mimetype == "multipart/form-data":
+        upload = request.files.get("file")
+        if upload is None or not upload.filename:
+            return jsonify({"error": "no file uploaded"}), 400
+        stream = upload.stream
+    else:
+        stream = request.stream
+
+    report = importer.import_pieces(importer.open_text(stream), _repo(), user_id=current_user_id())
+    return jsonify(report.as_dict())
+
+
+# Repository cache counters
+@pieces_bp.get("/cache-stats")
+def cache_stats():
+    return jsonify(_repo().stats())
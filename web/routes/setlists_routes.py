@@ -1,14 +1,80 @@
-from flask import Blueprint, render_template
-from app.setlist_logic import Performance
+from flask import Blueprint, current_app, make_response, redirect, render_template, request, url_for
+from app import setlist_logic as sl
+from app.services import READINESS, format_duration, parse_genre_mix, parse_time_slot
+from web.caching import Validators
+from web.fragment_cache import render_fragment
+from web.users import current_partition, current_user_id
 
 setlists_bp = Blueprint("setlists", __name__, url_prefix="/setlists")
 
-setlists = [
-    Performance(1, "Spring Concert", "2026-03-10", "Auditorium", 101),
-    Performance(2, "Anime Club Night", "2026-03-21", "Room 204", 101),
-    Performance(3, "Jazz Showcase", "2026-04-05", "Main Hall", 102),
-]
+def _repos():
+    part = current_partition()
+    return part.setlists, part.pieces
+
+def _row_data(s, totals):
+    pid = s.performance_id
+    return (s.title, s.location, s.date, totals.count(pid), totals.runtime(pid))
+
+def _rows(setlists, totals, user_id):
+    fragments = current_app.extensions["fragments"]
+    return "".join(fragments.fetch(("setlist_row", user_id, s.performance_id), _row_data(s, totals),
+                                   lambda: render_fragment("_setlist_row.html", s=s,
+                                                           count=totals.count(s.performance_id),
+                                                           runtime=format_duration(totals.runtime(s.performance_id))))
+                   for s in setlists)
 
 @setlists_bp.get("/")
 def setlists_home():
-    return render_template("setlists_list.html", setlists=setlists)
\ No newline at end of file
+    part = current_partition()
+    setlist_repo, piece_repo = part.setlists, part.pieces
+    library = piece_repo.get()
+    performances, _ = setlist_repo.get()
+    totals = setlist_repo.totals(library)
+    # runtimes come from piece durations, so a piece write is a change to this page too
+    version = f"{setlist_repo.version}-{piece_repo.version}"
+    validators = Validators(version, max(setlist_repo.modified, piece_repo.modified))
+    if validators.not_modified():
+        return validators.response_304()
+    setlists = list(performances.values())
+    rows = current_app.extensions["fragments"].fetch(
+        ("setlists_table", part.user_id), version, lambda: _rows(setlists, totals, part.user_id),
+        deps=lambda: [(s.performance_id,) + _row_data(s, totals) for s in setlists])
+    return validators.apply(make_response(render_template("setlists_list.html", setlists=setlists, rows=rows)))
+
+
+# Setlist builder: fills a time slot from the library
+@setlists_bp.get("/build")
+def setlist_form():
+    form = {"title": "", "date": "", "location": "", "target": "", "genre_mix": "",
+            "readiness": ["performance-ready"]}
+    return render_template("setlist_form.html", form=form, readiness_options=READINESS)
+
+@setlists_bp.post("/build")
+def build_setlist():
+    form = {key: request.form.get(key, "").strip() for key in ("title", "date", "location", "target", "genre_mix")}
+    form["readiness"] = [r for r in request.form.getlist("readiness") if r in READINESS]
+    try:
+        target = parse_time_slot(form["target"])
+        if not form["title"]:
+            raise ValueError("a title is required")
+        mix = parse_genre_mix(form["genre_mix"])
+    except ValueError as e:
+        return render_template("setlist_form.html", form=form, readiness_options=READINESS, error=str(e)), 400
+
+    setlist_repo, piece_repo = _repos()
+    library = piece_repo.get()
+    with setlist_repo.writing() as (performances, items):
+        perf, new_items = sl.build_setlist(
+            library.pieces, target, performances.next_id(), form["title"], form["date"],
+            form["location"], current_user_id(), genre_mix=mix, readiness=form["readiness"] or ("performance-ready",))
+        if not new_items:
+            error = "No pieces with a duration fit that time slot."
+            return render_template("setlist_form.html", form=form, readiness_options=READINESS, error=error), 400
+        for it, item_id in zip(new_items, items.reserve_ids(len(new_items))):
+            it.setlist_item_id = item_id
+        performances[perf.performance_id] = perf
+        setlist_repo.insert_performance(perf)
+        for it in new_items:
+            items.append(it)
+            setlist_repo.insert_item(it)
+    return redirect(url_for("setlists.setlists_home"))
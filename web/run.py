@@ -1,6 +1,15 @@
+import os
 from web import create_app
+from app.backends import DEFAULT_BACKEND
 
-app = create_app()
+app = create_app({
+    "STORAGE_BACKEND": os.environ.get("REPERTOIRE_BACKEND", DEFAULT_BACKEND),
+    "SQLITE_PATH": os.environ.get("REPERTOIRE_DB"),
+    "PIECES_SNAPSHOT": os.environ.get("REPERTOIRE_SNAPSHOT") == "1",
+    "PARTITION_BY_USER": os.environ.get("REPERTOIRE_PARTITIONS") == "1",
+    "INSTRUMENTATION": os.environ.get("REPERTOIRE_METRICS") == "1",
+    "PROFILE_SLOW_MS": float(os.environ["REPERTOIRE_PROFILE_SLOW_MS"]) if os.environ.get("REPERTOIRE_PROFILE_SLOW_MS") else None,
+})
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
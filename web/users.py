@@ -0,0 +1,54 @@
+# web/users.py
+# The active user of a request and their partition of the data (see app/partitions.py).
+# - the user comes from the X-User-Id header (API clients, or a proxy that signs users in),
+#   else from the session (set with POST /user), else DEFAULT_USER_ID
+# - with PARTITION_BY_USER = False (default) everyone shares one dataset, as before;
+#   new pieces and setlists are still stamped with the active user's id
+
+from flask import abort, current_app, redirect, request, session, url_for
+
+from app.partitions import Partition
+
+
+def current_user_id() -> int:
+    raw = request.headers.get("X-User-Id") or session.get("user_id")
+    if raw is None:
+        return current_app.config["DEFAULT_USER_ID"]
+    try:
+        user_id = int(raw)
+    except (TypeError, ValueError):
+        abort(400, "X-User-Id must be an integer")
+    if user_id < 0:
+        abort(400, "X-User-Id must not be negative")
+    return user_id
+
+def current_partition() -> Partition:
+    partitions = current_app.extensions["partitions"]
+    # shared dataset: reads don't depend on the user (nor touch the session)
+    return partitions.get(current_user_id() if partitions.per_user else None)
+
+def _vary(response):
+    # the same URL shows different data per user
+    if current_app.config["PARTITION_BY_USER"]:
+        response.vary.add("X-User-Id")
+        response.vary.add("Cookie")
+    return response
+
+def switch_user():
+    """POST /user (form or JSON field user_id): makes that user the session's active user."""
+    data = request.get_json(silent=True) or request.form
+    try:
+        user_id = int(data.get("user_id"))
+    except (TypeError, ValueError):
+        abort(400, "user_id must be an integer")
+    if user_id < 0:
+        abort(400, "user_id must not be negative")
+    session["user_id"] = user_id
+    return redirect(request.referrer or url_for("home"))
+
+
+def init_app(app) -> None:
+    app.config.setdefault("PARTITION_BY_USER", False)
+    app.config.setdefault("DEFAULT_USER_ID", 1)
+    app.after_request(_vary)
+    app.add_url_rule("/user", "switch_user", switch_user, methods=["POST"])